@@ -0,0 +1,281 @@
+"""
+Expectimax auto-player for 2048.
+
+The search runs on packed 64-bit boards (bitboard.py): player nodes try the
+four directions, chance nodes average over every empty cell receiving a 2
+(90%) or a 4 (10%), exactly as GameCore.add_random_tile spawns them.
+
+- Spawn branches whose cumulative probability falls below a cutoff are not
+  expanded further and are scored by the heuristic instead.
+- Chance nodes are cached in a bounded transposition table (poscache.py)
+  keyed by the board's canonical form, so the 8 rotations and reflections
+  of a position share one entry. The least recently used entries are
+  evicted once it is full.
+- The search deepens iteratively: the maximum depth comes from the number
+  of empty cells, and a deeper pass only starts if it is predicted to finish
+  inside the per-move latency budget. A pass that overruns anyway is
+  abandoned and the best move of the last complete pass is played.
+
+Run `python ai.py` to play one headless game and print the search statistics.
+"""
+import time
+
+import bitboard
+from poscache import PositionCache
+
+# Heuristic weights (monotonic rows, empty cells and open merges are rewarded)
+SCORE_LOST_PENALTY = 200000.0
+SCORE_MONOTONICITY_POWER = 4.0
+SCORE_MONOTONICITY_WEIGHT = 47.0
+SCORE_SUM_POWER = 3.5
+SCORE_SUM_WEIGHT = 11.0
+SCORE_MERGES_WEIGHT = 700.0
+SCORE_EMPTY_WEIGHT = 270.0
+
+# Maximum search depth (player moves) by number of empty cells: fewer empty
+# cells means a more dangerous position and a smaller branching factor.
+DEPTH_SCHEDULE = (
+    (2, 5),  # 0-2 empty cells
+    (5, 4),  # 3-5 empty cells
+    (9, 3),  # 6-9 empty cells
+    (16, 2), # 10+ empty cells
+)
+
+DEFAULT_TIME_BUDGET = 0.010 # Seconds per move
+DEFAULT_CACHE_SIZE = 200000
+DEFAULT_PROB_CUTOFF = 0.0001
+DEADLINE_CHECK_INTERVAL = 1024 # Nodes between clock reads during a search pass
+
+
+class _SearchTimeout(Exception):
+    """
+    Raised inside a search pass that ran past the move deadline.
+    """
+
+
+def _row_heuristic(row):
+    """
+    Scores a single 16-bit row. The score is the same for the reversed row,
+    so applying it to rows and columns treats all board symmetries equally.
+    """
+    line = [(row >> (4 * c)) & 0xF for c in range(bitboard.BOARD_SIZE)]
+
+    total = 0.0
+    empty = 0
+    merges = 0
+    previous = 0
+    counter = 0
+    for rank in line:
+        total += rank ** SCORE_SUM_POWER
+        if rank == 0:
+            empty += 1
+        else:
+            if previous == rank:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = rank
+    if counter > 0:
+        merges += 1 + counter
+
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for c in range(1, bitboard.BOARD_SIZE):
+        if line[c-1] > line[c]:
+            monotonicity_left += line[c-1] ** SCORE_MONOTONICITY_POWER - line[c] ** SCORE_MONOTONICITY_POWER
+        else:
+            monotonicity_right += line[c] ** SCORE_MONOTONICITY_POWER - line[c-1] ** SCORE_MONOTONICITY_POWER
+
+    return (SCORE_LOST_PENALTY
+            + SCORE_EMPTY_WEIGHT * empty
+            + SCORE_MERGES_WEIGHT * merges
+            - SCORE_MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right)
+            - SCORE_SUM_WEIGHT * total)
+
+
+ROW_HEURISTIC = [_row_heuristic(row) for row in range(65536)]
+
+
+def heuristic(packed):
+    """
+    Static evaluation of a board: row heuristic over all rows and all columns.
+    """
+    table = ROW_HEURISTIC
+    columns = bitboard.transpose(packed)
+    return (table[packed & 0xFFFF] + table[(packed >> 16) & 0xFFFF]
+            + table[(packed >> 32) & 0xFFFF] + table[(packed >> 48) & 0xFFFF]
+            + table[columns & 0xFFFF] + table[(columns >> 16) & 0xFFFF]
+            + table[(columns >> 32) & 0xFFFF] + table[(columns >> 48) & 0xFFFF])
+
+
+def scheduled_depth(empty):
+    """
+    Returns the maximum search depth for a board with the given number of empty cells.
+    """
+    for max_empty, depth in DEPTH_SCHEDULE:
+        if empty <= max_empty:
+            return depth
+    return DEPTH_SCHEDULE[-1][1]
+
+
+class ExpectimaxAI:
+    """
+    Picks moves with a depth-limited expectimax search under a latency budget.
+    """
+    def __init__(self, time_budget=DEFAULT_TIME_BUDGET, cache_size=DEFAULT_CACHE_SIZE,
+                 prob_cutoff=DEFAULT_PROB_CUTOFF, max_depth=None, cache=None):
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.prob_cutoff = prob_cutoff
+        self.max_depth = max_depth # Overrides the empty-cell schedule when set
+        self.deadline = 0.0 # perf_counter() time the current move must finish by
+
+        # Transposition table: board -> (depth, value). Any poscache cache works,
+        # including a SharedPositionCache shared with other processes.
+        self.cache = cache if cache is not None else PositionCache(cache_size)
+
+        # Statistics
+        self.nodes = 0
+        self.timeouts = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.search_time = 0.0
+        self.moves_chosen = 0
+        self.last_depth = 0
+
+    def choose_move(self, packed):
+        """
+        Returns the best direction for the packed board, or None if no move is possible.
+        """
+        moves = []
+        for direction in bitboard.DIRECTIONS:
+            after = bitboard.MOVE_FUNCTIONS[direction](packed)
+            if after != packed:
+                moves.append((direction, after))
+        if not moves:
+            return None
+
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        max_depth = self.max_depth or scheduled_depth(bitboard.count_empty(packed))
+        if len(moves) == 1:
+            max_depth = 0 # Forced move, nothing to search
+
+        self.deadline = deadline
+        best_direction = moves[0][0]
+        depth = 1
+        previous_nodes = 0
+        while depth <= max_depth:
+            pass_start = time.perf_counter()
+            nodes_before = self.nodes
+            best_value = -1.0
+            pass_best = best_direction
+            try:
+                for direction, after in moves:
+                    value = self._chance_node(after, depth, 1.0)
+                    if value > best_value:
+                        best_value = value
+                        pass_best = direction
+            except _SearchTimeout:
+                self.timeouts += 1
+                break
+            best_direction = pass_best
+            self.last_depth = depth
+
+            # Only go deeper if the next pass is predicted to fit the budget
+            now = time.perf_counter()
+            pass_nodes = self.nodes - nodes_before
+            growth = pass_nodes / previous_nodes if previous_nodes else 2 * bitboard.count_empty(packed) + 4
+            if now + (now - pass_start) * growth > deadline:
+                break
+            previous_nodes = pass_nodes
+            depth += 1
+
+        self.search_time += time.perf_counter() - start
+        self.moves_chosen += 1
+        return best_direction
+
+    def _max_node(self, packed, depth, cprob):
+        """
+        Player node: value of the best move, 0 if no move is possible.
+        """
+        self.nodes += 1
+        best = 0.0
+        for move_function in (bitboard.move_left, bitboard.move_right, bitboard.move_up, bitboard.move_down):
+            after = move_function(packed)
+            if after != packed:
+                value = self._chance_node(after, depth, cprob)
+                if value > best:
+                    best = value
+        return best
+
+    def _chance_node(self, packed, depth, cprob):
+        """
+        Chance node: expected value over all tile spawns after a move.
+        'depth' counts the player moves left including the one just made.
+        """
+        self.nodes += 1
+        if depth <= 1 or cprob < self.prob_cutoff:
+            return heuristic(packed)
+        if self.nodes % DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+
+        self.cache_lookups += 1
+        entry = self.cache.get(packed)
+        if entry is not None and entry[0] >= depth:
+            self.cache_hits += 1
+            return entry[1]
+
+        empty = bitboard.empty_cells(packed)
+        branch_prob = cprob / len(empty)
+        total = 0.0
+        for index in empty:
+            shift = 4 * index
+            total += 0.9 * self._max_node(packed | (1 << shift), depth - 1, branch_prob * 0.9)
+            total += 0.1 * self._max_node(packed | (2 << shift), depth - 1, branch_prob * 0.1)
+        value = total / len(empty)
+
+        self.cache.put(packed, (depth, value))
+        return value
+
+    def stats(self):
+        """
+        Returns the search statistics as a dictionary.
+        """
+        return {
+            'moves': self.moves_chosen,
+            'nodes': self.nodes,
+            'nodes_per_sec': self.nodes / self.search_time if self.search_time else 0.0,
+            'cache_hit_rate': self.cache_hits / self.cache_lookups if self.cache_lookups else 0.0,
+            'cache_entries': len(self.cache),
+            'timeouts': self.timeouts,
+            'avg_move_ms': 1000 * self.search_time / self.moves_chosen if self.moves_chosen else 0.0,
+            'last_depth': self.last_depth,
+        }
+
+
+def play_game(ai=None, seed=None):
+    """
+    Plays one headless game with the expectimax AI on the game core.
+    Returns the finished GameCore.
+    """
+    from core import GameCore
+
+    ai = ai or ExpectimaxAI()
+    game = GameCore(use_bitboard=True, seed=seed)
+    while not game.game_over:
+        direction = ai.choose_move(bitboard.pack(game.board))
+        if direction is None:
+            break
+        game.move(direction)
+    return game
+
+
+if __name__ == '__main__':
+    ai = ExpectimaxAI()
+    game = play_game(ai, seed=0)
+    max_tile = 1 << bitboard.max_exponent(bitboard.pack(game.board))
+    print(f"Score: {game.score}, max tile: {max_tile}")
+    for key, value in ai.stats().items():
+        print(f"{key:>15}: {value:,.3f}" if isinstance(value, float) else f"{key:>15}: {value:,}")
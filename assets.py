@@ -0,0 +1,133 @@
+"""
+Background asset loading.
+
+Sounds and the background music are decoded once, in a background thread,
+and shared by every game instance, so restarting a game reloads nothing.
+Fonts are shared the same way, but SDL_ttf is not thread-safe, so only the
+scan of the installed system fonts (the slowest step of all, and plain
+Python) runs on that thread. The main loop calls create_fonts() every frame;
+once the scan is done it creates the fonts there, on the main thread. Until
+then the game draws with pygame's built-in font (placeholder_fonts()), and
+plays no sounds until they are decoded. The time taken by every asset is
+kept in timings and logged once loading is done.
+
+Modules listed in warmup_modules are imported at the end of the same
+thread. Their import-time tables are then ready before they are first used.
+"""
+import importlib
+import logging
+import threading
+import time
+
+import pygame
+
+
+class AssetManager:
+    """
+    Loads sounds and music once in a background thread, creates the fonts once on the main thread, and hands them out.
+    """
+    def __init__(self, sound_files, font_specs, font_names, music_file=None, warmup_modules=()):
+        self.sound_files = sound_files
+        self.font_specs = font_specs # role -> (system font size or None for the built-in font, built-in font size)
+        self.font_names = font_names # System fonts to try, in order
+        self.music_file = music_file
+        self.warmup_modules = warmup_modules
+
+        self.sounds = {}
+        self.fonts = None # Set by create_fonts() once every font is loaded
+        self.timings = {} # asset -> seconds
+        self.fonts_scanned = threading.Event() # The system font list is cached, SysFont() no longer scans
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts loading in a background thread. pygame and the mixer must be initialized.
+        """
+        self.thread = threading.Thread(target=self._load_all, name='asset-loader', daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until loading finished. Returns True if it did within timeout.
+        """
+        return self.ready.wait(timeout)
+
+    def _timed(self, name, load, *args):
+        start = time.perf_counter()
+        try:
+            return load(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def _load_all(self):
+        start = time.perf_counter()
+        if self.music_file:
+            self._timed(self.music_file, self._play_music)
+        self._timed("font scan", pygame.sysfont.get_fonts) # Pure Python, does not touch SDL_ttf
+        self.fonts_scanned.set()
+        for filename in self.sound_files:
+            self.sounds[filename] = self._timed(filename, self._load_sound, filename)
+        for module in self.warmup_modules:
+            self._timed(f"import {module}", importlib.import_module, module)
+        self.timings['total'] = time.perf_counter() - start
+        self.ready.set()
+        logging.info("Assets loaded in " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.timings.items()))
+
+    def _play_music(self):
+        try:
+            pygame.mixer.music.load(self.music_file)
+            pygame.mixer.music.play(-1) # Play indefinitely
+            logging.info("Background music loaded and playing.")
+        except pygame.error as e:
+            logging.warning(f"Could not load or play background music: {e}")
+
+    def _load_sound(self, filename):
+        try:
+            sound = pygame.mixer.Sound(filename)
+            logging.info(f"Successfully loaded sound: {filename}")
+            return sound
+        except pygame.error as e:
+            logging.warning(f"Could not load sound file '{filename}': {e}")
+            return None
+
+    def create_fonts(self):
+        """
+        Creates the fonts once the background font scan is done. Call from the main thread.
+        Returns True once the fonts are loaded.
+        """
+        if self.fonts is None and self.fonts_scanned.is_set():
+            self.fonts = self.load_fonts()
+        return self.fonts is not None
+
+    def load_fonts(self):
+        """
+        Loads every font role synchronously, trying the system fonts in order and
+        falling back to the built-in font. Returns a dict of fonts by role.
+        """
+        fonts = {}
+        for role, (size, builtin_size) in self.font_specs.items():
+            fonts[role] = self._timed(f"font {role}", self._load_font, size, builtin_size)
+        return fonts
+
+    def _load_font(self, size, builtin_size):
+        if size is None:
+            return pygame.font.Font(None, builtin_size)
+        try:
+            # SysFont takes a comma-separated list and uses the first installed one
+            return pygame.font.SysFont(",".join(self.font_names), size, bold=True)
+        except pygame.error as e:
+            logging.warning(f"Could not load system fonts {self.font_names}, using pygame's default font: {e}")
+            return pygame.font.Font(None, builtin_size)
+
+    def placeholder_fonts(self):
+        """
+        Returns pygame's built-in font for every role, for drawing before the real fonts are loaded.
+        """
+        return {role: pygame.font.Font(None, builtin_size) for role, (_, builtin_size) in self.font_specs.items()}
+
+    def sound(self, filename):
+        """
+        Returns the loaded sound, or None if it is not loaded (yet) or failed to load.
+        """
+        return self.sounds.get(filename)
@@ -0,0 +1,136 @@
+"""
+Pooled sound effects for the pygame front end.
+
+Game code does not play sounds itself: it cues them by file name, and the
+main loop calls SoundBoard.flush() once per frame. All cues of the same
+sound since the last flush become a single play, so one move merging eight
+pairs, or several moves in one frame, costs one Channel.play() per sound.
+Sounds listed in scaled get louder with the number of cues they stand for.
+A sound is not restarted within min_retrigger_ms of its last play; its cues
+wait for a later flush instead.
+
+Sounds only play on a fixed pool of reserved mixer channels, so at most
+voices effects sound at once and the music and other code keep their own
+channels. When every voice is busy, a cue takes over the voice that has
+been playing the longest among those playing a sound of the same or lower
+priority, and is dropped if there is none. Decoded sounds come from the
+asset manager, which loads each file once per process.
+"""
+import logging
+
+import pygame
+
+DEFAULT_VOICES = 4
+DEFAULT_MIN_RETRIGGER_MS = 45
+SCALED_BASE_VOLUME = 0.6 # Volume of a scaled sound cued once
+SCALED_VOLUME_STEP = 0.1 # Added per extra cue coalesced into the same play
+
+
+class SoundBoard:
+    """
+    Plays cued sounds at most once per sound and frame on a fixed set of reserved channels.
+    lookup(name) returns the loaded pygame Sound, or None while it is not available.
+    """
+    def __init__(self, lookup, voices=DEFAULT_VOICES, priorities=None, scaled=(),
+                 min_retrigger_ms=DEFAULT_MIN_RETRIGGER_MS):
+        self.lookup = lookup
+        self.voices = voices
+        self.priorities = priorities or {} # name -> priority, 0 by default; higher steals lower
+        self.scaled = frozenset(scaled)
+        self.min_retrigger_ms = min_retrigger_ms
+        self.channels = [] # Reserved in start()
+        self.playing = [] # (priority, start ms) of the last sound started on every channel
+        self.pending = {} # name -> number of cues since it last played
+        self.last_played = {} # name -> ms
+
+        # Statistics
+        self.cues = 0
+        self.plays = 0
+        self.coalesced = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Reserves the voice channels. The mixer must be initialized; without one, cues are ignored.
+        """
+        try:
+            if pygame.mixer.get_num_channels() < self.voices:
+                pygame.mixer.set_num_channels(self.voices)
+            pygame.mixer.set_reserved(self.voices) # Sound.play() elsewhere never takes these
+            self.channels = [pygame.mixer.Channel(i) for i in range(self.voices)]
+            self.playing = [(0, 0)] * self.voices
+        except pygame.error as e:
+            logging.warning(f"Could not reserve {self.voices} sound channels, sound effects are off: {e}")
+
+    def cue(self, name, count=1):
+        """
+        Asks for a sound to play at the next flush, count times over (merged into one play).
+        """
+        self.cues += count
+        self.pending[name] = self.pending.get(name, 0) + count
+
+    def volume(self, name, count):
+        if name not in self.scaled:
+            return 1.0
+        return min(1.0, SCALED_BASE_VOLUME + SCALED_VOLUME_STEP * (count - 1))
+
+    def flush(self):
+        """
+        Plays the pending cues, highest priority first. Call once per frame.
+        """
+        if not self.pending:
+            return
+        if not self.channels:
+            self.pending.clear()
+            return
+        now = pygame.time.get_ticks()
+        for name in sorted(self.pending, key=lambda name: -self.priorities.get(name, 0)):
+            if now - self.last_played.get(name, -self.min_retrigger_ms) < self.min_retrigger_ms:
+                continue # Played just now, keep collecting cues for a later frame
+            count = self.pending.pop(name)
+            sound = self.lookup(name)
+            if sound is None: # Not loaded (yet)
+                self.dropped += count
+                continue
+            priority = self.priorities.get(name, 0)
+            voice = self._voice(priority)
+            if voice is None:
+                self.dropped += count
+                continue
+            channel = self.channels[voice]
+            channel.set_volume(self.volume(name, count))
+            channel.play(sound)
+            self.playing[voice] = (priority, now)
+            self.last_played[name] = now
+            self.plays += 1
+            self.coalesced += count - 1
+
+    def _voice(self, priority):
+        """
+        Returns a free voice, or steals the oldest voice playing at most this priority, or None.
+        """
+        candidates = []
+        for voice, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return voice
+            playing_priority, started = self.playing[voice]
+            if playing_priority <= priority:
+                candidates.append((started, voice))
+        if not candidates:
+            return None
+        self.stolen += 1
+        return min(candidates)[1]
+
+    def stats(self):
+        """
+        Returns the cue and play counts as a dictionary.
+        """
+        return {
+            'voices': len(self.channels),
+            'cues': self.cues,
+            'plays': self.plays,
+            'coalesced': self.coalesced,
+            'stolen': self.stolen,
+            'dropped': self.dropped,
+        }
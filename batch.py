@@ -0,0 +1,208 @@
+"""
+Vectorized batch simulator for 2048.
+
+BatchEnv keeps N packed 64-bit boards (see bitboard.py) in one NumPy array and
+steps all of them at once: every move is a handful of table gathers over the
+whole batch, with no Python loop per board. The rules are the same as
+core.GameCore.move() on the bitboard engine: a move that changes the board
+adds one tile to a random empty cell (90% a 2, 10% a 4), and a game is over
+when no move is possible.
+
+Every board draws its spawns from its own spawnrng.SpawnRNG stream, all
+boards at once through spawnrng.spawn_batch(). The first game on a board
+with seed s is the game GameCore(use_bitboard=True, seed=s) plays for the
+same directions; games started later by reset() continue the board's stream.
+"""
+import numpy as np
+
+import bitboard
+from spawnrng import seed_key, spawn_batch
+
+# Row tables from bitboard.py as arrays for fancy indexing
+ROW_LEFT = np.array(bitboard.ROW_LEFT, dtype=np.uint64)
+ROW_RIGHT = np.array(bitboard.ROW_RIGHT, dtype=np.uint64)
+ROW_SCORE = np.array(bitboard.ROW_SCORE, dtype=np.int64)
+ROW_MERGES = np.array(bitboard.ROW_MERGES, dtype=np.int64)
+ROW_WIN = np.array(bitboard.ROW_WIN, dtype=bool)
+
+# Direction codes used in step(), in the order of bitboard.DIRECTIONS
+LEFT, RIGHT, UP, DOWN = range(4)
+
+_ROW_MASK = np.uint64(0xFFFF)
+_NIBBLE_MASK = np.uint64(0xF)
+_ROW_SHIFTS = [np.uint64(s) for s in (0, 16, 32, 48)]
+_CELL_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def transpose(boards):
+    """
+    Transposes every board in the array (same masks as bitboard.transpose).
+    """
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
+
+
+def cells(boards):
+    """
+    Returns the (N, 16) array of cell exponents, row-major.
+    """
+    return ((boards[:, None] >> _CELL_SHIFTS) & _NIBBLE_MASK).astype(np.int8)
+
+
+def count_empty(boards):
+    """
+    Returns the number of empty cells of every board.
+    """
+    return (cells(boards) == 0).sum(axis=1)
+
+
+def move_boards(boards, directions):
+    """
+    Moves every board in its own direction without spawning.
+    Returns (new_boards, score_delta, merges, made_2048).
+    """
+    directions = np.asarray(directions)
+    vertical = directions >= UP
+    leftward = (directions == LEFT) | (directions == UP)
+
+    # Up/down are left/right on the rows of the transposed board
+    rows_source = np.where(vertical, transpose(boards), boards)
+    new_rows = np.zeros_like(boards)
+    score = np.zeros(len(boards), dtype=np.int64)
+    merges = np.zeros(len(boards), dtype=np.int64)
+    made_2048 = np.zeros(len(boards), dtype=bool)
+    for shift in _ROW_SHIFTS:
+        row = ((rows_source >> shift) & _ROW_MASK).astype(np.intp)
+        new_rows |= np.where(leftward, ROW_LEFT[row], ROW_RIGHT[row]) << shift
+        # Score, merges and the 2048 flag do not depend on the slide direction
+        score += ROW_SCORE[row]
+        merges += ROW_MERGES[row]
+        made_2048 |= ROW_WIN[row]
+
+    new_boards = np.where(vertical, transpose(new_rows), new_rows)
+    return new_boards, score, merges, made_2048
+
+
+def can_move(boards):
+    """
+    Returns a mask of the boards that still have a possible move.
+    """
+    left, _, _, _ = move_boards(boards, np.full(len(boards), LEFT))
+    up, _, _, _ = move_boards(boards, np.full(len(boards), UP))
+    return (count_empty(boards) > 0) | (left != boards) | (up != boards)
+
+
+def legal_moves(boards):
+    """
+    Returns an (N, 4) mask of the directions that change each board.
+    """
+    legal = np.zeros((len(boards), 4), dtype=bool)
+    for direction in range(4):
+        moved, _, _, _ = move_boards(boards, np.full(len(boards), direction))
+        legal[:, direction] = moved != boards
+    return legal
+
+
+class BatchEnv:
+    """
+    N independent 2048 games stepped together.
+    seed is None (random seeds), an int (board i gets seed + i) or a sequence of n seeds.
+    """
+    def __init__(self, n, seed=None):
+        if seed is None or isinstance(seed, int):
+            seeds = [None if seed is None else seed + i for i in range(n)]
+        else:
+            seeds = list(seed)
+            if len(seeds) != n:
+                raise ValueError(f"Expected {n} seeds, got {len(seeds)}")
+        self.seeds = seeds
+        self.keys = np.array([seed_key(s) for s in seeds], dtype=np.uint64) # SpawnRNG stream of every board
+        self.positions = np.zeros(n, dtype=np.uint64) # Words drawn from every stream
+        self.boards = np.zeros(n, dtype=np.uint64)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+        self.moves = np.zeros(n, dtype=np.int64)
+        self.reset()
+
+    def __len__(self):
+        return len(self.boards)
+
+    def reset(self, mask=None):
+        """
+        Starts new games on the selected boards (all boards if mask is None),
+        each with two random tiles like GameCore.init_board().
+        """
+        if mask is None:
+            mask = np.ones(len(self.boards), dtype=bool)
+        self.boards[mask] = 0
+        self.scores[mask] = 0
+        self.game_over[mask] = False
+        self.won[mask] = False
+        self.moves[mask] = 0
+        self.spawn(mask)
+        self.spawn(mask)
+
+    def spawn(self, mask):
+        """
+        Adds a tile to a uniformly chosen empty cell of every selected board:
+        a 2 with 90% probability and a 4 with 10% probability.
+        Boards without an empty cell are left unchanged.
+        """
+        indices = np.flatnonzero(mask)
+        boards = self.boards[indices]
+        empty = cells(boards) == 0
+        empty_count = empty.sum(axis=1)
+        has_room = empty_count > 0
+        indices, boards, empty, empty_count = indices[has_room], boards[has_room], empty[has_room], empty_count[has_room]
+        if len(indices) == 0:
+            return
+
+        # Pick the k-th empty cell of each board in row-major order, like GameCore
+        k, exponent, self.positions[indices] = spawn_batch(self.keys[indices], self.positions[indices], empty_count)
+        position = np.argmax(np.cumsum(empty, axis=1) > k[:, None].astype(np.int64), axis=1).astype(np.uint64)
+        self.boards[indices] = boards | (exponent << (position * np.uint64(4)))
+
+    def step(self, directions):
+        """
+        Applies one direction per board (LEFT, RIGHT, UP or DOWN).
+        Finished games and moves that change nothing are left as they are.
+        Returns (score_delta, changed, game_over) arrays.
+        Raises ValueError for any other direction code.
+        """
+        directions = np.asarray(directions)
+        if ((directions < LEFT) | (directions > DOWN)).any():
+            raise ValueError(f"Direction codes must be {LEFT} to {DOWN}, got {directions[(directions < LEFT) | (directions > DOWN)][0]}")
+        new_boards, score_delta, _, made_2048 = move_boards(self.boards, directions)
+        changed = (new_boards != self.boards) & ~self.game_over
+        score_delta = np.where(changed, score_delta, 0)
+
+        self.boards = np.where(changed, new_boards, self.boards)
+        self.scores += score_delta
+        self.won |= changed & made_2048
+        self.moves += changed
+        self.spawn(changed)
+
+        # Only boards that just changed can have become stuck
+        stuck = changed & ~can_move(self.boards)
+        self.game_over |= stuck
+        return score_delta, changed, self.game_over.copy()
+
+    def max_tiles(self):
+        """
+        Returns the largest tile value on every board.
+        """
+        exponents = cells(self.boards).max(axis=1).astype(np.int64)
+        return np.where(exponents > 0, np.left_shift(1, exponents), 0)
+
+    def unpack(self, i):
+        """
+        Returns board i as a 4x4 list-of-lists of tile values.
+        """
+        return bitboard.unpack(int(self.boards[i]))
@@ -0,0 +1,324 @@
+"""
+Performance benchmarks for the move engine and the renderer.
+
+Runs headless (SDL dummy video and audio drivers) and measures:
+
+- moves/sec per direction for the list and bitboard engines on a seeded corpus of boards
+- full random-game throughput of both engines
+- can_move / game over detection on dense (nearly or completely full) boards
+- per-frame Game2048.draw() time on representative boards
+
+Every benchmark is timed in several rounds. The median, min, mean and standard
+deviation are written as JSON, so two runs can be compared. With --compare,
+every benchmark whose median is worse than the baseline by more than
+--threshold is reported, and the exit status is 1.
+
+Example:
+    python benchmark.py --output before.json
+    (change something)
+    python benchmark.py --output after.json --compare before.json --threshold 0.10
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import bitboard
+import core
+from core import GameCore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_ROUNDS = 7
+DEFAULT_MIN_ROUND_TIME = 0.1 # Seconds; the inner loop count is scaled up until a round takes this long
+DEFAULT_THRESHOLD = 0.10 # Relative slowdown reported as a regression
+CORPUS_SIZE = 256
+
+
+def board_corpus(seed, count=CORPUS_SIZE):
+    """
+    Returns count boards sampled from seeded random games at every stage of play.
+    """
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        game = GameCore(use_bitboard=True, seed=rng.random())
+        while not game.game_over:
+            if rng.random() < 0.1:
+                boards.append([row[:] for row in game.board])
+            game.move(rng.choice(bitboard.DIRECTIONS))
+    return boards[:count]
+
+
+def dense_corpus(seed, count=CORPUS_SIZE):
+    """
+    Returns count full boards: final positions of random games (no move left)
+    and full positions that can still move.
+    """
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        game = GameCore(use_bitboard=True, seed=rng.random())
+        while not game.game_over:
+            if not bitboard.count_empty(bitboard.pack(game.board)):
+                boards.append([row[:] for row in game.board])
+            game.move(rng.choice(bitboard.DIRECTIONS))
+        boards.append([row[:] for row in game.board])
+    return boards[:count]
+
+
+def measure(run, rounds=DEFAULT_ROUNDS, min_round_time=DEFAULT_MIN_ROUND_TIME):
+    """
+    Times run(loops), which performs `loops` operations, and returns per-operation
+    statistics in seconds. The loop count is calibrated so a round takes at least
+    min_round_time.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        run(loops)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_round_time / elapsed) + 1))
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run(loops)
+        samples.append((time.perf_counter() - start) / loops)
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'loops': loops,
+    }
+
+
+def bench_moves(args):
+    """
+    GameCore.move per direction and engine on the seeded corpus, including the tile spawn.
+    Each operation restores a corpus board first, so boards do not drift between loops.
+    """
+    boards = board_corpus(args.seed)
+    results = {}
+    for use_bitboard in (False, True):
+        engine = 'bitboard' if use_bitboard else 'list'
+        for direction in bitboard.DIRECTIONS:
+            game = GameCore(use_bitboard=use_bitboard, seed=args.seed)
+
+            def run(loops, game=game, direction=direction):
+                for i in range(loops):
+                    game.board = [row[:] for row in boards[i % len(boards)]]
+                    game.game_over = False
+                    game.move(direction)
+
+            results[f'move.{engine}.{direction}'] = measure(run, args.rounds, args.min_round_time)
+    return results
+
+
+def bench_random_games(args):
+    """
+    Throughput of whole random games, per move.
+    """
+    results = {}
+    for use_bitboard in (False, True):
+        engine = 'bitboard' if use_bitboard else 'list'
+        rng = random.Random(args.seed)
+
+        def run(loops, use_bitboard=use_bitboard, rng=rng):
+            moves = 0
+            while moves < loops:
+                game = GameCore(use_bitboard=use_bitboard, seed=rng.random())
+                while not game.game_over and moves < loops:
+                    game.move(rng.choice(bitboard.DIRECTIONS))
+                    moves += 1
+
+        results[f'random_game.{engine}'] = measure(run, args.rounds, args.min_round_time)
+    return results
+
+
+def bench_can_move(args):
+    """
+    can_move() and is_game_over() on dense boards, where no empty cell short-circuits the scan.
+    """
+    boards = dense_corpus(args.seed)
+    results = {}
+    for use_bitboard in (False, True):
+        engine = 'bitboard' if use_bitboard else 'list'
+        game = GameCore(use_bitboard=use_bitboard, seed=args.seed)
+
+        def run_can_move(loops, game=game):
+            for i in range(loops):
+                game.board = boards[i % len(boards)]
+                game.can_move()
+
+        def run_is_game_over(loops, game=game):
+            for i in range(loops):
+                game.board = boards[i % len(boards)]
+                game.is_game_over()
+
+        results[f'can_move.{engine}'] = measure(run_can_move, args.rounds, args.min_round_time)
+        results[f'is_game_over.{engine}'] = measure(run_is_game_over, args.rounds, args.min_round_time)
+    return results
+
+
+def bench_draw(args):
+    """
+    Game2048.draw() / draw_menu() per frame on representative boards.
+    """
+    import pygame
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__))) # Game assets are looked up relative to the game
+    import main
+    from leaderboard import LeaderboardStore
+
+    # Games load their leaderboard on creation; keep the player's leaderboard.db out of the benchmark
+    temp_dir = tempfile.TemporaryDirectory()
+    saved_store = main.leaderboard_store
+    main.leaderboard_store = LeaderboardStore(os.path.join(temp_dir.name, 'leaderboard.db'),
+                                              os.path.join(temp_dir.name, 'leaderboard.txt'))
+    try:
+        pygame.init()
+        screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+        fonts = main.load_fonts()
+        logging.getLogger().setLevel(logging.WARNING) # Game2048 logs every board change
+
+        rng = random.Random(args.seed)
+        scenes = {
+            'menu': ('MENU', [[0] * core.BOARD_SIZE for _ in range(core.BOARD_SIZE)], False),
+            'early': ('PLAYING', [[2, 0, 0, 0], [0, 4, 0, 0], [0, 0, 0, 2], [0, 0, 0, 0]], False),
+            'mid': ('PLAYING', [[2, 4, 8, 16], [0, 32, 64, 4], [0, 0, 8, 2], [0, 0, 0, 2]], False),
+            'late': ('PLAYING', [[2 ** rng.randint(3, 12) for _ in range(core.BOARD_SIZE)] for _ in range(core.BOARD_SIZE)], False),
+            'game_over': ('GAME_OVER', [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]], True),
+        }
+
+        results = {}
+        for name, (state, board, game_over) in scenes.items():
+            game = main.Game2048(seed=args.seed)
+            game.game_state = state
+            game.board = board
+            game.score = 12345
+            game.game_over = game_over
+            draw = game.draw_menu if state == 'MENU' else game.draw
+
+            def run(loops, draw=draw):
+                for _ in range(loops):
+                    draw(screen, fonts)
+                    main.compositor.draw_scanlines(screen)
+
+            results[f'draw.{name}'] = measure(run, args.rounds, args.min_round_time)
+        pygame.quit()
+    finally:
+        main.leaderboard_store.close()
+        main.leaderboard_store = saved_store
+        temp_dir.cleanup()
+        os.chdir(cwd)
+    return results
+
+
+BENCHMARKS = {
+    'moves': bench_moves,
+    'random_games': bench_random_games,
+    'can_move': bench_can_move,
+    'draw': bench_draw,
+}
+
+
+def compare(baseline, current, threshold):
+    """
+    Compares the medians of two result sets (lower is better).
+    Returns a list of (name, baseline_median, current_median, relative_change) for every
+    benchmark present in both, and the subset of those that regressed beyond threshold.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        change = result['median'] / before['median'] - 1
+        rows.append((name, before['median'], result['median'], change))
+    regressions = [row for row in rows if row[3] > threshold]
+    return rows, regressions
+
+
+def format_time(seconds):
+    """
+    Formats a duration with a unit that keeps a few significant digits.
+    """
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the 2048 move engine and renderer.")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"comma-separated groups to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--seed', type=int, default=2048, help="seed for the board corpora and games")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="timed rounds per benchmark")
+    parser.add_argument('--min-round-time', type=float, default=DEFAULT_MIN_ROUND_TIME,
+                        help="minimum seconds per round, the loop count is calibrated to reach it")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare against a previous JSON result file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown of the median reported as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    groups = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = [name for name in groups if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark groups {unknown}, choose from {list(BENCHMARKS)}")
+
+    results = {}
+    for group in groups:
+        logging.info(f"Running {group} benchmarks...")
+        results.update(BENCHMARKS[group](args))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    for name, result in results.items():
+        print(f"{name:<28} {format_time(result['median']):>10} / op   "
+              f"(min {format_time(result['min'])}, {1 / result['median']:,.0f} ops/sec)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, report, args.threshold)
+        print(f"\nComparison with {args.compare}:")
+        for name, before, after, change in rows:
+            flag = "  REGRESSION" if change > args.threshold else ""
+            print(f"{name:<28} {format_time(before):>10} -> {format_time(after):>10}  {change:+.1%}{flag}")
+        if regressions:
+            logging.warning(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+64-bit bitboard engine for 2048.
+
+The 4x4 board is packed into a single integer: every cell holds the log2
+exponent of its tile in 4 bits (0 = empty, 1 = 2, 2 = 4, ... 15 = 32768).
+Row r lives in bits 16*r .. 16*r+15 and column c of that row in bits 4*c .. 4*c+3,
+so the leftmost cell of a row is its lowest nibble.
+
+Every possible 16-bit row is slid and merged once at import time; a move is
+then four table lookups (left/right) or a transpose plus four lookups (up/down).
+
+The rules match the list engine in core.py up to 32768, the largest tile a
+nibble holds. Two 32768 tiles never merge here (the list engine makes a
+65536), and pack() raises ValueError for boards with larger tiles.
+"""
+
+BOARD_SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15 # 32768 is the largest tile a nibble can hold
+WIN_EXPONENT = 11 # 2048
+
+DIRECTIONS = ('left', 'right', 'up', 'down')
+
+
+def _reverse_row(row):
+    """
+    Reverses the order of the four nibbles in a 16-bit row.
+    """
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+def _slide_row_left(row):
+    """
+    Slides and merges one 16-bit row to the left, following the same rules as
+    Game2048.move_left (each tile merges at most once, leftmost pair first).
+    Returns (new_row, score_delta, merges, made_2048).
+    """
+    tiles = [(row >> (4 * c)) & 0xF for c in range(BOARD_SIZE)]
+    tiles = [e for e in tiles if e != 0]
+
+    merged = []
+    score = 0
+    merges = 0
+    made_2048 = False
+    i = 0
+    while i < len(tiles):
+        # Two 32768 tiles cannot be represented once merged, so they stay apart
+        if i + 1 < len(tiles) and tiles[i] == tiles[i+1] and tiles[i] < MAX_EXPONENT:
+            exponent = tiles[i] + 1
+            merged.append(exponent)
+            score += 1 << exponent
+            merges += 1
+            if exponent == WIN_EXPONENT:
+                made_2048 = True
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+
+    new_row = 0
+    for c, exponent in enumerate(merged):
+        new_row |= exponent << (4 * c)
+    return new_row, score, merges, made_2048
+
+
+def _build_tables():
+    """
+    Precomputes the result of a left and right move for all 65,536 rows.
+    Score, merge count and the 2048 flag do not depend on the direction a row
+    is slid in, so they are stored once.
+    """
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    row_score = [0] * 65536
+    row_merges = [0] * 65536
+    row_win = [False] * 65536
+
+    for row in range(65536):
+        new_row, score, merges, made_2048 = _slide_row_left(row)
+        row_left[row] = new_row
+        row_score[row] = score
+        row_merges[row] = merges
+        row_win[row] = made_2048
+
+    for row in range(65536):
+        row_right[row] = _reverse_row(row_left[_reverse_row(row)])
+
+    return row_left, row_right, row_score, row_merges, row_win
+
+
+ROW_LEFT, ROW_RIGHT, ROW_SCORE, ROW_MERGES, ROW_WIN = _build_tables()
+
+
+def pack(board):
+    """
+    Packs a 4x4 list-of-lists board of tile values into a 64-bit integer.
+    Raises ValueError if a tile is larger than 32768 (1 << MAX_EXPONENT).
+    """
+    packed = 0
+    shift = 0
+    for row in board:
+        for value in row:
+            if value:
+                exponent = value.bit_length() - 1
+                if exponent > MAX_EXPONENT:
+                    raise ValueError(f"Tile {value} does not fit a bitboard (largest is {1 << MAX_EXPONENT})")
+                packed |= exponent << shift
+            shift += 4
+    return packed
+
+
+def unpack(packed):
+    """
+    Unpacks a 64-bit board into a 4x4 list-of-lists of tile values.
+    """
+    board = []
+    for r in range(BOARD_SIZE):
+        row = []
+        for c in range(BOARD_SIZE):
+            exponent = (packed >> (16 * r + 4 * c)) & 0xF
+            row.append(1 << exponent if exponent else 0)
+        board.append(row)
+    return board
+
+
+def transpose(packed):
+    """
+    Transposes the board (rows become columns) with a fixed sequence of masks and shifts.
+    """
+    a1 = packed & 0xF0F00F0FF0F00F0F
+    a2 = packed & 0x0000F0F00000F0F0
+    a3 = packed & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(packed):
+    """
+    Mirrors the board left to right (reverses the cells of every row).
+    """
+    return (((packed & 0xF000F000F000F000) >> 12) | ((packed & 0x0F000F000F000F00) >> 4)
+            | ((packed & 0x00F000F000F000F0) << 4) | ((packed & 0x000F000F000F000F) << 12))
+
+
+def flip(packed):
+    """
+    Flips the board upside down (reverses the order of the rows).
+    """
+    return (((packed & 0xFFFF) << 48) | ((packed & 0xFFFF0000) << 16)
+            | ((packed >> 16) & 0xFFFF0000) | (packed >> 48))
+
+
+def symmetries(packed):
+    """
+    Returns the board under all 8 rotations and reflections, starting with itself.
+    The rules treat every form the same, so all 8 have the same value.
+    """
+    flipped = flip(packed)
+    forms = [packed, mirror(packed), flipped, mirror(flipped)]
+    return forms + [transpose(form) for form in forms]
+
+
+def canonical(packed):
+    """
+    Returns the smallest of the board's 8 symmetric forms, the same for all of them.
+    """
+    flipped = flip(packed)
+    turned = transpose(packed)
+    turned_flipped = flip(turned)
+    return min(packed, mirror(packed), flipped, mirror(flipped),
+               turned, mirror(turned), turned_flipped, mirror(turned_flipped))
+
+
+def _apply_rows(packed, table):
+    """
+    Replaces every row of the board by its entry in the given row table.
+    """
+    return (table[packed & ROW_MASK]
+            | (table[(packed >> 16) & ROW_MASK] << 16)
+            | (table[(packed >> 32) & ROW_MASK] << 32)
+            | (table[(packed >> 48) & ROW_MASK] << 48))
+
+
+def move_left(packed):
+    """
+    Returns the board after moving left (no tile is spawned).
+    """
+    return _apply_rows(packed, ROW_LEFT)
+
+
+def move_right(packed):
+    """
+    Returns the board after moving right (no tile is spawned).
+    """
+    return _apply_rows(packed, ROW_RIGHT)
+
+
+def move_up(packed):
+    """
+    Returns the board after moving up (no tile is spawned).
+    """
+    return transpose(_apply_rows(transpose(packed), ROW_LEFT))
+
+
+def move_down(packed):
+    """
+    Returns the board after moving down (no tile is spawned).
+    """
+    return transpose(_apply_rows(transpose(packed), ROW_RIGHT))
+
+
+MOVE_FUNCTIONS = {
+    'left': move_left,
+    'right': move_right,
+    'up': move_up,
+    'down': move_down,
+}
+
+
+# direction -> (works on the transposed board, row table); up/down are left/right on the transposed rows
+MOVE_TABLES = {
+    'left': (False, ROW_LEFT),
+    'right': (False, ROW_RIGHT),
+    'up': (True, ROW_LEFT),
+    'down': (True, ROW_RIGHT),
+}
+
+
+def move(packed, direction):
+    """
+    Moves the board in the given direction ('left', 'right', 'up' or 'down').
+    Returns (new_board, score_delta, merges, made_2048). Raises ValueError for any other direction.
+    """
+    try:
+        vertical, table = MOVE_TABLES[direction]
+    except KeyError:
+        raise ValueError(f"Unknown direction {direction!r}, expected one of {DIRECTIONS}") from None
+    rows = transpose(packed) if vertical else packed
+
+    new_rows = 0
+    score = 0
+    merges = 0
+    made_2048 = False
+    for shift in (0, 16, 32, 48):
+        row = (rows >> shift) & ROW_MASK
+        new_rows |= table[row] << shift
+        score += ROW_SCORE[row]
+        merges += ROW_MERGES[row]
+        made_2048 = made_2048 or ROW_WIN[row]
+
+    new_board = transpose(new_rows) if vertical else new_rows
+    return new_board, score, merges, made_2048
+
+
+def afterstates(packed):
+    """
+    Returns (direction, board after the move, score gained) for every move that
+    changes the board. The boards are before the new tile spawns.
+    """
+    moves = []
+    for direction in DIRECTIONS:
+        after, score, _, _ = move(packed, direction)
+        if after != packed:
+            moves.append((direction, after, score))
+    return moves
+
+
+def count_empty(packed):
+    """
+    Returns the number of empty cells on the board.
+    """
+    # Fold every nibble onto its lowest bit, then count the occupied ones
+    occupied = packed | (packed >> 1)
+    occupied |= occupied >> 2
+    occupied &= 0x1111111111111111
+    return 16 - occupied.bit_count()
+
+
+def empty_cells(packed):
+    """
+    Returns the list of empty cell indices (0..15, row-major).
+    """
+    return [i for i in range(16) if not (packed >> (4 * i)) & 0xF]
+
+
+def set_cell(packed, index, exponent):
+    """
+    Returns the board with the cell at index (0..15, row-major) set to exponent.
+    """
+    shift = 4 * index
+    return (packed & ~(0xF << shift)) | (exponent << shift)
+
+
+def can_move(packed):
+    """
+    Checks if any move is possible (an empty cell or two equal neighbours).
+    """
+    if count_empty(packed):
+        return True
+    # On a full board a horizontal or vertical move only changes it if two neighbours match
+    return move_left(packed) != packed or move_up(packed) != packed
+
+
+def max_exponent(packed):
+    """
+    Returns the exponent of the largest tile on the board.
+    """
+    best = 0
+    while packed:
+        exponent = packed & 0xF
+        if exponent > best:
+            best = exponent
+        packed >>= 4
+    return best
@@ -0,0 +1,377 @@
+"""
+Headless 2048 game core.
+
+GameCore holds only the rules: the board, score, tile spawning, moves and the
+game over check. It has no pygame, sound, logging or leaderboard side effects,
+so batch jobs can create and step millions of games without loading SDL.
+Game2048 in main.py wraps it with the pygame front end.
+
+The board size is chosen per game (4x4 by default). Moves slide every line
+of the board in place along precomputed cell orders, so no rotated copies of
+the board are made. Every cell write also updates the number of empty cells
+per row and the number of adjacent equal tiles (mergeable pairs), looking
+only at the neighbours of the changed cell. Spawning a tile then walks the
+row counts instead of scanning the grid, and can_move() is O(1). Replacing
+the whole board (the board setter) recounts the pairs once, on the next
+can_move(). The packed 64-bit engine (bitboard.py) is available for 4x4 games.
+It plays by the same rules only up to 32768 tiles: it never merges two 32768
+tiles and cannot hold a larger one, so games that get that far can differ
+between the engines.
+
+Spawns come from the game's own spawnrng.SpawnRNG, seeded by the game's
+seed and independent of any other randomness. Both engines pick the spawn
+cell the same way (the k-th empty cell in row-major order), so a seed plays
+the same game on either (until a 32768 pair, see above), headless or in
+the front end.
+
+An eventlog.EventLog can be attached as `events` to record every move, spawn
+and game over (and, on the list engine, every merge). With none attached the
+core pays one `is not None` check per event.
+
+Run `python core.py` to measure raw move throughput of both engines.
+"""
+import functools
+import random
+import time
+
+import bitboard
+from spawnrng import SpawnRNG
+
+BOARD_SIZE = 4 # Default board size
+MIN_BOARD_SIZE = 2
+MAX_BOARD_SIZE = 16
+WIN_VALUE = 2048
+
+
+@functools.lru_cache(maxsize=None)
+def line_cells(size):
+    """
+    Returns {direction: lines} for a board size. Each line lists its (row, col)
+    cells starting from the edge the tiles slide towards.
+    """
+    cells = range(size)
+    return {
+        'left': [[(r, c) for c in cells] for r in cells],
+        'right': [[(r, c) for c in reversed(cells)] for r in cells],
+        'up': [[(r, c) for r in cells] for c in cells],
+        'down': [[(r, c) for r in reversed(cells)] for c in cells],
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def cell_neighbours(size):
+    """
+    Returns neighbours[r][c], the (row, col) cells adjacent to every cell of a board size.
+    """
+    return [[[(nr, nc) for nr, nc in ((r, c - 1), (r, c + 1), (r - 1, c), (r + 1, c))
+              if 0 <= nr < size and 0 <= nc < size]
+             for c in range(size)] for r in range(size)]
+
+
+def count_pairs(board):
+    """
+    Returns the number of horizontally or vertically adjacent equal tiles on a board.
+    """
+    pairs = 0
+    for line in board + list(zip(*board)): # Rows, then columns
+        previous = 0
+        for value in line:
+            if value and value == previous:
+                pairs += 1
+            previous = value
+    return pairs
+
+
+def spawn_packed(packed, rng):
+    """
+    Spawns a tile on a packed 4x4 board the way GameCore does, drawing from rng.
+    The board must have an empty cell. Returns (board, cell index, exponent).
+    """
+    empty = bitboard.empty_cells(packed)
+    k, exponent = rng.spawn(len(empty))
+    index = empty[k]
+    return bitboard.set_cell(packed, index, exponent), index, exponent
+
+
+class GameCore:
+    """
+    Pure 2048 game state and rules.
+    """
+    def __init__(self, use_bitboard=False, seed=None, size=BOARD_SIZE, events=None, rng=None):
+        if not MIN_BOARD_SIZE <= size <= MAX_BOARD_SIZE:
+            raise ValueError(f"Board size must be between {MIN_BOARD_SIZE} and {MAX_BOARD_SIZE}, got {size}")
+        if use_bitboard and size != bitboard.BOARD_SIZE:
+            raise ValueError(f"The bitboard engine only plays {bitboard.BOARD_SIZE}x{bitboard.BOARD_SIZE} boards")
+
+        self.size = size
+        self.neighbours = cell_neighbours(size)
+        self.board = [[0] * size for _ in range(size)]
+        self.score = 0
+        self.game_over = False
+        self.won = False # Track if a 2048 tile was merged
+        self.use_bitboard = use_bitboard # Run moves on the packed 64-bit engine (bitboard.py), tiles up to 32768 only
+        self.seed = seed
+        self.rng = rng if rng is not None else SpawnRNG(seed) # Per-game spawn generator, so seeded games are reproducible
+        self.last_merges = 0 # Number of merges made by the last move
+        self.last_spawn = None # (row-major cell index, exponent) of the last spawned tile, None if the move spawned nothing
+        self.events = events # Optional eventlog.EventLog recording moves, merges and spawns
+
+        # Engine counters for profiling, along the moves that led to this position (undo rewinds them)
+        self.moves_made = 0
+        self.merges_made = 0
+        self.tiles_spawned = 0
+
+        self.init_board()
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        """
+        Replaces the whole board and recounts its empty cells. The mergeable pairs
+        are recounted when next needed. Moves update the board in place through
+        set_cell() instead.
+        """
+        self._board = board
+        self.row_empty = [row.count(0) for row in board] # Empty cells per row
+        self.empty_count = sum(self.row_empty)
+        self._pair_count = None
+
+    @property
+    def pair_count(self):
+        """
+        Number of adjacent equal tiles, horizontally or vertically.
+        """
+        if self._pair_count is None:
+            self._pair_count = count_pairs(self._board)
+        return self._pair_count
+
+    def set_cell(self, r, c, value):
+        """
+        Writes one cell and updates the empty and mergeable pair counts from its neighbours.
+        """
+        board = self._board
+        row = board[r]
+        old = row[c]
+        if old == value:
+            return
+        if self._pair_count is not None:
+            for nr, nc in self.neighbours[r][c]:
+                neighbour = board[nr][nc]
+                if neighbour == old and old:
+                    self._pair_count -= 1
+                elif neighbour == value and value:
+                    self._pair_count += 1
+        row[c] = value
+        if not old:
+            self.row_empty[r] -= 1
+            self.empty_count -= 1
+        elif not value:
+            self.row_empty[r] += 1
+            self.empty_count += 1
+
+    def init_board(self):
+        """
+        Initializes the game board with two random tiles.
+        """
+        self.add_random_tile()
+        self.add_random_tile()
+
+    def add_random_tile(self):
+        """
+        Adds a new tile (2 or 4) to a random empty cell.
+        Returns True if successful, False otherwise (no empty cells).
+        """
+        if not self.empty_count:
+            return False
+
+        # The k-th empty cell in row-major order, like spawn_packed(),
+        # found through the per-row counts instead of listing them
+        k, exponent = self.rng.spawn(self.empty_count)
+        row_empty = self.row_empty
+        row = 0
+        while k >= row_empty[row]:
+            k -= row_empty[row]
+            row += 1
+        cells = self._board[row]
+        col = 0
+        while True:
+            if not cells[col]:
+                if not k:
+                    break
+                k -= 1
+            col += 1
+
+        value = 1 << exponent # 90% chance of 2, 10% chance of 4
+        self.set_cell(row, col, value)
+        self.last_spawn = (row * self.size + col, exponent)
+        self.tiles_spawned += 1
+        if self.events is not None:
+            self.events.spawn(row, col, value)
+        return True
+
+    def can_move(self):
+        """
+        Checks if any moves are possible (any empty cells or adjacent same tiles).
+        """
+        if self.use_bitboard:
+            return bitboard.can_move(bitboard.pack(self.board))
+
+        return self.empty_count > 0 or self.pair_count > 0
+
+    def is_game_over(self):
+        """
+        Checks if the game is over and sets game_over accordingly.
+        Game is over if there are no empty cells and no possible moves (adjacent same tiles).
+        """
+        is_over = not self.can_move()
+        if is_over:
+            self.game_over = True
+        return is_over
+
+    def slide(self, direction):
+        """
+        Slides and merges every line towards direction, in place.
+        Each tile merges at most once, the pair nearest the edge first.
+        Returns True if any tile moved or merged, False otherwise.
+        """
+        board = self._board
+        set_cell = self.set_cell
+        size = self.size
+        events = self.events
+        board_changed = False
+        for line in line_cells(size)[direction]:
+            tiles = [board[r][c] for r, c in line]
+
+            # Merge adjacent same tiles, skipping zeros
+            merged = []
+            pending = 0 # Last tile seen that can still merge
+            for tile in tiles:
+                if not tile:
+                    continue
+                if tile == pending:
+                    merged_value = tile * 2
+                    merged.append(merged_value)
+                    self.score += merged_value
+                    self.last_merges += 1
+                    if merged_value == WIN_VALUE:
+                        self.won = True
+                    if events is not None:
+                        r, c = line[len(merged) - 1]
+                        events.merge(r, c, merged_value)
+                    pending = 0 # A merged tile does not merge again
+                else:
+                    if pending:
+                        merged.append(pending)
+                    pending = tile
+            if pending:
+                merged.append(pending)
+
+            # Write the line back, packed against the edge, updating only the cells that changed
+            merged += [0] * (size - len(merged))
+            if merged == tiles:
+                continue
+            board_changed = True
+            for (r, c), old, new in zip(line, tiles, merged):
+                if old != new:
+                    set_cell(r, c, new)
+
+        if board_changed:
+            self.add_random_tile()
+            self.is_game_over() # Check for game over only if a move was made and new tile added
+
+        return board_changed
+
+    def move_left(self):
+        """
+        Moves tiles to the left and merges them.
+        Returns True if any tiles moved or merged, False otherwise.
+        """
+        return self.slide('left')
+
+    def move_bitboard(self, direction):
+        """
+        Performs a move on the packed 64-bit board using the precomputed row tables.
+        Behaves exactly like slide(), including the spawn.
+        Returns True if the board changed, False otherwise.
+        """
+        packed = bitboard.pack(self.board)
+        new_packed, score_delta, merges, made_2048 = bitboard.move(packed, direction)
+        if new_packed == packed:
+            return False
+
+        self.score += score_delta
+        self.last_merges = merges
+        if made_2048:
+            self.won = True
+
+        # Spawn on the packed board so it is unpacked only once per move.
+        # A move that changed the board always leaves an empty cell.
+        new_packed, index, exponent = spawn_packed(new_packed, self.rng)
+        self.last_spawn = (index, exponent)
+        self.tiles_spawned += 1
+        self.board = bitboard.unpack(new_packed)
+        if self.events is not None:
+            self.events.spawn(*divmod(index, bitboard.BOARD_SIZE), 1 << exponent)
+
+        if not bitboard.can_move(new_packed):
+            self.game_over = True
+        return True
+
+    def move(self, direction):
+        """
+        Handles tile movement based on the direction input.
+        Returns True if the board changed, False otherwise.
+        Raises ValueError unless direction is one of bitboard.DIRECTIONS, on both engines.
+        """
+        if direction not in bitboard.DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction!r}, expected one of {bitboard.DIRECTIONS}")
+        self.last_merges = 0
+        self.last_spawn = None
+        if self.use_bitboard:
+            moved = self.move_bitboard(direction)
+        else:
+            moved = self.slide(direction)
+
+        if moved:
+            self.moves_made += 1
+            self.merges_made += self.last_merges
+        if self.events is not None:
+            self.events.move(direction, moved, self.last_merges, self.score)
+            if moved and self.game_over:
+                self.events.game_over(self.score, self.moves_made)
+        return moved
+
+
+def measure_throughput(use_bitboard, seconds=2.0, seed=0, size=BOARD_SIZE):
+    """
+    Plays random games back to back for the given time.
+    Returns (moves_per_second, games_played).
+    """
+    rng = random.Random(seed)
+    directions = bitboard.DIRECTIONS
+    moves = 0
+    games = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        game = GameCore(use_bitboard=use_bitboard, seed=rng.random(), size=size)
+        games += 1
+        while not game.game_over:
+            game.move(rng.choice(directions))
+            moves += 1
+            if not moves % 1024 and time.perf_counter() >= deadline: # Games on large boards can run for a very long time
+                break
+    return moves / (time.perf_counter() - start), games
+
+
+if __name__ == '__main__':
+    for use_bitboard in (False, True):
+        moves_per_second, games = measure_throughput(use_bitboard)
+        engine = "bitboard" if use_bitboard else "list"
+        print(f"{engine:>8}: {moves_per_second:,.0f} moves/sec over {games} games")
+    for size in (5, 8, 16):
+        moves_per_second, games = measure_throughput(False, seconds=1.0, size=size)
+        print(f"{size:>2}x{size:<2} list: {moves_per_second:,.0f} moves/sec over {games} games")
@@ -0,0 +1,260 @@
+"""
+Memory-mapped transition datasets for training pipelines.
+
+A dataset is a directory of raw little-endian arrays, one element per
+transition (board, action, reward, next board), plus an index of game
+boundaries:
+
+    boards.u64        packed board before the move (bitboard.pack layout)
+    actions.u8        direction index in bitboard.DIRECTIONS
+    rewards.u32       score gained by the move
+    next_boards.u64   packed board after the move and the tile spawn
+    terminals.u8      1 if the game is over after the move
+    game_starts.u64   index of the first transition of every game
+    meta.json         format version and the committed transition and game counts
+
+The files are only ever appended to. meta.json is replaced atomically
+after each flush, and readers only map the committed counts. That means a
+dataset can be read while a long self-play run is still writing it, and a
+crashed writer loses at most its unflushed games. DatasetReader maps every
+array with np.memmap, so slicing is zero-copy; shuffled batches gather
+through a permutation.
+
+Example:
+    python selfplay.py --games 100000 --policy greedy --export data/greedy
+    python dataset.py info data/greedy
+    python dataset.py from-replays data/human replays/*.2048r
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+import bitboard
+from replay import Replay
+
+VERSION = 1
+META_FILE = 'meta.json'
+# name -> dtype of every per-transition column
+COLUMNS = {
+    'boards': np.dtype('<u8'),
+    'actions': np.dtype('u1'),
+    'rewards': np.dtype('<u4'),
+    'next_boards': np.dtype('<u8'),
+    'terminals': np.dtype('u1'),
+}
+GAME_STARTS = 'game_starts'
+GAME_STARTS_DTYPE = np.dtype('<u8')
+DEFAULT_FLUSH_EVERY = 64 # Games buffered in memory before they are appended
+
+
+def _column_path(path, name, dtype):
+    return os.path.join(path, f"{name}.{dtype.kind}{dtype.itemsize * 8}")
+
+
+def read_meta(path):
+    """
+    Returns the committed metadata of the dataset at path.
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('version') != VERSION:
+        raise ValueError(f"Unsupported dataset version {meta.get('version')} in '{path}'")
+    return meta
+
+
+class DatasetWriter:
+    """
+    Appends games of transitions to a dataset directory.
+    With append=True an existing dataset is continued, otherwise it is replaced.
+    """
+    def __init__(self, path, append=False, flush_every=DEFAULT_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        os.makedirs(path, exist_ok=True)
+
+        if append and os.path.exists(os.path.join(path, META_FILE)):
+            meta = read_meta(path)
+            self.transitions = meta['transitions']
+            self.games = meta['games']
+        else:
+            self.transitions = 0
+            self.games = 0
+
+        # Drop anything past the committed counts, left by a writer that did not finish
+        self.files = {}
+        for name, dtype in COLUMNS.items():
+            self.files[name] = self._open(_column_path(path, name, dtype), self.transitions * dtype.itemsize)
+        self.files[GAME_STARTS] = self._open(_column_path(path, GAME_STARTS, GAME_STARTS_DTYPE),
+                                             self.games * GAME_STARTS_DTYPE.itemsize)
+
+        self.pending = {name: [] for name in COLUMNS}
+        self.pending_starts = []
+        self.pending_transitions = 0
+        self._write_meta()
+
+    def _open(self, file_path, committed_bytes):
+        f = open(file_path, 'ab')
+        f.truncate(committed_bytes)
+        return f
+
+    def append_game(self, boards, actions, rewards, next_boards, terminals):
+        """
+        Buffers one game's transitions (equal-length sequences); flushes every flush_every games.
+        """
+        count = len(actions)
+        if not count:
+            return
+        self.pending_starts.append(self.transitions + self.pending_transitions)
+        self.pending['boards'].append(np.asarray(boards, dtype=COLUMNS['boards']))
+        self.pending['actions'].append(np.asarray(actions, dtype=COLUMNS['actions']))
+        self.pending['rewards'].append(np.asarray(rewards, dtype=COLUMNS['rewards']))
+        self.pending['next_boards'].append(np.asarray(next_boards, dtype=COLUMNS['next_boards']))
+        self.pending['terminals'].append(np.asarray(terminals, dtype=COLUMNS['terminals']))
+        self.pending_transitions += count
+        if len(self.pending_starts) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered games to the files and commits them in meta.json.
+        """
+        if not self.pending_starts:
+            return
+        for name, chunks in self.pending.items():
+            self.files[name].write(np.concatenate(chunks).tobytes())
+            chunks.clear()
+        self.files[GAME_STARTS].write(np.asarray(self.pending_starts, dtype=GAME_STARTS_DTYPE).tobytes())
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno()) # Data must be on disk before meta.json points at it
+
+        self.transitions += self.pending_transitions
+        self.games += len(self.pending_starts)
+        self.pending_starts = []
+        self.pending_transitions = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            'version': VERSION,
+            'transitions': self.transitions,
+            'games': self.games,
+            'columns': {name: dtype.str for name, dtype in COLUMNS.items()},
+            'directions': list(bitboard.DIRECTIONS),
+        }
+        temp_path = os.path.join(self.path, META_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, os.path.join(self.path, META_FILE))
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetReader:
+    """
+    Read-only memory-mapped view of the committed part of a dataset.
+    """
+    def __init__(self, path):
+        self.path = path
+        meta = read_meta(path)
+        self.transitions = meta['transitions']
+        self.games = meta['games']
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, self._map(_column_path(path, name, dtype), dtype, self.transitions))
+        self.game_starts = self._map(_column_path(path, GAME_STARTS, GAME_STARTS_DTYPE), GAME_STARTS_DTYPE, self.games)
+
+    def _map(self, file_path, dtype, count):
+        if not count: # np.memmap cannot map an empty file
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=(count,))
+
+    def __len__(self):
+        return self.transitions
+
+    def columns(self, index):
+        """
+        Returns {column: values[index]}. Slices are zero-copy views of the files;
+        index arrays gather a copy.
+        """
+        return {name: getattr(self, name)[index] for name in COLUMNS}
+
+    def game_slice(self, game):
+        """
+        Returns the slice of transitions belonging to the given game number.
+        """
+        start = int(self.game_starts[game])
+        stop = int(self.game_starts[game + 1]) if game + 1 < self.games else self.transitions
+        return slice(start, stop)
+
+    def game_of(self, indices):
+        """
+        Returns the game number of every transition index.
+        """
+        return np.searchsorted(self.game_starts, indices, side='right') - 1
+
+    def shuffled_batches(self, batch_size, seed=None):
+        """
+        Yields {column: array} batches covering every transition once in random order.
+        """
+        order = np.random.default_rng(seed).permutation(self.transitions)
+        for start in range(0, self.transitions, batch_size):
+            indices = np.sort(order[start:start + batch_size]) # Sorted gathers read the files sequentially
+            yield self.columns(indices)
+
+
+def replay_transitions(replay):
+    """
+    Returns the (boards, actions, rewards, next_boards, terminals) transitions of a Replay.
+    """
+    positions = list(replay.positions())
+    boards = [packed for _, packed, _ in positions[:-1]]
+    next_boards = [packed for _, packed, _ in positions[1:]]
+    rewards = [after[2] - before[2] for before, after in zip(positions, positions[1:])]
+    actions = [byte & 0x03 for byte in replay.moves]
+    terminals = [0] * len(actions)
+    if terminals and not bitboard.can_move(next_boards[-1]):
+        terminals[-1] = 1
+    return boards, actions, rewards, next_boards, terminals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect memory-mapped 2048 transition datasets.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="print the size and statistics of a dataset")
+    info.add_argument('path')
+    build = commands.add_parser('from-replays', help="append the games of replay files to a dataset")
+    build.add_argument('path')
+    build.add_argument('replays', nargs='+')
+    build.add_argument('--replace', action='store_true', help="start a new dataset instead of appending")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'from-replays':
+        with DatasetWriter(args.path, append=not args.replace) as writer:
+            for replay_path in args.replays:
+                writer.append_game(*replay_transitions(Replay.load(replay_path)))
+        logging.info(f"'{args.path}' now holds {writer.transitions} transitions from {writer.games} games.")
+    else:
+        reader = DatasetReader(args.path)
+        actions = np.bincount(reader.actions, minlength=len(bitboard.DIRECTIONS)) if len(reader) else []
+        logging.info(f"'{args.path}': {len(reader)} transitions, {reader.games} games, "
+                     f"{int(reader.terminals.sum())} terminal, "
+                     f"actions {dict(zip(bitboard.DIRECTIONS, (int(n) for n in actions)))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Post-processing compositor for the cyberpunk effects.
+
+The static layers (background with the base neon grid, the CRT scanlines and
+every frame of the swaying grid animation) are baked into surfaces once and
+rebaked only when the screen size changes. Each frame then applies them with
+a single blit per layer instead of dozens of pygame.draw.line calls. The
+glitch band is copied through a preallocated surface instead of a fresh
+subsurface copy.
+"""
+import pygame
+
+COLORKEY = (255, 0, 128) # Transparent colour of the baked line layers, not used by any effect
+GRID_LINE_WIDTH = 3
+GRID_ANIMATION_OFFSETS = range(-5, 5) # int(ticks * 0.02 % 10 - 5) takes these values
+GLITCH_MAX_HEIGHT = 15
+
+
+class Compositor:
+    """
+    Bakes and applies the background grid, grid animation, scanline and glitch layers.
+    """
+    def __init__(self, background_color, grid_color, grid_xs, grid_ys, grid_top,
+                 scanline_color=(0, 0, 0), scanline_spacing=3):
+        self.background_color = background_color
+        self.grid_color = grid_color
+        self.grid_xs = grid_xs # x of every vertical grid line
+        self.grid_ys = grid_ys # y of every horizontal grid line
+        self.grid_top = grid_top # Vertical lines start below the score bar
+        self.scanline_color = scanline_color
+        self.scanline_spacing = scanline_spacing
+
+        self.size = None
+        self.background = None
+        self.scanlines = None
+        self.grid_frames = {}
+        self.glitch_band = None
+
+    def set_grid(self, grid_xs, grid_ys):
+        """
+        Moves the grid lines (e.g. for another board size); the layers are rebaked on the next draw.
+        """
+        self.grid_xs = grid_xs
+        self.grid_ys = grid_ys
+        self.size = None
+
+    def _line_layer(self, size):
+        """
+        Returns an empty layer to draw lines on; its colorkey is set once drawing is done.
+        """
+        layer = pygame.Surface(size).convert()
+        layer.fill(COLORKEY)
+        return layer
+
+    def ensure_size(self, size):
+        """
+        Bakes all layers for the given screen size, unless they already match it.
+        """
+        size = tuple(size)
+        if size == self.size:
+            return
+        self.size = size
+        width, height = size
+
+        # Background with the static neon grid
+        self.background = pygame.Surface(size).convert()
+        self.background.fill(self.background_color)
+        for x in self.grid_xs:
+            pygame.draw.line(self.background, self.grid_color, (x, self.grid_top), (x, height), GRID_LINE_WIDTH)
+        for y in self.grid_ys:
+            pygame.draw.line(self.background, self.grid_color, (0, y), (width, y), GRID_LINE_WIDTH)
+
+        # One frame of the swaying grid lines per possible offset
+        self.grid_frames = {}
+        for offset in GRID_ANIMATION_OFFSETS:
+            layer = self._line_layer(size)
+            for x in self.grid_xs:
+                pygame.draw.line(layer, self.grid_color,
+                                 (x + offset, self.grid_top + offset),
+                                 (x - offset, height - offset),
+                                 1)
+            layer.set_colorkey(COLORKEY, pygame.RLEACCEL)
+            self.grid_frames[offset] = layer
+
+        # CRT scanlines
+        self.scanlines = self._line_layer(size)
+        for y in range(0, height, self.scanline_spacing):
+            pygame.draw.line(self.scanlines, self.scanline_color, (0, y), (width, y), 1)
+        self.scanlines.set_colorkey(COLORKEY, pygame.RLEACCEL)
+
+        self.glitch_band = pygame.Surface((width, GLITCH_MAX_HEIGHT)).convert()
+
+    def draw_background(self, screen):
+        """
+        Draws the background and the static grid in one blit.
+        """
+        self.ensure_size(screen.get_size())
+        screen.blit(self.background, (0, 0))
+
+    def draw_grid_animation(self, screen, offset):
+        """
+        Draws the baked swaying grid lines for the given offset.
+        """
+        self.ensure_size(screen.get_size())
+        screen.blit(self.grid_frames[offset], (0, 0))
+
+    def draw_scanlines(self, screen):
+        """
+        Draws the scanline layer in one blit.
+        """
+        self.ensure_size(screen.get_size())
+        screen.blit(self.scanlines, (0, 0))
+
+    def glitch(self, screen, y, height, offset):
+        """
+        Shifts a horizontal band of the screen sideways by offset pixels.
+        """
+        self.ensure_size(screen.get_size())
+        area = pygame.Rect(0, y, screen.get_width(), min(height, GLITCH_MAX_HEIGHT))
+        self.glitch_band.blit(screen, (0, 0), area)
+        screen.blit(self.glitch_band, (offset, y), (0, 0, area.width, area.height))
@@ -0,0 +1,101 @@
+"""
+Debug tracing for the game core that costs nothing when it is off.
+
+Two switches keep tracing out of the move hot path:
+
+- DEBUG is a module-level flag (set_debug()). Per-move debug log lines are
+  only formatted behind `if eventlog.DEBUG:`, so at INFO level no f-string
+  is built and no logging call is made.
+- GameCore.events is None unless an EventLog is attached. The core checks it
+  once per move, merge and spawn and only then appends an event.
+
+EventLog is a ring buffer of structured events (moves, merges, spawns, game
+over) holding the most recent capacity of them. It can be dumped as JSON
+lines at any time, e.g. when a bug shows up in a long autoplay session.
+
+Example:
+    python main.py --event-log 10000   # F5 writes the last 10000 events to events.jsonl
+    python main.py --debug             # per-move debug lines and board dumps
+"""
+import collections
+import json
+import logging
+import time
+
+DEBUG = False # Checked before every per-move debug log line
+DEFAULT_CAPACITY = 10000
+
+# Field names of every event kind, in the order they are recorded
+EVENT_FIELDS = {
+    'move': ('direction', 'moved', 'merges', 'score'),
+    'merge': ('row', 'col', 'value'),
+    'spawn': ('row', 'col', 'value'),
+    'game_over': ('score', 'moves'),
+}
+
+
+def set_debug(enabled):
+    """
+    Turns the per-move debug logging on or off, together with the root logger's DEBUG level.
+    """
+    global DEBUG
+    DEBUG = enabled
+    logging.getLogger().setLevel(logging.DEBUG if enabled else logging.INFO)
+
+
+class EventLog:
+    """
+    Keeps the last capacity core events as (time, kind, fields) tuples.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.events = collections.deque(maxlen=capacity)
+        self.recorded = 0 # Events ever recorded, including the ones overwritten since
+
+    def record(self, kind, *fields):
+        self.events.append((time.perf_counter(), kind, fields))
+        self.recorded += 1
+
+    def move(self, direction, moved, merges, score):
+        self.record('move', direction, moved, merges, score)
+
+    def merge(self, row, col, value):
+        self.record('merge', row, col, value)
+
+    def spawn(self, row, col, value):
+        self.record('spawn', row, col, value)
+
+    def game_over(self, score, moves):
+        self.record('game_over', score, moves)
+
+    @property
+    def dropped(self):
+        """
+        Number of events overwritten because the buffer was full.
+        """
+        return self.recorded - len(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def to_dicts(self):
+        """
+        Returns the buffered events, oldest first, as dictionaries.
+        """
+        return [{'time': round(timestamp, 6), 'event': kind, **dict(zip(EVENT_FIELDS[kind], fields))}
+                for timestamp, kind, fields in self.events]
+
+    def dump(self, path):
+        """
+        Writes the buffered events to path as JSON lines, oldest first. Returns the number written.
+        """
+        events = self.to_dicts()
+        with open(path, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+        logging.info(f"Wrote {len(events)} events to '{path}' ({self.dropped} older events were dropped).")
+        return len(events)
+
+    def clear(self):
+        self.events.clear()
+        self.recorded = 0
@@ -0,0 +1,299 @@
+"""
+Undo/redo history with branches for a game (core.GameCore or main.Game2048).
+
+Positions form a tree: undoing and then playing another direction starts a
+branch next to the one undone, so "what if I had pressed up" can be explored
+and the earlier line redone later. A position is stored as the direction of
+the move that led to it, plus links to its parent, first child and next
+sibling, in flat arrays (NODE_BYTES per move). Every keyframe-interval moves
+(counted by moves_made), a keyframe also stores the whole position: the
+board as one byte per cell, the score, the flags, the move, merge and spawn
+counters and the spawn generator's state. Undo and redo therefore also
+rewind the counters to the position's own line of play.
+
+Moves are deterministic given the generator state, so any position is
+rebuilt by restoring the nearest keyframe above it and replaying at most
+one interval of moves on a scratch GameCore. Redo replays the redone move
+on the current position, so it spawns the same tile as the first time.
+Scratch games have no front end, so replays play no sounds and write no
+leaderboard rows.
+
+The history is capped by a memory budget. When it is exceeded the root
+moves down the current line to a later keyframe, and the oldest moves and
+every branch off the dropped part are forgotten.
+
+Example:
+    game = GameCore(seed=1)
+    history = History(game)
+    if game.move('up'):
+        history.record('up')
+    history.undo()   # the board, score and generator are back where they were
+    history.redo()   # the same move and the same spawn again
+"""
+import array
+
+from bitboard import DIRECTIONS
+from core import GameCore
+
+DEFAULT_MEMORY_BUDGET = 4 * 1024 * 1024 # Bytes
+DEFAULT_KEYFRAME_INTERVAL = 64 # Moves between full positions, at most this many are replayed per undo
+EVICTION_TARGET = 0.75 # Eviction frees history down to this fraction of the budget
+NODE_BYTES = 13 # Parent, first child and next sibling (4 bytes each), direction (1 byte)
+KEYFRAME_OVERHEAD = 270 # Estimated bytes of Python objects per keyframe besides its board
+NO_NODE = -1
+COPIED_STATE = ('score', 'won', 'game_over', 'moves_made', 'merges_made', 'tiles_spawned') # Besides the board
+
+
+class Keyframe:
+    """
+    A full game position: the board exponents, score, flags, counters and generator state.
+    """
+    __slots__ = ('cells', 'score', 'won', 'game_over', 'moves_made', 'merges_made', 'tiles_spawned', 'rng_state')
+
+    def __init__(self, game):
+        self.cells = bytes(value.bit_length() - 1 if value else 0 for row in game.board for value in row)
+        self.score = game.score
+        self.won = game.won
+        self.game_over = game.game_over
+        self.moves_made = game.moves_made
+        self.merges_made = game.merges_made
+        self.tiles_spawned = game.tiles_spawned
+        self.rng_state = game.rng.snapshot()
+
+    def restore(self, game):
+        """
+        Puts this position into a game, including its generator state.
+        """
+        size = game.size
+        cells = self.cells
+        game.board = [[1 << e if e else 0 for e in cells[r * size:(r + 1) * size]] for r in range(size)]
+        game.score = self.score
+        game.won = self.won
+        game.game_over = self.game_over
+        game.moves_made = self.moves_made
+        game.merges_made = self.merges_made
+        game.tiles_spawned = self.tiles_spawned
+        game.rng.restore(self.rng_state)
+
+    def nbytes(self):
+        return len(self.cells) + KEYFRAME_OVERHEAD
+
+
+class History:
+    """
+    Undo/redo tree over the positions of one game. Call record() after every
+    move that changed the board; undo() and redo() change the game in place.
+    """
+    def __init__(self, game, memory_budget=DEFAULT_MEMORY_BUDGET, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.game = game
+        self.memory_budget = memory_budget
+        self.keyframe_interval = keyframe_interval
+        self.parents = array.array('i', [NO_NODE])
+        self.first_children = array.array('i', [NO_NODE]) # The child redo() follows
+        self.next_siblings = array.array('i', [NO_NODE])
+        self.directions = bytearray(b'\xff') # The root was reached by no move
+        self.keyframes = {0: Keyframe(game)}
+        self.keyframe_bytes = self.keyframes[0].nbytes()
+        self.current = 0
+
+        # Statistics
+        self.undos = 0
+        self.redos = 0
+        self.replayed_moves = 0
+        self.evicted_nodes = 0
+
+    def __len__(self):
+        return len(self.parents)
+
+    @property
+    def can_undo(self):
+        return self.parents[self.current] != NO_NODE
+
+    @property
+    def can_redo(self):
+        return self.first_children[self.current] != NO_NODE
+
+    def memory_bytes(self):
+        """
+        Returns the estimated memory used by the history.
+        """
+        return NODE_BYTES * len(self.parents) + self.keyframe_bytes
+
+    def branches(self):
+        """
+        Returns the directions played from the current position, the one redo() follows first.
+        """
+        return [DIRECTIONS[self.directions[child]] for child in self._children(self.current)]
+
+    def _children(self, node):
+        child = self.first_children[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_siblings[child]
+
+    def _move_to_front(self, node):
+        """
+        Makes node the first child of its parent, so redo() returns to it.
+        """
+        parent = self.parents[node]
+        previous = NO_NODE
+        child = self.first_children[parent]
+        while child != node:
+            previous, child = child, self.next_siblings[child]
+        if previous != NO_NODE:
+            self.next_siblings[previous] = self.next_siblings[node]
+            self.next_siblings[node] = self.first_children[parent]
+            self.first_children[parent] = node
+
+    def record(self, direction):
+        """
+        Adds the move the game just made from the current position. Playing a
+        direction already in the tree follows that branch instead of copying it.
+        """
+        code = DIRECTIONS.index(direction)
+        for child in self._children(self.current):
+            if self.directions[child] == code:
+                self._move_to_front(child)
+                self.current = child
+                return
+
+        node = len(self.parents)
+        self.parents.append(self.current)
+        self.first_children.append(NO_NODE)
+        self.next_siblings.append(self.first_children[self.current])
+        self.directions.append(code)
+        self.first_children[self.current] = node
+        self.current = node
+        if self.game.moves_made % self.keyframe_interval == 0:
+            keyframe = Keyframe(self.game)
+            self.keyframes[node] = keyframe
+            self.keyframe_bytes += keyframe.nbytes()
+            # The root can only move down to a keyframe, so a new one is when eviction can free anything
+            if self.memory_bytes() > self.memory_budget:
+                self._evict()
+
+    def undo(self):
+        """
+        Returns the game to the position before the last move. Returns False at the oldest position.
+        """
+        node = self.current
+        parent = self.parents[node]
+        if parent == NO_NODE:
+            return False
+        self._move_to_front(node)
+        self._rebuild(parent)
+        self.current = parent
+        self.undos += 1
+        return True
+
+    def redo(self, direction=None):
+        """
+        Replays the move last undone from this position, or the branch starting
+        with direction. Returns False if there is no such move.
+        """
+        child = self.first_children[self.current]
+        if direction is not None:
+            code = DIRECTIONS.index(direction)
+            child = next((c for c in self._children(self.current) if self.directions[c] == code), NO_NODE)
+        if child == NO_NODE:
+            return False
+        self._move_to_front(child)
+        scratch = self._scratch()
+        scratch.board = self.game.board
+        for name in COPIED_STATE:
+            setattr(scratch, name, getattr(self.game, name))
+        GameCore.move(scratch, DIRECTIONS[self.directions[child]])
+        self._apply(scratch)
+        self.current = child
+        self.replayed_moves += 1
+        self.redos += 1
+        return True
+
+    def _scratch(self):
+        """
+        Returns a GameCore of the game's engine and size that draws from the game's generator.
+        """
+        game = self.game
+        scratch = GameCore(use_bitboard=game.use_bitboard, seed=0, size=game.size)
+        scratch.rng = game.rng
+        return scratch
+
+    def _apply(self, scratch):
+        game = self.game
+        game.board = scratch.board
+        for name in COPIED_STATE:
+            setattr(game, name, getattr(scratch, name))
+        game.last_merges = 0
+        game.last_spawn = None
+
+    def _rebuild(self, node):
+        """
+        Puts the position of node into the game: its nearest keyframe, then the moves after it.
+        """
+        path = []
+        while node not in self.keyframes:
+            path.append(self.directions[node])
+            node = self.parents[node]
+        scratch = self._scratch()
+        self.keyframes[node].restore(scratch) # Also restores the game's generator, which scratch shares
+        for code in reversed(path):
+            GameCore.move(scratch, DIRECTIONS[code])
+        self._apply(scratch)
+        self.replayed_moves += len(path)
+
+    def _evict(self):
+        """
+        Moves the root down the current line to later keyframes until the history fits
+        EVICTION_TARGET of the budget, dropping everything outside the new root's subtree.
+        """
+        line = [] # Keyframes on the current line, newest first
+        node = self.current
+        while node != NO_NODE:
+            if node in self.keyframes:
+                line.append(node)
+            node = self.parents[node]
+        line.pop() # The current root
+        target = EVICTION_TARGET * self.memory_budget
+        while line:
+            numbers = self._rebase(line.pop())
+            if self.memory_bytes() <= target:
+                break
+            line = [numbers[node] for node in line]
+
+    def _rebase(self, root):
+        """
+        Makes root the oldest position, keeping only its subtree and renumbering the nodes.
+        Returns {old node: new node} for the nodes kept.
+        """
+        order = [root]
+        for node in order: # Breadth first, so every parent comes before its children
+            order.extend(self._children(node))
+        numbers = {node: i for i, node in enumerate(order)}
+
+        def renumber(node):
+            return numbers[node] if node != NO_NODE else NO_NODE
+
+        self.evicted_nodes += len(self.parents) - len(order)
+        self.parents = array.array('i', [NO_NODE] + [numbers[self.parents[node]] for node in order[1:]])
+        self.first_children = array.array('i', [renumber(self.first_children[node]) for node in order])
+        self.next_siblings = array.array('i', [NO_NODE] + [renumber(self.next_siblings[node]) for node in order[1:]])
+        self.directions = bytearray([0xFF] + [self.directions[node] for node in order[1:]])
+        self.keyframes = {numbers[node]: keyframe for node, keyframe in self.keyframes.items() if node in numbers}
+        self.keyframe_bytes = sum(keyframe.nbytes() for keyframe in self.keyframes.values())
+        self.current = numbers[self.current]
+        return numbers
+
+    def stats(self):
+        """
+        Returns the history statistics as a dictionary.
+        """
+        return {
+            'positions': len(self.parents),
+            'keyframes': len(self.keyframes),
+            'memory_bytes': self.memory_bytes(),
+            'bytes_per_move': self.memory_bytes() / len(self.parents),
+            'undos': self.undos,
+            'redos': self.redos,
+            'replayed_moves': self.replayed_moves,
+            'evicted_positions': self.evicted_nodes,
+        }
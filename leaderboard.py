@@ -0,0 +1,194 @@
+"""
+SQLite leaderboard store.
+
+Every finished game is a row in an embedded SQLite database. Inserts go
+through an index on (board_size, score), so they cost O(log n). A top-K
+query walks that index and stops after K rows. SQLite handles atomic writes
+and locking between processes; WAL mode lets readers continue while another
+instance writes, and busy_timeout makes concurrent writers wait instead of
+failing.
+
+The table is bounded: a row is kept only while it is among the keep best
+scores of its board size or of its player on that board size. An insert
+pushes at most one row out of each of those two boards, so pruning after it
+is two index lookups. Ties keep the older score.
+
+The first time a database is opened, the schema is created, scores from the
+old leaderboard.txt are imported and older unbounded tables are pruned, all
+in one transaction. PRAGMA user_version then records that this is done, so
+later connections take no write lock.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+DEFAULT_DATABASE = "leaderboard.db"
+LEGACY_TEXT_FILE = "leaderboard.txt"
+LEGACY_PLAYER = "legacy" # Player name for scores imported from the text file
+DEFAULT_PLAYER = "player"
+DEFAULT_BOARD_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+DEFAULT_KEEP = 1000 # Best scores kept per board size, and per player and board size
+SCHEMA_VERSION = 1 # user_version once the schema is set up, legacy scores imported and the table pruned
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    board_size INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    max_tile INTEGER,
+    moves INTEGER,
+    seed INTEGER,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_size ON scores (board_size, score DESC);
+CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, board_size, score DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class LeaderboardStore:
+    """
+    Records games and answers top-K queries per board size and player.
+    The database is opened on first use, so creating a store is free.
+    """
+    def __init__(self, path=DEFAULT_DATABASE, legacy_path=LEGACY_TEXT_FILE, keep=DEFAULT_KEEP):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.keep = keep
+        self.connection = None
+
+    def connect(self):
+        """
+        Returns the open connection, setting up the database the first time it is opened.
+        """
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            connection.execute("PRAGMA journal_mode = WAL") # Readers never block the writer
+            connection.execute("PRAGMA synchronous = NORMAL") # Durable at checkpoints, safe against corruption
+            self.connection = connection
+            if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self._set_up()
+        return self.connection
+
+    def _set_up(self):
+        """
+        Creates the schema, imports leaderboard.txt and prunes the table, in one transaction
+        so concurrent instances do it only once.
+        """
+        connection = self.connection
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return # Another instance got here first
+            for statement in SCHEMA.split(';'):
+                connection.execute(statement)
+            imported = self._import_legacy()
+            self._prune_all()
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if imported is not None:
+            logging.info(f"Imported {imported} scores from '{self.legacy_path}' into '{self.path}'.")
+
+    def _import_legacy(self):
+        """
+        Adds the scores of leaderboard.txt unless they were imported before. Returns their number, or None.
+        """
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return None
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return None
+        with open(self.legacy_path) as f:
+            scores = [int(line.strip()) for line in f if line.strip().isdigit()]
+        now = time.time()
+        self.connection.executemany(
+            "INSERT INTO scores (player, board_size, score, recorded_at) VALUES (?, ?, ?, ?)",
+            [(LEGACY_PLAYER, DEFAULT_BOARD_SIZE, score, now) for score in scores])
+        self.connection.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (self.legacy_path,))
+        return len(scores)
+
+    def _prune_all(self):
+        """
+        Deletes every row outside both the best keep scores of its board size and of its player there.
+        """
+        self.connection.execute(
+            "DELETE FROM scores WHERE id IN (SELECT id FROM ("
+            "SELECT id, ROW_NUMBER() OVER (PARTITION BY board_size ORDER BY score DESC, id) AS size_rank, "
+            "ROW_NUMBER() OVER (PARTITION BY player, board_size ORDER BY score DESC, id) AS player_rank "
+            "FROM scores) WHERE size_rank > ? AND player_rank > ?)", (self.keep, self.keep))
+
+    def _ranked_out(self, where, params, score, row_id):
+        """
+        Returns True if keep rows matching where rank ahead of the row (score, row_id).
+        """
+        (ahead,) = self.connection.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM scores WHERE {where} AND (score > ? OR (score = ? AND id < ?)) LIMIT ?)",
+            (*params, score, score, row_id, self.keep)).fetchone()
+        return ahead >= self.keep
+
+    def _prune(self, player, board_size):
+        """
+        Deletes the row a new score for player on board_size pushed out of both of its boards, if any.
+        """
+        connection = self.connection
+        # The first row outside the board size's best, unless its player's board still holds it
+        row = connection.execute(
+            "SELECT id, player, score FROM scores WHERE board_size = ? ORDER BY score DESC, id LIMIT 1 OFFSET ?",
+            (board_size, self.keep)).fetchone()
+        if row and self._ranked_out("player = ? AND board_size = ?", (row[1], board_size), row[2], row[0]):
+            connection.execute("DELETE FROM scores WHERE id = ?", (row[0],))
+        # The first row outside the player's best, unless the board size's board still holds it
+        row = connection.execute(
+            "SELECT id, score FROM scores WHERE player = ? AND board_size = ? ORDER BY score DESC, id LIMIT 1 OFFSET ?",
+            (player, board_size, self.keep)).fetchone()
+        if row and self._ranked_out("board_size = ?", (board_size,), row[1], row[0]):
+            connection.execute("DELETE FROM scores WHERE id = ?", (row[0],))
+
+    def record(self, score, player=DEFAULT_PLAYER, board_size=DEFAULT_BOARD_SIZE, max_tile=None, moves=None, seed=None):
+        """
+        Records a finished game and returns its row id. The row is pruned again
+        at once if the score is outside both of its boards.
+        """
+        connection = self.connect()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO scores (player, board_size, score, max_tile, moves, seed, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (player, board_size, score, max_tile, moves, seed, time.time()))
+            self._prune(player, board_size)
+        return cursor.lastrowid
+
+    def top(self, k=10, board_size=DEFAULT_BOARD_SIZE, player=None):
+        """
+        Returns the k best scores for the board size, optionally only the player's, best first.
+        Only the best keep scores of each board are stored, so k should not exceed keep.
+        """
+        connection = self.connect()
+        if player is None:
+            rows = connection.execute(
+                "SELECT score FROM scores WHERE board_size = ? ORDER BY score DESC LIMIT ?",
+                (board_size, k))
+        else:
+            rows = connection.execute(
+                "SELECT score FROM scores WHERE player = ? AND board_size = ? ORDER BY score DESC LIMIT ?",
+                (player, board_size, k))
+        return [score for (score,) in rows]
+
+    def rank(self, score, board_size=DEFAULT_BOARD_SIZE):
+        """
+        Returns the 1-based rank a score would have on the board size's leaderboard.
+        Exact within the best keep scores; below them it counts only the rows still stored.
+        """
+        (better,) = self.connect().execute(
+            "SELECT COUNT(*) FROM scores WHERE board_size = ? AND score > ?", (board_size, score)).fetchone()
+        return better + 1
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,26 +1,52 @@
+import argparse
+import os
 import pygame
 import random
+import sqlite3
 import sys
 import logging
 import math
+import multiprocessing
+import time
+
+import bitboard
+import core
+import eventlog
+from assets import AssetManager
+from audio import SoundBoard
+from core import GameCore
+from effects import Compositor
+from history import History
+from particles import ParticleSystem
+from profiler import FrameProfiler
+from leaderboard import DEFAULT_PLAYER, LeaderboardStore
+from render_cache import RenderCache
+from replay import FILE_EXTENSION as REPLAY_EXTENSION, ReplayError, ReplayRecorder
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 游戏常量
-BOARD_SIZE = 4
+# 游戏常量（布局常量是默认 4x4 棋盘的值，configure_layout() 会按 --size 重新计算）
+BOARD_SIZE = core.BOARD_SIZE # 游戏规则在 core.py 中
 TILE_SIZE = 100
 TILE_MARGIN = 10
+MAX_TILE_PITCH = TILE_SIZE + TILE_MARGIN # 方块加间距的最大宽度
+TILE_FONT_BASE_SIZE = TILE_SIZE # TILE_FONT_SPECS 中的字体大小对应的方块大小
+MAX_BOARD_PIXELS = 720 # 大棋盘缩小方块，使棋盘不超过这个宽度
 BOARD_WIDTH = BOARD_SIZE * (TILE_SIZE + TILE_MARGIN) + TILE_MARGIN
 BOARD_HEIGHT = BOARD_WIDTH
 SCORE_HEIGHT = 60 # slightly increased for style
 SCREEN_WIDTH = BOARD_WIDTH
 SCREEN_HEIGHT = BOARD_HEIGHT + SCORE_HEIGHT
 FPS = 60
+PROFILE_TRACE_FILE = "profile_trace.json" # F4 导出的性能追踪文件（Chrome trace 格式）
+HUD_FONT_SIZE = 18
+ROLLOUT_TIME_BUDGET = 0.012 # 蒙特卡洛自动游玩每步的时间预算（秒），约一帧
+EVENT_LOG_FILE = "events.jsonl" # F5 导出的事件日志文件（每行一个 JSON 事件）
 
 # 排行榜常量
-LEADERBOARD_FILE = "leaderboard.txt"
-LEADERBOARD_SIZE = 10 # 存储前10名分数
+LEADERBOARD_FILE = "leaderboard.db" # SQLite 数据库，首次打开时导入旧的 leaderboard.txt
+LEADERBOARD_SIZE = 10 # 显示前10名分数
 
 # 赛博朋克颜色定义
 COLOR_BACKGROUND = (15, 22, 36)  # 深海军蓝/近乎黑色
@@ -60,155 +86,159 @@ FONT_SIZE_SCORE = 35 # 分数的特定字体大小
 FONT_SIZE_SMALL = 22
 FONT_SIZE_MESSAGE = 55 # Game Over / You Won 消息
 
+# 方块数字的字体（100 像素方块的大小），configure_layout() 按方块大小缩放
+TILE_FONT_SPECS = {
+    'tile_large': (FONT_SIZE_LARGE, FONT_SIZE_LARGE + 5),
+    'tile_medium': (FONT_SIZE_MEDIUM, FONT_SIZE_MEDIUM + 3),
+    'tile_small': (FONT_SIZE_SMALL, FONT_SIZE_SMALL),
+}
+
+# 字体角色 -> (系统字体大小, 内置默认字体的大小)；大小为 None 时直接使用内置字体
+FONT_SPECS = {
+    'large': (FONT_SIZE_LARGE, FONT_SIZE_LARGE + 5), # 默认字体没有粗体，稍微放大
+    'medium': (FONT_SIZE_MEDIUM, FONT_SIZE_MEDIUM + 3),
+    'small': (FONT_SIZE_SMALL, FONT_SIZE_SMALL),
+    **TILE_FONT_SPECS,
+    'score': (FONT_SIZE_SCORE, FONT_SIZE_SCORE + 3),
+    'message': (FONT_SIZE_MESSAGE, FONT_SIZE_MESSAGE + 5),
+    'hud': (None, HUD_FONT_SIZE), # 性能 HUD 使用小号内置字体
+}
+
+# 音效和背景音乐（放在游戏目录下）
+SOUND_FILES = ("move.wav", "merge.wav", "game_over.wav", "win.wav")
+MUSIC_FILE = "background.mp3"
+AUDIO_VOICES = 4 # 保留给音效的声道数（同时发声的上限）
+
+# 渲染缓存：文字、方块精灵和分数栏只在数值变化时重新渲染，所有游戏实例共享
+render_cache = RenderCache()
+
+# 性能分析器：F3 开关帧时间 HUD，F4 导出追踪；关闭时每个计时点只做一次判断
+profiler = FrameProfiler(1000 / FPS)
+
+# 资源管理器：音效、音乐和字体在后台线程中只加载一次，所有游戏实例共享；顺便预先导入 AI 模块（构建查找表）
+assets = AssetManager(SOUND_FILES, FONT_SPECS, (FONT_NAME_PRIMARY, FONT_NAME_FALLBACK),
+                      music_file=MUSIC_FILE, warmup_modules=('ai',))
+
+# 音效板：音效在保留声道上播放，同一帧内的同名音效（如多次合并）合并为一次播放，合并越多音量越大
+audio = SoundBoard(assets.sound, voices=AUDIO_VOICES, scaled=("merge.wav",),
+                   priorities={"game_over.wav": 2, "win.wav": 2, "merge.wav": 1})
 
-class Game2048:
+# 排行榜存储：所有实例共享一个 SQLite 文件，首次使用时才打开
+leaderboard_store = LeaderboardStore(LEADERBOARD_FILE)
+
+# 后期合成器：背景网格、网格动画和扫描线在启动（及窗口尺寸变化）时烘焙一次，每帧只需一次 blit
+compositor = Compositor(
+    COLOR_BACKGROUND, COLOR_NEON_GRID,
+    grid_xs=[TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN) for i in range(BOARD_SIZE + 1)],
+    grid_ys=[SCORE_HEIGHT + TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN) for i in range(BOARD_SIZE + 1)],
+    grid_top=SCORE_HEIGHT,
+)
+
+# 粒子系统：预分配的粒子池，粒子数量会根据帧时间自动降级/恢复
+PARTICLE_BUDGET = 96 # 全屏最多粒子数
+particles = ParticleSystem(
+    [COLOR_TEXT_NEON_CYAN, COLOR_TEXT_NEON_MAGENTA, COLOR_TEXT_NEON_YELLOW],
+    capacity=PARTICLE_BUDGET, particles_per_tile=6, frame_time_target_ms=1000 / FPS,
+)
+
+
+def configure_layout(size):
+    """
+    Sets the layout constants, the compositor grid and the tile fonts for a board size.
+    Call it before the screen is created. Boards up to 6x6 keep 100 px tiles;
+    larger boards shrink their tiles to fit MAX_BOARD_PIXELS.
+    """
+    global BOARD_SIZE, TILE_SIZE, TILE_MARGIN, BOARD_WIDTH, BOARD_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT
+    pitch = min(MAX_TILE_PITCH, MAX_BOARD_PIXELS // size) # Tile plus margin
+    BOARD_SIZE = size
+    TILE_MARGIN = max(2, pitch // 11)
+    TILE_SIZE = pitch - TILE_MARGIN
+    BOARD_WIDTH = BOARD_SIZE * (TILE_SIZE + TILE_MARGIN) + TILE_MARGIN
+    BOARD_HEIGHT = BOARD_WIDTH
+    SCREEN_WIDTH = BOARD_WIDTH
+    SCREEN_HEIGHT = BOARD_HEIGHT + SCORE_HEIGHT
+
+    compositor.set_grid(
+        [TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN) for i in range(BOARD_SIZE + 1)],
+        [SCORE_HEIGHT + TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN) for i in range(BOARD_SIZE + 1)],
+    )
+    scale = TILE_SIZE / TILE_FONT_BASE_SIZE
+    for role, (system_size, builtin_size) in TILE_FONT_SPECS.items():
+        FONT_SPECS[role] = (max(8, round(system_size * scale)), max(8, round(builtin_size * scale)))
+
+
+class Game2048(GameCore):
     """
     Represents the 2048 game state and logic.
+    The rules live in core.GameCore; this class adds sounds, logging,
+    the leaderboard and drawing for the pygame front end.
     """
-    def __init__(self):
-        self.board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        self.score = 0
-        self.game_over = False
-        self.won = False # Track if user reached 2048
+    def __init__(self, use_bitboard=False, seed=None, player=DEFAULT_PLAYER, size=BOARD_SIZE, events=None):
         self.game_over_effect_timer = 0 # Timer for game over visual effect
         self.win_effect_timer = 0 # Timer for win visual effect
 
         self.game_state = 'MENU' # Game states: 'MENU', 'PLAYING', 'GAME_OVER', 'WON'
 
+        self.player = player # Name the scores are recorded under
+        self.score_recorded = False # A game is recorded once, even if undo resumes it after game over
         self.leaderboard = [] # Initialize leaderboard list
-        self.load_leaderboard() # Load scores on startup
 
-        # Load sound effects (place your sound files in the same directory or specify path)
-        self.move_sound = self.load_sound("move.wav")
-        self.merge_sound = self.load_sound("merge.wav")
-        self.game_over_sound = self.load_sound("game_over.wav")
-        self.win_sound = self.load_sound("win.wav")
+        self.recorder = None # ReplayRecorder streaming this game's moves, if recording
+        self.history = None # Undo/redo History of this game, if enabled
 
-        self.init_board()
+        super().__init__(use_bitboard=use_bitboard, seed=seed, size=size, events=events)
+        self.load_leaderboard() # Load scores for this board size
 
     def load_leaderboard(self):
         """
-        Loads the leaderboard from the file.
+        Loads the top scores for this board size from the leaderboard store.
         """
         try:
-            with open(LEADERBOARD_FILE, 'r') as f:
-                self.leaderboard = [int(line.strip()) for line in f if line.strip().isdigit()]
-            self.leaderboard.sort(reverse=True) # Sort in descending order
-            self.leaderboard = self.leaderboard[:LEADERBOARD_SIZE] # Keep only top scores
+            self.leaderboard = leaderboard_store.top(LEADERBOARD_SIZE, self.size)
             logging.info(f"Leaderboard loaded: {self.leaderboard}")
-        except FileNotFoundError:
-            logging.info(f"Leaderboard file '{LEADERBOARD_FILE}' not found. Starting with empty leaderboard.")
-            self.leaderboard = []
-        except Exception as e:
+        except sqlite3.Error as e:
             logging.error(f"Error loading leaderboard: {e}")
             self.leaderboard = [] # Reset leaderboard on error
 
     def save_leaderboard(self):
         """
-        Saves the current score to the leaderboard if it's a high score,
-        then saves the updated leaderboard to the file.
+        Records the finished game in the leaderboard store and reloads the top scores.
+        Only the first game over of a game is recorded; a restart creates a new game.
         """
-        # Add current score if it's not zero and is a high score
-        if self.score > 0:
-            self.leaderboard.append(self.score)
-            self.leaderboard.sort(reverse=True)
-            self.leaderboard = self.leaderboard[:LEADERBOARD_SIZE] # Keep only top scores
-            logging.info(f"Current score {self.score} added to leaderboard. New leaderboard: {self.leaderboard}")
-
+        if self.score <= 0 or self.score_recorded:
+            return
+        self.score_recorded = True
         try:
-            with open(LEADERBOARD_FILE, 'w') as f:
-                for score in self.leaderboard:
-                    f.write(f"{score}\n")
-            logging.info(f"Leaderboard saved to '{LEADERBOARD_FILE}'.")
-        except Exception as e:
+            leaderboard_store.record(self.score, self.player, self.size,
+                                     max_tile=max(max(row) for row in self.board), moves=self.moves_made, seed=self.seed)
+            logging.info(f"Current score {self.score} recorded for {self.player}, "
+                         f"rank {leaderboard_store.rank(self.score, self.size)}.")
+        except sqlite3.Error as e:
             logging.error(f"Error saving leaderboard: {e}")
+        self.load_leaderboard()
 
 
-    def load_sound(self, filename):
-        """
-        Loads a sound file and returns a pygame.mixer.Sound object.
-        Returns None if the file cannot be loaded.
-        """
-        try:
-            sound = pygame.mixer.Sound(filename)
-            logging.info(f"Successfully loaded sound: {filename}")
-            return sound
-        except pygame.error as e:
-            logging.warning(f"Could not load sound file '{filename}': {e}")
-            return None
-
-    # This method should be in the Game2048 class
     def init_board(self):
         """
         Initializes the game board with two random tiles.
         """
-        self.add_random_tile()
-        self.add_random_tile()
+        super().init_board()
         logging.info("Board initialized (Cyberpunk).")
-        self.print_board() # Helper to see initial state
+        if eventlog.DEBUG:
+            self.print_board() # Helper to see initial state
 
-    # This method should be in the Game2048 class
-    def add_random_tile(self):
-        """
-        Adds a new tile (2 or 4) to a random empty cell.
-        Returns True if successful, False otherwise (no empty cells).
-        """
-        empty_cells = []
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if self.board[r][c] == 0:
-                    empty_cells.append((r, c))
-
-        if not empty_cells:
-            logging.debug("No empty cells to add a tile.")
-            return False
-
-        row, col = random.choice(empty_cells)
-        # 90% chance of 2, 10% chance of 4
-        self.board[row][col] = random.choice([2] * 9 + [4] * 1)
-        logging.debug(f"Added {self.board[row][col]} tile at ({row}, {col})")
-        return True
-
-    # This method should be in the Game2048 class
-    def can_move(self):
-        """
-        Checks if any moves are possible (any empty cells or adjacent same tiles).
-        This is used as part of the game over check.
-        """
-        if any(0 in row for row in self.board):
-            return True
-
-        # Check horizontal moves
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE - 1):
-                if self.board[r][c] == self.board[r][c+1]:
-                    return True
-
-        # Check vertical moves
-        for c in range(BOARD_SIZE):
-            for r in range(BOARD_SIZE - 1):
-                if self.board[r][c] == self.board[r+1][c]:
-                    return True
-
-        logging.debug("No possible moves left.")
-        return False
-
-    # This method should be in the Game2048 class
     def is_game_over(self):
         """
         Checks if the game is over.
         Game is over if there are no empty cells and no possible moves (adjacent same tiles).
         """
-        is_over = not self.can_move()
+        is_over = super().is_game_over()
         if is_over:
-            self.game_over = True
             logging.info("Game Over.")
             self.save_leaderboard() # Save leaderboard when game is over
-            if self.game_over_sound: # Play game over sound
-                self.game_over_sound.play()
+            audio.cue("game_over.wav") # Play game over sound
         return is_over
 
-    # This method should be in the Game2048 class
     def print_board(self):
         """
         Helper function to print the board state to console for debugging.
@@ -216,230 +246,223 @@ class Game2048:
         logging.debug("Current Board State:")
         for row in self.board:
             logging.debug(row)
-        logging.debug("-" * (BOARD_SIZE * 6)) # Separator for easier reading
-
-    # This method should be in the Game2048 class
-    def move_left(self):
-        """
-        Moves tiles to the left and merges them.
-        Returns True if any tiles moved or merged, False otherwise.
-        """
-        board_changed = False
-        # new_board is not used, so it's removed.
-        # new_board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-
-        for r in range(BOARD_SIZE):
-            original_row_tuple = tuple(self.board[r]) # Keep a copy for checking change
-
-            row_values = [tile for tile in self.board[r] if tile != 0] # Remove zeros
-
-            # Merge adjacent same tiles
-            merged_row_values = []
-            i = 0
-            while i < len(row_values):
-                if i + 1 < len(row_values) and row_values[i] == row_values[i+1]:
-                    merged_value = row_values[i] * 2
-                    merged_row_values.append(merged_value)
-                    self.score += merged_value
-                    logging.debug(f"Merged {row_values[i]} and {row_values[i+1]} to {merged_value}. Score: {self.score}")
-                    if self.merge_sound: # Play merge sound
-                        self.merge_sound.play()
-                    # Check for win condition
-                    if merged_value == 2048 and not self.won: # Check !self.won to log only once
-                        self.won = True
-                        logging.info("SYSTEM ALERT: Target 2048 Acquired!")
-                    i += 2 # Skip the next tile as it was merged
-                else:
-                    merged_row_values.append(row_values[i])
-                    i += 1
-
-            # Create the new row for the board with zeros at the end
-            new_row_for_board = merged_row_values + [0] * (BOARD_SIZE - len(merged_row_values))
-
-
-            # Check if the row changed
-            if tuple(new_row_for_board) != original_row_tuple:
-                 board_changed = True
-            self.board[r] = new_row_for_board # Update the row in the board
-
-
-        if board_changed:
-            logging.debug("Board matrix altered by move_left operation.")
-            self.add_random_tile()
-            self.print_board()
-            if not self.can_move(): # Check for game over only if a move was made and new tile added
-                 self.is_game_over()
-        else:
-            logging.debug("Board matrix unchanged after move_left operation.")
+        logging.debug("-" * (self.size * 6)) # Separator for easier reading
 
-        return board_changed
-
-    # This method should be in the Game2048 class
     def move(self, direction):
         """
-        Handles tile movement based on the direction input.
-        Rotates the board, performs left move, rotates back.
+        Moves the tiles through the game core and cues the matching sounds.
         Returns True if the board changed, False otherwise.
         """
-        # Save current board state to check if any change occurred
-        # original_board = [row[:] for row in self.board] # Not needed, move_left returns change
-
-        moved = False
-        if direction == 'left':
-            moved = self.move_left()
-        elif direction == 'right':
-            self.board = self.rotate_board(self.board, 2)
-            moved = self.move_left()
-            self.board = self.rotate_board(self.board, 2)
-        elif direction == 'up':
-            self.board = self.rotate_board(self.board, 3) # Counter-clockwise for up (data moves "left" in rotated view)
-            moved = self.move_left()
-            self.board = self.rotate_board(self.board, 1) # Rotate back
-        elif direction == 'down':
-            self.board = self.rotate_board(self.board, 1) # Clockwise for down
-            moved = self.move_left()
-            self.board = self.rotate_board(self.board, 3) # Rotate back
-
-        if moved and self.move_sound:
-            self.move_sound.play()
+        was_won = self.won
+        start = profiler.clock()
+        moved = super().move(direction)
+        profiler.add('move', start)
+
+        if moved:
+            if self.recorder:
+                try:
+                    self.recorder.record(direction, self.last_spawn, self.board, self.score)
+                except ReplayError as e:
+                    logging.warning(f"Replay recording stopped: {e}")
+                    self.close_replay() # The replay keeps every move up to this one
+            if self.history:
+                self.history.record(direction)
+            if eventlog.DEBUG: # Checked first so nothing is formatted when debugging is off
+                logging.debug(f"Board matrix altered by {direction} operation ({self.last_merges} merges). Score: {self.score}")
+                self.print_board()
+            if self.last_merges: # One louder merge sound per frame, however many merges
+                audio.cue("merge.wav", self.last_merges)
+            if self.won and not was_won: # Log only once
+                logging.info("SYSTEM ALERT: Target 2048 Acquired!")
+            audio.cue("move.wav")
+        elif eventlog.DEBUG:
+            logging.debug(f"Board matrix unchanged after {direction} operation.")
 
         return moved
 
+    def close_replay(self):
+        """
+        Finishes the replay file of this game, if it is being recorded.
+        """
+        if self.recorder:
+            self.recorder.close()
+            logging.info(f"Replay saved to '{self.recorder.path}' ({self.recorder.moves} moves).")
+            self.recorder = None
 
-    # This method should be in the Game2048 class
-    def rotate_board(self, board, times):
+    def tile_rect(self, r, c):
         """
-        Rotates the board 90 degrees clockwise 'times' number of times.
+        Returns the screen rectangle of the tile at row r, column c.
         """
-        temp_board = board
-        for _ in range(times):
-            temp_board = [list(row) for row in zip(*temp_board[::-1])] # Ensure it's a list of lists
-        logging.debug(f"Rotated board matrix {times} times.")
-        # self.print_board_state(temp_board) # Helper to see state after rotation
-        return temp_board # Return the rotated board
+        left = TILE_MARGIN + c * (TILE_SIZE + TILE_MARGIN)
+        top = SCORE_HEIGHT + TILE_MARGIN + r * (TILE_SIZE + TILE_MARGIN)
+        return pygame.Rect(left, top, TILE_SIZE, TILE_SIZE)
 
-    # Helper function used by rotate_board for logging only
-    # This method should be in the Game2048 class
-    def print_board_state(self, board_state):
-         """
-         Helper function to print a given board state for debugging rotations.
-         """
-         logging.debug("Rotated Board State:")
-         for row in board_state:
-             logging.debug(row)
-         logging.debug("-" * (BOARD_SIZE * 6)) # Separator
+    def changed_tile_rects(self, previous_board):
+        """
+        Returns the rectangles of tiles whose value differs from previous_board.
+        """
+        return [self.tile_rect(r, c)
+                for r in range(self.size) for c in range(self.size)
+                if self.board[r][c] != previous_board[r][c]]
 
-    # This method should be in the Game2048 class
-    def draw(self, screen, fonts):
+    def animation_phase(self, ticks):
         """
-        Draws the game board, tiles, numbers, and score in Cyberpunk style.
-        'fonts' is a dictionary: {'large': font_large, 'medium': font_medium, 'small': font_small, 'score': font_score, 'message': font_message}
+        Returns the state of the time-based effects in draw() at the given ticks:
+        (grid line offset, overlay flash phase, ticks).
         """
-        # Draw background and grid lines for a subtle cyberpunk terminal look
-        screen.fill(COLOR_BACKGROUND)
+        return int(ticks * 0.02 % 10 - 5), (ticks // 250) % 2, ticks
 
-        # 绘制动态霓虹网格线
-        for i in range(BOARD_SIZE + 1):
-            x = TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN)
-            pygame.draw.line(screen, COLOR_NEON_GRID, (x, SCORE_HEIGHT), (x, SCREEN_HEIGHT), 3)
-            y = SCORE_HEIGHT + TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN)
-            pygame.draw.line(screen, COLOR_NEON_GRID, (0, y), (SCREEN_WIDTH, y), 3)
-            
-            # 添加网格线动画效果
-            anim_offset = int(pygame.time.get_ticks() * 0.02 % 10 - 5)
-            pygame.draw.line(screen, COLOR_NEON_GRID, 
-                           (x + anim_offset, SCORE_HEIGHT + anim_offset), 
-                           (x - anim_offset, SCREEN_HEIGHT - anim_offset), 
-                           1)
-
-        # Draw score area with a neon accent
-        pygame.draw.rect(screen, COLOR_SCORE_BACKGROUND, (0, 0, SCREEN_WIDTH, SCORE_HEIGHT))
+    def animated_rects(self, previous_phase, phase):
+        """
+        Returns the screen regions whose animation changed between two animation phases:
+        the moving grid lines, the flashing overlay and glowing tiles with their particles.
+        """
+        rects = []
+        screen_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        if previous_phase[0] != phase[0]: # Animated grid lines sway up to 5 pixels around each vertical line
+            for i in range(BOARD_SIZE + 1):
+                x = TILE_MARGIN + i * (TILE_SIZE + TILE_MARGIN)
+                rects.append(pygame.Rect(x - 6, SCORE_HEIGHT, 13, SCREEN_HEIGHT - SCORE_HEIGHT).clip(screen_rect))
+        if (self.game_over or self.won) and previous_phase[1] != phase[1]:
+            return rects + [pygame.Rect(0, SCORE_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT - SCORE_HEIGHT)]
+        if previous_phase[2] != phase[2]: # Glow pulses and particles move every frame
+            for r in range(self.size):
+                for c in range(self.size):
+                    tile_value = self.board[r][c]
+                    if tile_value >= 8:
+                        # Particles orbit up to 20 * (1 + value / 2048) pixels from the centre, radius up to 4
+                        reach = int(20 * (1 + tile_value / 2048)) + 5
+                        tile_rect = self.tile_rect(r, c)
+                        particle_rect = pygame.Rect(0, 0, 2 * reach, 2 * reach)
+                        particle_rect.center = tile_rect.center
+                        rects.append(tile_rect.union(particle_rect).clip(screen_rect))
+        return rects
+
+    def tile_style(self, tile_value, fonts):
+        """
+        Returns (tile_color, font, text_color) used to draw a tile value.
+        """
+        # Use special color for 2048, otherwise from TILE_COLORS
+        if tile_value == 2048:
+            tile_color = TILE_COLORS [2048]
+        elif tile_value > 2048: # for 4096 and above
+            tile_color = TILE_COLORS.get(4096, (200,200,200)) # Default bright if not defined
+        else:
+            tile_color = TILE_COLORS.get(tile_value, COLOR_EMPTY_TILE)
+
+        font_to_use = fonts['tile_large']
+        if tile_value >= 1000: # e.g., 1024, 2048
+            font_to_use = fonts['tile_small']
+        elif tile_value >= 100: # e.g., 128, 256, 512
+            font_to_use = fonts['tile_medium']
+
+        # Determine text color based on tile value for contrast
+        if tile_value >= 8: # Brighter tiles get lighter text or a specific neon
+            text_color = COLOR_TEXT_LIGHT if tile_value < 128 else COLOR_TEXT_NEON_YELLOW # Neon for higher values
+            if tile_value == 2048:
+                text_color = COLOR_BACKGROUND # Dark text on very bright 2048_WIN_COLOR
+            elif tile_value > 2048: # For numbers like 4096
+                text_color = COLOR_BACKGROUND # Dark text on pure white
+        else: # Darker tiles (2, 4)
+            text_color = COLOR_TEXT_DARK
+
+        return tile_color, font_to_use, text_color
+
+    def build_tile_sprite(self, tile_value, fonts):
+        """
+        Precomposes a tile sprite: rounded background, border and, for tiles below 8, the number.
+        Tiles of 8 and above get their number drawn on top of the glow and particles instead.
+        The corners outside the rounded rectangle stay transparent.
+        """
+        tile_color, font_to_use, text_color = self.tile_style(tile_value, fonts)
+        sprite = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+        pygame.draw.rect(sprite, tile_color, (0, 0, TILE_SIZE, TILE_SIZE), border_radius=5)
+        # Add a subtle darker border to make tiles pop a bit more from the background
+        pygame.draw.rect(sprite, COLOR_BACKGROUND, (0, 0, TILE_SIZE, TILE_SIZE), width=2, border_radius=5)
+        if 0 < tile_value < 8:
+            number_surface = render_cache.text(font_to_use, str(tile_value), text_color)
+            sprite.blit(number_surface, number_surface.get_rect(center=(TILE_SIZE // 2, TILE_SIZE // 2)))
+        return sprite
+
+    def build_score_bar(self, score, fonts):
+        """
+        Precomposes the opaque score bar (background, neon accent, glowing score text) for a score.
+        """
+        score_bar = pygame.Surface((SCREEN_WIDTH, SCORE_HEIGHT)).convert()
+        score_bar.fill(COLOR_SCORE_BACKGROUND)
         # Neon line accent for score area
-        pygame.draw.line(screen, COLOR_TEXT_NEON_CYAN, (0, SCORE_HEIGHT - 2), (SCREEN_WIDTH, SCORE_HEIGHT - 2), 2)
+        pygame.draw.line(score_bar, COLOR_TEXT_NEON_CYAN, (0, SCORE_HEIGHT - 2), (SCREEN_WIDTH, SCORE_HEIGHT - 2), 2)
 
         # Draw score with neon glow effect
-        score_text_surface = fonts['score'].render(f"SCORE: {self.score}", True, COLOR_TEXT_NEON_YELLOW)
+        score_text = f"SCORE: {score}"
+        score_text_surface = render_cache.text(fonts['score'], score_text, COLOR_TEXT_NEON_YELLOW)
         score_rect = score_text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCORE_HEIGHT // 2))
-        # Draw glow layers
+        glow_surface = render_cache.text(fonts['score'], score_text, (*COLOR_TEXT_NEON_YELLOW, 50)) # Semi-transparent glow color
         for offset in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-             glow_surface = fonts['score'].render(f"SCORE: {self.score}", True, (COLOR_TEXT_NEON_YELLOW[0], COLOR_TEXT_NEON_YELLOW[1], COLOR_TEXT_NEON_YELLOW[2], 50)) # Semi-transparent glow color
-             glow_rect = glow_surface.get_rect(center=(score_rect.centerx + offset[0], score_rect.centery + offset[1]))
-             screen.blit(glow_surface, glow_rect)
-        screen.blit(score_text_surface, score_rect) # Draw original text on top
+            score_bar.blit(glow_surface, score_rect.move(offset))
+        score_bar.blit(score_text_surface, score_rect) # Draw original text on top
+        return score_bar
+
+    # This method should be in the Game2048 class
+    def draw(self, screen, fonts):
+        """
+        Draws the game board, tiles, numbers, and score in Cyberpunk style.
+        'fonts' is a dictionary: {'large': font_large, 'medium': font_medium, 'small': font_small, 'score': font_score, 'message': font_message}
+        Text, tile sprites and the score bar come from render_cache, so a frame
+        only renders or allocates something when a new value appears.
+        """
+        # Draw background and grid lines for a subtle cyberpunk terminal look (baked layer)
+        compositor.draw_background(screen)
+
+        ticks = pygame.time.get_ticks()
 
+        # 添加网格线动画效果（每个偏移量预先烘焙一帧）
+        compositor.draw_grid_animation(screen, int(ticks * 0.02 % 10 - 5))
+
+        # Draw score area (cached per score value)
+        score_bar = render_cache.panel(('score', self.score, fonts['score']), lambda: self.build_score_bar(self.score, fonts))
+        screen.blit(score_bar, (0, 0))
+
+        # Pulse intensity is shared by every glowing tile in this frame
+        glow_alpha = int((math.sin(ticks * 0.005) * 0.5 + 0.5) * 55 + 200)
 
         # Draw tiles with cyberpunk colors
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
+        particle_emitters = [] # (centre_x, centre_y, value) of every glowing tile
+        glowing_numbers = [] # Numbers drawn after the particles
+        for r in range(self.size):
+            for c in range(self.size):
                 tile_value = self.board[r][c]
-                # Use special color for 2048, otherwise from TILE_COLORS
-                if tile_value == 2048:
-                    tile_color = TILE_COLORS [2048]
-                elif tile_value > 2048: # for 4096 and above
-                    tile_color = TILE_COLORS.get(4096, (200,200,200)) # Default bright if not defined
-                else:
-                    tile_color = TILE_COLORS.get(tile_value, COLOR_EMPTY_TILE)
-
+                tile_color, font_to_use, text_color = self.tile_style(tile_value, fonts)
 
                 # Calculate tile position
                 left = TILE_MARGIN + c * (TILE_SIZE + TILE_MARGIN)
                 top = SCORE_HEIGHT + TILE_MARGIN + r * (TILE_SIZE + TILE_MARGIN)
 
-                # Draw tile rectangle with a slight "glitch" or "neon glow" effect (optional, subtle border)
-                pygame.draw.rect(screen, tile_color, (left, top, TILE_SIZE, TILE_SIZE), border_radius=5)
-                # Add a subtle darker border to make tiles pop a bit more from the background
-                pygame.draw.rect(screen, COLOR_BACKGROUND, (left, top, TILE_SIZE, TILE_SIZE), width=2, border_radius=5)
+                # Tile background, border and small numbers in one blit
+                sprite = render_cache.sprite(('tile', tile_value, font_to_use), lambda: self.build_tile_sprite(tile_value, fonts))
+                screen.blit(sprite, (left, top))
 
                 # 添加脉冲发光效果
                 if tile_value >= 8:  # 仅对高数值方块添加
-                    glow_intensity = (math.sin(pygame.time.get_ticks() * 0.005) * 0.5 + 0.5) * 55 + 200
-                    glow_surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-                    glow_surface.fill((*tile_color[:3], int(glow_intensity)))
-                    screen.blit(glow_surface, (left, top))
-
-                    # 添加粒子效果
-                    particle_count = 6
-                    for i in range(particle_count):
-                        angle = (pygame.time.get_ticks() * 0.1 + i * 60) % 360
-                        radius = (math.sin(pygame.time.get_ticks() * 0.001) * 5 + 15) * (1 + tile_value / 2048)
-                        x = left + TILE_SIZE//2 + math.cos(math.radians(angle)) * radius
-                        y = top + TILE_SIZE//2 + math.sin(math.radians(angle)) * radius
-                        pygame.draw.circle(screen, 
-                                         (random.choice([COLOR_TEXT_NEON_CYAN, COLOR_TEXT_NEON_MAGENTA, COLOR_TEXT_NEON_YELLOW])),
-                                         (int(x), int(y)), 
-                                         int(2 + abs(math.sin(pygame.time.get_ticks()*0.005 + i))*2))
-
-
-                # Draw tile number if not zero
-                if tile_value != 0:
-                    font_to_use = fonts['large']
-                    if tile_value >= 1000: # e.g., 1024, 2048
-                        font_to_use = fonts['small']
-                    elif tile_value >= 100: # e.g., 128, 256, 512
-                        font_to_use = fonts['medium']
-
-
-                    # Determine text color based on tile value for contrast
-                    if tile_value >= 8: # Brighter tiles get lighter text or a specific neon
-                        text_color = COLOR_TEXT_LIGHT if tile_value < 128 else COLOR_TEXT_NEON_YELLOW # Neon for higher values
-                        if tile_value == 2048:
-                            text_color = COLOR_BACKGROUND # Dark text on very bright 2048_WIN_COLOR
-                        elif tile_value > 2048: # For numbers like 4096
-                             text_color = COLOR_BACKGROUND # Dark text on pure white
-                    else: # Darker tiles (2, 4)
-                        text_color = COLOR_TEXT_DARK
-
-                    number_text_surface = font_to_use.render(str(tile_value), True, text_color)
+                    screen.blit(render_cache.alpha_fill((TILE_SIZE, TILE_SIZE), tile_color, glow_alpha), (left, top))
+                    particle_emitters.append((left + TILE_SIZE // 2, top + TILE_SIZE // 2, tile_value))
+
+                    number_text_surface = render_cache.text(font_to_use, str(tile_value), text_color)
                     number_rect = number_text_surface.get_rect(center=(left + TILE_SIZE // 2, top + TILE_SIZE // 2))
-                    screen.blit(number_text_surface, number_rect)
+                    glowing_numbers.append((number_text_surface, number_rect))
+
+        # 添加粒子效果（所有发光方块的粒子一次批量绘制）
+        particles.set_emitters(particle_emitters)
+        particles.draw(screen, ticks)
+
+        # Draw the numbers of glowing tiles above the glow and particles
+        screen.blits(glowing_numbers, doreturn=False)
 
         # Draw game over or win screen overlay
         if self.game_over or self.won:
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT - SCORE_HEIGHT), pygame.SRCALPHA) # Overlay for game area only
-
             # Simple flashing effect based on timer
-            alpha = 150 + 50 * ((pygame.time.get_ticks() // 250) % 2) # Flash between 150 and 200 alpha
-            overlay.fill((COLOR_BACKGROUND[0], COLOR_BACKGROUND[1], COLOR_BACKGROUND[2], alpha)) # Darker, more opaque overlay with flashing
+            alpha = 150 + 50 * ((ticks // 250) % 2) # Flash between 150 and 200 alpha
+            overlay = render_cache.alpha_fill((SCREEN_WIDTH, SCREEN_HEIGHT - SCORE_HEIGHT), COLOR_BACKGROUND, alpha) # Overlay for game area only
             screen.blit(overlay, (0, SCORE_HEIGHT))
 
             message_text = "SYSTEM FAILURE" if self.game_over and not self.won else "OBJECTIVE COMPLETE: 2048"
@@ -450,32 +473,31 @@ class Game2048:
             message_color = COLOR_TEXT_NEON_MAGENTA if self.game_over and not self.won else COLOR_TEXT_NEON_CYAN
 
             # Draw message with neon glow effect
-            message_surface = fonts['message'].render(message_text, True, message_color)
+            message_surface = render_cache.text(fonts['message'], message_text, message_color)
             message_rect = message_surface.get_rect(center=(SCREEN_WIDTH // 2, (SCREEN_HEIGHT + SCORE_HEIGHT) // 2 - 50))
             # Determine glow color based on message color
             glow_color = (message_color[0], message_color[1], message_color[2], 50) # Semi-transparent glow color
+            glow_surface = render_cache.text(fonts['message'], message_text, glow_color)
             # Draw glow layers
             for offset in [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]: # Slightly larger glow
-                 glow_surface = fonts['message'].render(message_text, True, glow_color)
-                 glow_rect = glow_surface.get_rect(center=(message_rect.centerx + offset[0], message_rect.centery + offset[1]))
-                 screen.blit(glow_surface, glow_rect)
+                 screen.blit(glow_surface, message_rect.move(offset))
             screen.blit(message_surface, message_rect) # Draw original text on top
 
 
             restart_text = "[R]: REINITIALIZE SEQUENCE"
-            restart_surface = fonts['medium'].render(restart_text, True, COLOR_TEXT_NEON_YELLOW)
+            restart_surface = render_cache.text(fonts['medium'], restart_text, COLOR_TEXT_NEON_YELLOW)
             restart_rect = restart_surface.get_rect(center=(SCREEN_WIDTH // 2, (SCREEN_HEIGHT + SCORE_HEIGHT) // 2 + 30))
             screen.blit(restart_surface, restart_rect)
 
             # Draw leaderboard
-            leaderboard_title_surface = fonts['medium'].render("LEADERBOARD", True, COLOR_TEXT_NEON_YELLOW)
+            leaderboard_title_surface = render_cache.text(fonts['medium'], "LEADERBOARD", COLOR_TEXT_NEON_YELLOW)
             leaderboard_title_rect = leaderboard_title_surface.get_rect(center=(SCREEN_WIDTH // 2, (SCREEN_HEIGHT + SCORE_HEIGHT) // 2 + 80))
             screen.blit(leaderboard_title_surface, leaderboard_title_rect)
 
             leaderboard_start_y = (SCREEN_HEIGHT + SCORE_HEIGHT) // 2 + 110
             for i, score in enumerate(self.leaderboard):
                 score_text = f"{i+1}. {score}"
-                score_surface = fonts['small'].render(score_text, True, COLOR_TEXT_LIGHT)
+                score_surface = render_cache.text(fonts['small'], score_text, COLOR_TEXT_LIGHT)
                 score_rect = score_surface.get_rect(center=(SCREEN_WIDTH // 2, leaderboard_start_y + i * 30))
                 screen.blit(score_surface, score_rect)
 
@@ -487,18 +509,18 @@ class Game2048:
 
         # Draw game title
         title_text = "CYBERPUNK 2048"
-        title_surface = fonts['message'].render(title_text, True, COLOR_TEXT_NEON_CYAN)
+        title_surface = render_cache.text(fonts['message'], title_text, COLOR_TEXT_NEON_CYAN)
         title_rect = title_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
         screen.blit(title_surface, title_rect)
 
         # Draw start message
         start_text = "[PRESS ANY KEY TO START]"
-        start_surface = fonts['medium'].render(start_text, True, COLOR_TEXT_NEON_YELLOW)
+        start_surface = render_cache.text(fonts['medium'], start_text, COLOR_TEXT_NEON_YELLOW)
         start_rect = start_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
         screen.blit(start_surface, start_rect)
 
         # Draw leaderboard title on menu
-        leaderboard_title_surface = fonts['medium'].render("LEADERBOARD", True, COLOR_TEXT_NEON_YELLOW)
+        leaderboard_title_surface = render_cache.text(fonts['medium'], "LEADERBOARD", COLOR_TEXT_NEON_YELLOW)
         leaderboard_title_rect = leaderboard_title_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 120))
         screen.blit(leaderboard_title_surface, leaderboard_title_rect)
 
@@ -506,89 +528,242 @@ class Game2048:
         leaderboard_start_y = SCREEN_HEIGHT // 2 + 150
         for i, score in enumerate(self.leaderboard):
             score_text = f"{i+1}. {score}"
-            score_surface = fonts['small'].render(score_text, True, COLOR_TEXT_LIGHT)
+            score_surface = render_cache.text(fonts['small'], score_text, COLOR_TEXT_LIGHT)
             score_rect = score_surface.get_rect(center=(SCREEN_WIDTH // 2, leaderboard_start_y + i * 25))
             screen.blit(score_surface, score_rect)
 
 
+class DirtyRectTracker:
+    """
+    Works out which screen regions changed in a frame for the dirty-rectangle
+    rendering mode, so only those are pushed with pygame.display.update(rects)
+    and idle frames are skipped entirely.
+    """
+    def __init__(self):
+        self.full_redraw = True # Repaint and flip the whole screen on the next frame
+        self.pending = [] # Regions to refresh on the next frame (e.g. glitch bands)
+        self.snapshot = None
+        self.last_phase = None
+
+        # Statistics
+        self.full_frames = 0
+        self.partial_frames = 0
+        self.skipped_frames = 0
+
+    def begin_frame(self, game):
+        """
+        Remembers the visible game state before this frame's input is handled.
+        """
+        self.snapshot = (game, game.game_state, [row[:] for row in game.board],
+                         game.score, game.game_over, game.won)
+
+    def collect(self, game, ticks):
+        """
+        Returns the rectangles to redraw this frame, an empty list if nothing
+        changed, or None if the whole screen must be redrawn and flipped.
+        """
+        previous_game, state, board, score, game_over, won = self.snapshot
+        phase = game.animation_phase(ticks)
+        if (self.full_redraw or game is not previous_game or game.game_state != state
+                or game.game_over != game_over or game.won != won):
+            self.full_redraw = False
+            self.pending = []
+            self.last_phase = phase
+            self.full_frames += 1
+            return None
+
+        rects = self.pending
+        self.pending = []
+        if game.game_state != 'MENU':
+            rects += game.changed_tile_rects(board)
+            if game.score != score:
+                rects.append(pygame.Rect(0, 0, SCREEN_WIDTH, SCORE_HEIGHT))
+            rects += game.animated_rects(self.last_phase, phase)
+        self.last_phase = phase
+
+        if rects:
+            self.partial_frames += 1
+        else:
+            self.skipped_frames += 1
+        return rects
+
+    def stats(self):
+        return {'full': self.full_frames, 'partial': self.partial_frames, 'skipped': self.skipped_frames}
+
+
+def load_fonts():
+    """
+    Loads the game fonts synchronously, falling back to Arial and then to pygame's default font.
+    Returns a dict of fonts by role.
+    """
+    return assets.load_fonts()
+
+
+def start_game(record_dir=None, player=DEFAULT_PLAYER, events=None):
+    """
+    Creates a new game. With record_dir, the game gets a random seed and its
+    moves are streamed into a replay file in that directory; otherwise it
+    gets an undo/redo history. With events, the game records its moves,
+    merges and spawns into that event log.
+    """
+    if not record_dir:
+        game = Game2048(player=player, size=BOARD_SIZE, events=events)
+        game.history = History(game)
+        return game
+    seed = random.getrandbits(63)
+    game = Game2048(seed=seed, player=player, size=BOARD_SIZE, events=events)
+    path = os.path.join(record_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{seed}{REPLAY_EXTENSION}")
+    game.recorder = ReplayRecorder(path, seed, game.board, use_bitboard=game.use_bitboard)
+    logging.info(f"Recording replay to '{path}'.")
+    return game
+
+
 # Main game function
 # This function is needed outside of the class to run the game
 
-def main():
+def main(argv=None):
     """
     Main function to initialize pygame, create game instance, and run the game loop
     with Cyberpunk style.
     """
+    parser = argparse.ArgumentParser(description="CYBERPUNK 2048")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="only push changed screen regions and skip idle frames")
+    parser.add_argument('--profile', action='store_true',
+                        help="start with the frame-time profiler and its HUD enabled (toggle with F3)")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="profile the whole session and write a Chrome trace to FILE on exit")
+    parser.add_argument('--record', metavar='DIR',
+                        help="record every game as a replay file in DIR (see replay.py)")
+    parser.add_argument('--player', default=DEFAULT_PLAYER, help="name to record scores under on the leaderboard")
+    parser.add_argument('--size', type=int, default=BOARD_SIZE,
+                        help=f"board size N for an NxN game ({core.MIN_BOARD_SIZE}-{core.MAX_BOARD_SIZE}, default {BOARD_SIZE})")
+    parser.add_argument('--debug', action='store_true',
+                        help="log every move and the board after it at DEBUG level")
+    parser.add_argument('--event-log', type=int, metavar='N', nargs='?', const=eventlog.DEFAULT_CAPACITY,
+                        help=f"keep the last N moves, merges and spawns (default {eventlog.DEFAULT_CAPACITY}); "
+                             f"F5 writes them to {EVENT_LOG_FILE}")
+    autoplayers = parser.add_mutually_exclusive_group()
+    autoplayers.add_argument('--ntuple', metavar='WEIGHTS',
+                             help="autoplay with a trained n-tuple network (see ntuple.py) instead of expectimax")
+    autoplayers.add_argument('--rollouts', action='store_true',
+                             help="autoplay with Monte Carlo rollouts on a process pool (see rollout.py) instead of expectimax")
+    args = parser.parse_args(argv)
+    if not core.MIN_BOARD_SIZE <= args.size <= core.MAX_BOARD_SIZE:
+        parser.error(f"--size must be between {core.MIN_BOARD_SIZE} and {core.MAX_BOARD_SIZE}")
+    if args.record and args.size != bitboard.BOARD_SIZE:
+        logging.warning(f"Replays only support {bitboard.BOARD_SIZE}x{bitboard.BOARD_SIZE} boards, not recording.")
+        args.record = None
+    configure_layout(args.size)
+    if args.debug:
+        eventlog.set_debug(True)
+    events = eventlog.EventLog(args.event_log) if args.event_log else None # Shared by all games of the session
+
+    # The rollout workers are forked before SDL, the asset loader or a replay writer exist, so they
+    # inherit none of them; a spawned worker would instead re-import this module and its singletons
+    rollout_player = None
+    if args.rollouts:
+        from rollout import RolloutPlayer
+        if 'fork' in multiprocessing.get_all_start_methods():
+            rollout_player = RolloutPlayer(time_budget=ROLLOUT_TIME_BUDGET, mp_context=multiprocessing.get_context('fork'))
+            rollout_player.start()
+        else:
+            rollout_player = RolloutPlayer(time_budget=ROLLOUT_TIME_BUDGET, workers=0) # Rollouts in the game loop
+
     pygame.init()
     pygame.mixer.init() # Initialize the mixer for sound effects
+    audio.start() # Reserve the sound effect channels
     logging.info("Initializing Pygame for Cyberpunk 2048...")
 
-    # Load and play background music
-    try:
-        pygame.mixer.music.load("background.mp3") # Replace with your music file
-        pygame.mixer.music.play(-1) # Play indefinitely
-        logging.info("Background music loaded and playing.")
-    except pygame.error as e:
-        logging.warning(f"Could not load or play background music: {e}")
-
+    # Music and sounds load in the background, as does the font scan; the menu uses the built-in font until then
+    assets.start()
 
     # Create the screen
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("CYBERPUNK 2048")
 
-    # Load fonts - Try a cyberpunk-ish font, fallback to Arial/default
-    fonts = {}
-    try:
-        # Attempt to use a more "techy" or "glitchy" font if available
-        # Common monospace fonts often give a terminal/hacker feel
-        fonts['large'] = pygame.font.SysFont(FONT_NAME_PRIMARY, FONT_SIZE_LARGE, bold=True)
-        fonts['medium'] = pygame.font.SysFont(FONT_NAME_PRIMARY, FONT_SIZE_MEDIUM, bold=True)
-        fonts['small'] = pygame.font.SysFont(FONT_NAME_PRIMARY, FONT_SIZE_SMALL, bold=True)
-        fonts['score'] = pygame.font.SysFont(FONT_NAME_PRIMARY, FONT_SIZE_SCORE, bold=True)
-        fonts['message'] = pygame.font.SysFont(FONT_NAME_PRIMARY, FONT_SIZE_MESSAGE, bold=True)
-        logging.info(f"Successfully loaded '{FONT_NAME_PRIMARY}' font.")
-    except pygame.error as e:
-        logging.warning(f"Could not load '{FONT_NAME_PRIMARY}' font, using fallback '{FONT_NAME_FALLBACK}': {e}")
-        try:
-            fonts['large'] = pygame.font.SysFont(FONT_NAME_FALLBACK, FONT_SIZE_LARGE, bold=True)
-            fonts['medium'] = pygame.font.SysFont(FONT_NAME_FALLBACK, FONT_SIZE_MEDIUM, bold=True)
-            fonts['small'] = pygame.font.SysFont(FONT_NAME_FALLBACK, FONT_SIZE_SMALL, bold=True)
-            fonts['score'] = pygame.font.SysFont(FONT_NAME_FALLBACK, FONT_SIZE_SCORE, bold=True)
-            fonts['message'] = pygame.font.SysFont(FONT_NAME_FALLBACK, FONT_SIZE_MESSAGE, bold=True)
-            logging.info(f"Successfully loaded fallback '{FONT_NAME_FALLBACK}' font.")
-        except pygame.error as e_fallback:
-            logging.error(f"Could not load system font '{FONT_NAME_FALLBACK}' nor default, critical error: {e_fallback}")
-            # If even Arial fails, use pygame's default font (less control over boldness)
-            fonts['large'] = pygame.font.Font(None, FONT_SIZE_LARGE + 5) # Approx bold
-            fonts['medium'] = pygame.font.Font(None, FONT_SIZE_MEDIUM + 3)
-            fonts['small'] = pygame.font.Font(None, FONT_SIZE_SMALL)
-            fonts['score'] = pygame.font.Font(None, FONT_SIZE_SCORE + 3)
-            fonts['message'] = pygame.font.Font(None, FONT_SIZE_MESSAGE + 5)
-            logging.warning("Using Pygame's default unspecifed font.")
+    fonts = assets.placeholder_fonts()
 
 
     # Create game instance
-    game = Game2048()
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    game = start_game(args.record, args.player, events)
 
     # Clock for controlling FPS
     clock = pygame.time.Clock()
 
+    # Auto-player, toggled with P while playing (expectimax is created on first use)
+    autoplayer = None
+    autoplay = False
+    if args.ntuple:
+        from ntuple import NTupleNetwork, NTuplePlayer
+        autoplayer = NTuplePlayer(NTupleNetwork.load(args.ntuple)) # Memory-mapped, loads in milliseconds
+        logging.info(f"N-tuple auto-player loaded from '{args.ntuple}'.")
+    elif args.rollouts:
+        autoplayer = rollout_player # Workers started before pygame.init()
+
+    # Dirty-rectangle mode: track changed regions instead of flipping every frame
+    tracker = DirtyRectTracker() if args.dirty_rects else None
+
+    if args.profile or args.trace:
+        profiler.toggle()
+
     running = True
     while running:
+        profiler.begin_frame()
+        if tracker:
+            tracker.begin_frame(game)
+
+        # Switch from the placeholder font once the font scan is done; fonts are created here, on the main thread
+        if fonts is not assets.fonts and assets.create_fonts():
+            fonts = assets.fonts
+            if tracker:
+                tracker.full_redraw = True
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 logging.info("Termination signal received. Shutting down.")
                 running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) and tracker:
+                tracker.full_redraw = True # The window contents were lost, repaint everything
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+                if tracker and not profiler.enabled:
+                    tracker.full_redraw = True # Paint over the HUD
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                profiler.export_trace(args.trace or PROFILE_TRACE_FILE)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                if events is not None:
+                    events.dump(EVENT_LOG_FILE)
+                else:
+                    logging.warning("No event log to dump, start with --event-log.")
             elif event.type == pygame.KEYDOWN:
                 if game.game_state == 'MENU':
                     # Any key press starts the game
                     game.game_state = 'PLAYING'
                     logging.info("Game state changed to PLAYING.")
                 elif game.game_state == 'PLAYING':
-                    if game.game_over or game.won:
+                    if event.key == pygame.K_p and game.size != bitboard.BOARD_SIZE:
+                        logging.warning(f"Autoplay only supports {bitboard.BOARD_SIZE}x{bitboard.BOARD_SIZE} boards.")
+                    elif event.key == pygame.K_p:
+                        if autoplayer is None:
+                            from ai import ExpectimaxAI # Usually already imported by the asset loader
+                            autoplayer = ExpectimaxAI()
+                        autoplay = not autoplay
+                        logging.info(f"Autoplay {'engaged' if autoplay else 'disengaged'}. AI stats: {autoplayer.stats()}")
+                    elif event.key in (pygame.K_z, pygame.K_y):
+                        if game.history is None:
+                            logging.warning("Undo is not available while recording a replay.")
+                        elif event.key == pygame.K_z:
+                            game.history.undo()
+                        else:
+                            game.history.redo()
+                    elif game.game_over or game.won:
                         if event.key == pygame.K_r:
                             logging.info("SYSTEM REBOOT: Initializing new game sequence.")
-                            game = Game2048() # Create a new game instance to restart
+                            game.close_replay()
+                            game = start_game(args.record, args.player, events) # Create a new game instance to restart
                     elif not game.game_over : # Only process moves if game is not over
                         # moved = False # This variable isn't strictly necessary here as game.move returns it
                         if event.key == pygame.K_LEFT or event.key == pygame.K_a:
@@ -604,8 +779,30 @@ def main():
                 elif game.game_state in ['GAME_OVER', 'WON']:
                      if event.key == pygame.K_r:
                         logging.info("SYSTEM REBOOT: Initializing new game sequence.")
-                        game = Game2048() # Create a new game instance to restart
-
+                        game.close_replay()
+                        game = start_game(args.record, args.player, events) # Create a new game instance to restart
+        profiler.lap('events')
+
+
+        # Autoplay: the AI makes one move per frame within its latency budget
+        if autoplay and game.game_state == 'PLAYING' and not game.game_over and not game.won:
+            try:
+                packed = bitboard.pack(game.board)
+            except ValueError: # The list engine made a tile the auto-players' bitboards cannot hold
+                autoplay = False
+                logging.warning(f"Autoplay stopped: tiles above {1 << bitboard.MAX_EXPONENT} are not supported.")
+            else:
+                direction = autoplayer.choose_move(packed)
+                if direction:
+                    game.move(direction)
+            if game.game_over or game.won:
+                logging.info(f"Autoplay finished with score {game.score}. AI stats: {autoplayer.stats()}")
+        profiler.lap('ai')
+
+        # Play this frame's sound cues, at most one per sound
+        audio.flush()
+        profiler.lap('audio')
+        profiler.count(game)
 
         # Update effect timers (even if not currently used by the simple flash)
         # This is a placeholder for more complex effects later
@@ -614,18 +811,23 @@ def main():
         if game.won:
             game.win_effect_timer += clock.get_time()
 
-        # Draw everything based on game state
-        if game.game_state == 'MENU':
-            game.draw_menu(screen, fonts)
-        elif game.game_state == 'PLAYING':
-            game.draw(screen, fonts) # Draw game board and score
-        elif game.game_state in ['GAME_OVER', 'WON']:
-             game.draw(screen, fonts) # Draw game board, score, and game over/win overlay (handled in draw)
+        # In dirty-rectangle mode, find out what changed (None means everything)
+        dirty_rects = tracker.collect(game, pygame.time.get_ticks()) if tracker else None
+
+        if dirty_rects is None or dirty_rects: # Nothing to draw on idle frames
+            # Draw everything based on game state
+            if game.game_state == 'MENU':
+                game.draw_menu(screen, fonts)
+            elif game.game_state == 'PLAYING':
+                game.draw(screen, fonts) # Draw game board and score
+            elif game.game_state in ['GAME_OVER', 'WON']:
+                 game.draw(screen, fonts) # Draw game board, score, and game over/win overlay (handled in draw)
+            profiler.lap('draw')
 
 
-        # Add scanline effect for cyberpunk feel (apply to all states for consistency)
-        for y in range(0, SCREEN_HEIGHT, 3): # Draw lines every 3 pixels
-            pygame.draw.line(screen, (0, 0, 0, 30), (0, y), (SCREEN_WIDTH, y), 1) # Semi-transparent black lines
+            # Add scanline effect for cyberpunk feel (apply to all states for consistency)
+            compositor.draw_scanlines(screen) # Baked lines every 3 pixels, one blit
+            profiler.lap('scanlines')
 
         # Add simple glitch effect (apply to all states for consistency)
         if random.random() < 0.1: # Apply glitch effect with a 10% probability each frame
@@ -637,19 +839,49 @@ def main():
             glitch_area_y = max(0, glitch_area_y)
             glitch_area_y = min(SCREEN_HEIGHT - glitch_height, glitch_area_y)
 
-            # Create a sub-surface of the area to glitch
-            glitch_surface = screen.subsurface((0, glitch_area_y, SCREEN_WIDTH, glitch_height)).copy()
+            # Draw the glitched area with an offset (copied through a preallocated band)
+            compositor.glitch(screen, glitch_area_y, glitch_height, glitch_offset)
 
-            # Draw the glitched sub-surface with an offset
-            screen.blit(glitch_surface, (glitch_offset, glitch_area_y))
+            if tracker:
+                glitch_rect = pygame.Rect(0, glitch_area_y, SCREEN_WIDTH, glitch_height)
+                tracker.pending.append(glitch_rect) # Repaint the band on the next frame
+                if dirty_rects is not None:
+                    dirty_rects.append(glitch_rect)
+        profiler.lap('glitch')
 
+        # Profiler HUD on top of everything, refreshed every frame while enabled
+        if profiler.enabled:
+            hud_rect = profiler.draw_hud(screen, fonts['hud'], pygame.time.get_ticks())
+            if dirty_rects is not None:
+                dirty_rects.append(hud_rect)
+            profiler.lap('hud')
 
         # Update the display
-        pygame.display.flip()
+        if dirty_rects is None:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects) # Push only the changed regions
+        profiler.lap('present')
 
         # Cap the frame rate
         clock.tick(FPS)
-
+        profiler.lap('wait')
+
+        # Shed particles while frames miss their time target, restore them when there is headroom
+        particles.adapt(clock.get_rawtime())
+
+    game.close_replay()
+    leaderboard_store.close()
+    if args.rollouts:
+        autoplayer.close()
+    if tracker:
+        logging.info(f"Dirty-rectangle frames: {tracker.stats()}")
+    if audio.cues:
+        logging.info(f"Sound effects: {audio.stats()}")
+    if profiler.frames:
+        logging.info(f"Profiler: {profiler.summary()}")
+    if args.trace:
+        profiler.export_trace(args.trace)
     pygame.quit()
     logging.info("Pygame instance terminated.")
     sys.exit()
@@ -0,0 +1,299 @@
+"""
+N-tuple network value function for 2048, trained by TD(0) on afterstates.
+
+An n-tuple network scores a board as a sum of table lookups: every pattern
+(a fixed tuple of cells) indexes its weight table with the exponents of its
+cells, 4 bits per cell. Every pattern is applied to all 8 rotations and
+reflections of the board, so its weights are shared between symmetric
+positions. All tables live in one flat float32 array.
+
+Training plays games on the game core (core.GameCore) and learns the value
+of afterstates, the board after a move and before the tile spawns:
+
+    V(s'_t) += alpha * (r_t+1 + V(s'_t+1) - V(s'_t))
+
+where r_t+1 and s'_t+1 are the reward and afterstate of the greedy move from
+the next position (0 and no afterstate once the game is over). The player
+simply takes the move maximizing reward + V(afterstate), one batched
+evaluation per move, with no search.
+
+Weights are saved with np.save next to a small JSON file holding the
+patterns, and load as a read-only memory map in milliseconds.
+
+Example:
+    python ntuple.py train --episodes 20000 --output ntuple.npy
+    python selfplay.py --games 1000 --policy ntuple --weights ntuple.npy
+    python main.py --ntuple ntuple.npy   # P lets the network play
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import bitboard
+from core import GameCore
+
+VERSION = 1
+# Cells (row-major indices) of every pattern; each is applied to all 8 symmetries
+DEFAULT_PATTERNS = (
+    (0, 1, 2, 3),   # Outer row
+    (4, 5, 6, 7),   # Inner row
+    (0, 1, 4, 5),   # Corner square
+    (1, 2, 5, 6),   # Edge square
+    (5, 6, 9, 10),  # Center square
+)
+DEFAULT_WEIGHTS_FILE = 'ntuple.npy'
+DEFAULT_ALPHA = 0.1 # Learning rate per board; every looked-up weight moves by alpha / lookups
+SYMMETRIES = 8
+CELL_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def _runs(pattern):
+    """
+    Splits a pattern into runs of adjacent cells in the same row. Returns
+    (source shift, mask, destination shift) per run, so a tuple index is a few
+    shifts and masks of the packed board instead of one per cell.
+    """
+    runs = []
+    destination = 0
+    start = previous = pattern[0]
+    for cell in pattern[1:] + (None,):
+        if cell is not None and cell == previous + 1 and cell // bitboard.BOARD_SIZE == start // bitboard.BOARD_SIZE:
+            previous = cell
+            continue
+        length = previous - start + 1
+        runs.append((4 * start, (1 << (4 * length)) - 1, destination))
+        destination += 4 * length
+        start = previous = cell
+    return tuple(runs)
+
+
+def _symmetric_cells():
+    """
+    Returns, for each of the 8 forms of bitboard.symmetries(), the original cell
+    that ends up in every cell of the form.
+    """
+    numbered = sum(cell << (4 * cell) for cell in range(16)) # Every cell holds its own index
+    return [[(form >> (4 * cell)) & 0xF for cell in range(16)] for form in bitboard.symmetries(numbered)]
+
+
+def _sidecar(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+class NTupleNetwork:
+    """
+    Value function over packed boards: a weight table per pattern, shared by
+    the 8 symmetric forms of the board.
+    """
+    def __init__(self, patterns=DEFAULT_PATTERNS, weights=None):
+        self.patterns = tuple(tuple(pattern) for pattern in patterns)
+        sizes = [16 ** len(pattern) for pattern in self.patterns]
+        self.offsets = [sum(sizes[:i]) for i in range(len(sizes))]
+        self.features = [(offset, _runs(pattern)) for offset, pattern in zip(self.offsets, self.patterns)]
+        self.lookups = SYMMETRIES * len(self.patterns) # Weights read per evaluation
+
+        # For the batched path, every pattern on every form as cells of the original
+        # board: lookup l reads cells[l] scaled by scales[l] (0 pads shorter patterns)
+        width = max(len(pattern) for pattern in self.patterns)
+        self.lookup_cells = np.zeros((self.lookups, width), dtype=np.intp)
+        self.lookup_scales = np.zeros((self.lookups, width), dtype=np.intp)
+        self.lookup_offsets = np.zeros(self.lookups, dtype=np.intp)
+        lookup = 0
+        for origin in _symmetric_cells():
+            for offset, pattern in zip(self.offsets, self.patterns):
+                self.lookup_cells[lookup, :len(pattern)] = [origin[cell] for cell in pattern]
+                self.lookup_scales[lookup, :len(pattern)] = [16 ** k for k in range(len(pattern))]
+                self.lookup_offsets[lookup] = offset
+                lookup += 1
+
+        if weights is None:
+            weights = np.zeros(sum(sizes), dtype=np.float32)
+        if weights.shape != (sum(sizes),):
+            raise ValueError(f"Expected {sum(sizes)} weights for the patterns, got {weights.shape}")
+        self.weights = weights
+        self.table = memoryview(weights) # Reads Python floats much faster than indexing the array
+
+    @classmethod
+    def load(cls, path=DEFAULT_WEIGHTS_FILE, mmap=True):
+        """
+        Loads saved weights. With mmap they are a read-only memory map, otherwise a writable copy.
+        """
+        with open(_sidecar(path)) as f:
+            meta = json.load(f)
+        if meta.get('version') != VERSION:
+            raise ValueError(f"Unsupported n-tuple weights version {meta.get('version')} in '{path}'")
+        weights = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(meta['patterns'], weights)
+
+    def save(self, path=DEFAULT_WEIGHTS_FILE, **info):
+        """
+        Writes the weights (np.save) and the patterns plus any info to the JSON file next to them.
+        Both files are replaced atomically.
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, self.weights)
+        os.replace(temp_path, path)
+        meta = {'version': VERSION, 'patterns': [list(pattern) for pattern in self.patterns], **info}
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, _sidecar(path))
+
+    def indices(self, packed):
+        """
+        Returns the flat weight index of every pattern on every symmetric form of the board.
+        """
+        indices = []
+        for form in bitboard.symmetries(packed):
+            for offset, runs in self.features:
+                index = offset
+                for shift, mask, destination in runs:
+                    index += ((form >> shift) & mask) << destination
+                indices.append(index)
+        return indices
+
+    def value(self, packed):
+        """
+        Returns the value of a single board.
+        """
+        table = self.table
+        return sum(table[index] for index in self.indices(packed))
+
+    def update(self, packed, target, rate):
+        """
+        Moves the board's value towards target: every weight it looks up changes by
+        rate * (target - value). Returns the value before the update.
+        """
+        table = self.table
+        indices = self.indices(packed)
+        value = sum(table[index] for index in indices)
+        delta = rate * (target - value)
+        for index in indices:
+            table[index] += delta
+        return value
+
+    def evaluate_batch(self, boards):
+        """
+        Returns the values of an array of packed boards as a float64 array.
+        """
+        boards = np.asarray(boards, dtype=np.uint64)
+        cells = ((boards[:, None] >> CELL_SHIFTS) & 0xF).astype(np.intp) # (boards, 16) exponents
+        indices = (cells[:, self.lookup_cells] * self.lookup_scales).sum(axis=2) + self.lookup_offsets
+        return self.weights[indices].sum(axis=1, dtype=np.float64)
+
+
+class NTuplePlayer:
+    """
+    Plays the move with the best reward plus afterstate value, using the batched evaluation.
+    """
+    def __init__(self, network):
+        self.network = network
+
+        # Statistics
+        self.moves_chosen = 0
+        self.search_time = 0.0
+
+    def choose_move(self, packed):
+        """
+        Returns the best direction for the packed board, or None if no move is possible.
+        """
+        start = time.perf_counter()
+        moves = bitboard.afterstates(packed)
+        if not moves:
+            return None
+        values = self.network.evaluate_batch([after for _, after, _ in moves])
+        best = max(range(len(moves)), key=lambda i: moves[i][2] + values[i])
+        self.search_time += time.perf_counter() - start
+        self.moves_chosen += 1
+        return moves[best][0]
+
+    def stats(self):
+        """
+        Returns the play statistics as a dictionary.
+        """
+        return {
+            'moves': self.moves_chosen,
+            'avg_move_ms': 1000 * self.search_time / self.moves_chosen if self.moves_chosen else 0.0,
+        }
+
+
+def train_game(network, seed, alpha=DEFAULT_ALPHA):
+    """
+    Plays one game greedily on the network's values and learns from it with TD(0).
+    Returns the finished GameCore.
+    """
+    step = alpha / network.lookups
+    game = GameCore(use_bitboard=True, seed=seed)
+    previous = None # Afterstate of the previous move
+    while not game.game_over:
+        moves = bitboard.afterstates(bitboard.pack(game.board))
+        if not moves:
+            break
+        values = network.evaluate_batch([after for _, after, _ in moves])
+        best = max(range(len(moves)), key=lambda i: moves[i][2] + values[i])
+        direction, after, reward = moves[best]
+        if previous is not None:
+            network.update(previous, reward + values[best], step)
+        previous = after
+        game.move(direction)
+    if previous is not None:
+        network.update(previous, 0.0, step) # Nothing follows the last afterstate
+    return game
+
+
+def train(network, episodes, seed=0, alpha=DEFAULT_ALPHA, log_every=1000, output=None, save_every=None):
+    """
+    Trains the network for the given number of games (game i uses seed + i), logging
+    the mean score every log_every games and saving to output every save_every games.
+    """
+    scores = []
+    start = time.perf_counter()
+    moves = 0
+    for episode in range(1, episodes + 1):
+        game = train_game(network, seed + episode - 1, alpha)
+        scores.append(game.score)
+        moves += game.moves_made
+        if log_every and episode % log_every == 0:
+            recent = scores[-log_every:]
+            max_tile = 1 << bitboard.max_exponent(bitboard.pack(game.board))
+            logging.info(f"Episode {episode}: mean score {statistics.fmean(recent):.0f}, "
+                         f"best {max(recent)}, last max tile {max_tile}, "
+                         f"{moves / (time.perf_counter() - start):,.0f} moves/sec")
+        if output and save_every and episode % save_every == 0:
+            network.save(output, episodes=episode, alpha=alpha, seed=seed)
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train n-tuple network value functions for 2048.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    train_parser = commands.add_parser('train', help="learn weights by TD(0) self-play")
+    train_parser.add_argument('--episodes', type=int, default=10000, help="number of training games")
+    train_parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help="learning rate")
+    train_parser.add_argument('--seed', type=int, default=0, help="base seed; game i uses seed + i")
+    train_parser.add_argument('--output', default=DEFAULT_WEIGHTS_FILE, help="weights file to write")
+    train_parser.add_argument('--resume', action='store_true', help="continue from the weights in --output")
+    train_parser.add_argument('--log-every', type=int, default=1000, help="log the mean score every N games")
+    train_parser.add_argument('--save-every', type=int, default=1000, help="save the weights every N games")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.resume:
+        network = NTupleNetwork.load(args.output, mmap=False)
+        logging.info(f"Resuming from '{args.output}'.")
+    else:
+        network = NTupleNetwork()
+    train(network, args.episodes, args.seed, args.alpha, args.log_every, args.output, args.save_every)
+    network.save(args.output, episodes=args.episodes, alpha=args.alpha, seed=args.seed)
+    logging.info(f"Saved {len(network.weights):,} weights to '{args.output}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Batched particle system for the glowing tiles.
+
+Particles live in a preallocated pool of NumPy arrays. The pool is only
+refilled when the set of glowing tiles changes; every frame then samples the
+clock once, updates all positions with vectorized math and draws all
+particles with a single Surface.blits() call using pre-rendered circle sprites.
+
+The number of particles per tile adapts to the frame time: if frames keep
+missing the target, particles are removed one per tile at a time, and they
+come back once there is headroom again.
+"""
+import math
+
+import numpy as np
+import pygame
+
+COLORKEY = (1, 2, 3) # Transparent colour of the particle sprites
+MAX_PARTICLE_RADIUS = 4
+SLOW_FRAMES_TO_DEGRADE = 10 # Consecutive slow frames before dropping a particle per tile
+FAST_FRAMES_TO_RECOVER = 120 # Consecutive fast frames before adding one back
+
+
+class ParticleSystem:
+    """
+    Fixed-size particle pool orbiting the centres of glowing tiles.
+    """
+    def __init__(self, colors, capacity=96, particles_per_tile=6, frame_time_target_ms=1000 / 60):
+        self.colors = colors
+        self.capacity = capacity
+        self.max_per_tile = particles_per_tile
+        self.per_tile = particles_per_tile
+        self.frame_time_target_ms = frame_time_target_ms
+
+        # Pool, only the first self.count slots are active
+        self.center_x = np.zeros(capacity)
+        self.center_y = np.zeros(capacity)
+        self.base_angle = np.zeros(capacity) # Degrees
+        self.radius_scale = np.zeros(capacity)
+        self.phase = np.zeros(capacity) # Index within its tile, shifts the size pulse
+        self.count = 0
+        self.emitters = None
+
+        self.rng = np.random.default_rng() # Colour flicker, independent from the game RNG
+        self.sprites = None # sprites[color][radius], rendered on first draw
+        self.slow_frames = 0
+        self.fast_frames = 0
+
+    def _build_sprites(self):
+        """
+        Pre-renders one colorkeyed circle per colour and radius.
+        """
+        self.sprites = []
+        for color in self.colors:
+            by_radius = []
+            for radius in range(MAX_PARTICLE_RADIUS + 1):
+                sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1)).convert()
+                sprite.fill(COLORKEY)
+                pygame.draw.circle(sprite, color, (radius, radius), radius)
+                sprite.set_colorkey(COLORKEY, pygame.RLEACCEL)
+                by_radius.append(sprite)
+            self.sprites.append(by_radius)
+
+    def set_emitters(self, emitters):
+        """
+        Sets the glowing tiles as a list of (centre_x, centre_y, tile_value).
+        The pool is refilled only when the emitters or the particle budget change.
+        """
+        key = (tuple(emitters), self.per_tile)
+        if key == self.emitters:
+            return
+        self.emitters = key
+
+        per_tile = min(self.per_tile, self.capacity // len(emitters)) if emitters else 0
+        self.count = per_tile * len(emitters)
+        if not self.count:
+            return
+        emitter_array = np.array(emitters, dtype=np.float64)
+        self.center_x[:self.count] = np.repeat(emitter_array[:, 0], per_tile)
+        self.center_y[:self.count] = np.repeat(emitter_array[:, 1], per_tile)
+        self.radius_scale[:self.count] = np.repeat(1 + emitter_array[:, 2] / 2048, per_tile)
+        index = np.tile(np.arange(per_tile), len(emitters))
+        self.base_angle[:self.count] = index * (360 / per_tile) # Evenly spread around the tile
+        self.phase[:self.count] = index
+
+    def draw(self, screen, ticks):
+        """
+        Moves every active particle to its position at ticks and draws them in one batch.
+        """
+        n = self.count
+        if not n:
+            return
+        if self.sprites is None:
+            self._build_sprites()
+
+        angle = np.radians((ticks * 0.1 + self.base_angle[:n]) % 360)
+        orbit = (math.sin(ticks * 0.001) * 5 + 15) * self.radius_scale[:n]
+        x = (self.center_x[:n] + np.cos(angle) * orbit).astype(np.int32)
+        y = (self.center_y[:n] + np.sin(angle) * orbit).astype(np.int32)
+        radius = (2 + np.abs(np.sin(ticks * 0.005 + self.phase[:n])) * 2).astype(np.int32)
+        color = self.rng.integers(0, len(self.colors), n)
+
+        sprites = self.sprites
+        screen.blits([(sprites[c][r], (px - r, py - r))
+                      for c, r, px, py in zip(color.tolist(), radius.tolist(), x.tolist(), y.tolist())],
+                     doreturn=False)
+
+    def adapt(self, frame_time_ms):
+        """
+        Adjusts the particles per tile to the time the last frame took.
+        """
+        if frame_time_ms > self.frame_time_target_ms:
+            self.slow_frames += 1
+            self.fast_frames = 0
+            if self.slow_frames >= SLOW_FRAMES_TO_DEGRADE and self.per_tile > 0:
+                self.per_tile -= 1
+                self.slow_frames = 0
+        elif frame_time_ms < 0.75 * self.frame_time_target_ms:
+            self.fast_frames += 1
+            self.slow_frames = 0
+            if self.fast_frames >= FAST_FRAMES_TO_RECOVER and self.per_tile < self.max_per_tile:
+                self.per_tile += 1
+                self.fast_frames = 0
+        else:
+            self.slow_frames = 0
+            self.fast_frames = 0
@@ -0,0 +1,242 @@
+"""
+Symmetry-canonicalized position caches for search and evaluation.
+
+A 2048 position has up to 8 equivalent forms (4 rotations, each mirrored),
+and the rules, the spawns and the heuristic in ai.py treat them all the same.
+The caches here key every packed board (bitboard.py) by its canonical form,
+bitboard.canonical(), so a value computed for one form answers lookups for
+all eight.
+
+- PositionCache is an in-process LRU cache bounded by entry count. It is
+  guarded by a lock, so search threads can share one instance.
+- SharedPositionCache is a fixed-size table in multiprocessing shared memory
+  that worker processes attach to by name. Every slot holds one
+  (depth, value) entry, and a new entry replaces whatever was in its slot.
+  Writes are not locked; every slot stores a check word (key XOR depth XOR
+  value), so a slot torn by two processes writing at once reads as a miss.
+
+Both count hits, misses and evictions (per process for the shared table).
+
+Example:
+    python poscache.py   # expectimax nodes and cache hit rates with and without canonical keys
+"""
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import bitboard
+
+DEFAULT_CAPACITY = 200000
+SHARED_MAGIC = 0x3248435053503034 # Marks an initialized shared table
+SLOT_WORDS = 3 # check, depth | occupied bit, value bits
+OCCUPIED = 1 << 63
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # Fibonacci hashing spreads nearby boards over the table
+MASK64 = (1 << 64) - 1
+_DOUBLE = struct.Struct('<d')
+_WORD = struct.Struct('<Q')
+
+
+class PositionCache:
+    """
+    Thread-safe LRU cache of values by board, up to capacity entries.
+    With canonicalize=False boards are keyed as given.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, canonicalize=True):
+        self.capacity = capacity
+        self.canonicalize = canonicalize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, packed):
+        return bitboard.canonical(packed) if self.canonicalize else packed
+
+    def get(self, packed):
+        """
+        Returns the value cached for the board or any of its symmetric forms, or None.
+        """
+        key = self.key(packed)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, packed, value):
+        """
+        Caches a value for the board, evicting the least recently used entry when full.
+        """
+        key = self.key(packed)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Returns the hit, miss and eviction counts as a dictionary.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SharedPositionCache:
+    """
+    Fixed-size (depth, value) table in shared memory, shared between processes.
+    Create it once with a capacity, then attach to it by name in the workers.
+    Values are (depth, value) pairs: an int depth below 2**63 and a float value.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None, create=True, canonicalize=True):
+        self.canonicalize = canonicalize
+        self.owner = create # The creating process frees the memory on close()
+        if create:
+            self.bits = max(1, (capacity - 1).bit_length()) # Rounded up to a power of two
+            slots = 1 << self.bits
+            # One extra slot up front holds the magic and the table size for attach()
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=(slots + 1) * SLOT_WORDS * 8)
+            self.words = self.memory.buf.cast('Q')
+            self.words[0] = SHARED_MAGIC
+            self.words[1] = self.bits
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.words = self.memory.buf.cast('Q')
+            if self.words[0] != SHARED_MAGIC:
+                self.close()
+                raise ValueError(f"Shared memory '{name}' does not hold a position cache")
+            self.bits = self.words[1]
+        self.capacity = 1 << self.bits
+
+        # Statistics of this process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def attach(cls, name, canonicalize=True):
+        """
+        Attaches to a table created by another process.
+        """
+        return cls(name=name, create=False, canonicalize=canonicalize)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def _slot(self, key):
+        return (1 + (((key * HASH_MULTIPLIER) & MASK64) >> (64 - self.bits))) * SLOT_WORDS
+
+    def get(self, packed):
+        """
+        Returns the (depth, value) cached for the board or any of its symmetric forms, or None.
+        """
+        key = bitboard.canonical(packed) if self.canonicalize else packed
+        words = self.words
+        slot = self._slot(key)
+        check, depth, bits = words[slot], words[slot + 1], words[slot + 2]
+        if not depth & OCCUPIED or check ^ depth ^ bits != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return depth & ~OCCUPIED, _DOUBLE.unpack(_WORD.pack(bits))[0]
+
+    def put(self, packed, entry):
+        """
+        Stores a (depth, value) entry for the board, replacing the one in its slot.
+        """
+        key = bitboard.canonical(packed) if self.canonicalize else packed
+        depth, value = entry
+        depth |= OCCUPIED
+        bits = _WORD.unpack(_DOUBLE.pack(value))[0]
+        words = self.words
+        slot = self._slot(key)
+        old_depth = words[slot + 1]
+        if old_depth & OCCUPIED and words[slot] ^ old_depth ^ words[slot + 2] != key:
+            self.evictions += 1
+        words[slot + 2] = bits
+        words[slot + 1] = depth
+        words[slot] = key ^ depth ^ bits
+
+    def __len__(self):
+        words = self.words
+        return sum(1 for slot in range(SLOT_WORDS, len(words), SLOT_WORDS) if words[slot + 1] & OCCUPIED)
+
+    def clear(self):
+        words = self.words
+        for slot in range(SLOT_WORDS, len(words), SLOT_WORDS):
+            words[slot + 1] = 0
+
+    def stats(self):
+        """
+        Returns this process's hit, miss and eviction counts as a dictionary.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """
+        Detaches from the shared memory; the creating process also frees it.
+        """
+        if getattr(self, 'words', None) is not None:
+            self.words.release()
+            self.words = None
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
+
+    def __del__(self):
+        self.close()
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    from ai import ExpectimaxAI
+    from core import GameCore
+
+    # Positions of a seeded random game, searched to a fixed depth with each cache
+    rng = random.Random(0)
+    game = GameCore(use_bitboard=True, seed=0)
+    positions = []
+    while not game.game_over:
+        positions.append(bitboard.pack(game.board))
+        game.move(rng.choice(bitboard.DIRECTIONS))
+
+    for canonicalize in (False, True):
+        ai = ExpectimaxAI(time_budget=60.0, max_depth=4, cache=PositionCache(canonicalize=canonicalize))
+        start = time.perf_counter()
+        for packed in positions[::4]:
+            ai.choose_move(packed)
+        label = "canonical" if canonicalize else "as given"
+        print(f"{label:>9}: {ai.nodes:,} nodes in {time.perf_counter() - start:.2f} s, "
+              f"cache hit rate {ai.cache.stats()['hit_rate']:.1%}")
@@ -0,0 +1,216 @@
+"""
+Frame-time profiler and instrumentation HUD.
+
+The main loop marks the end of each phase of a frame (events, AI, draw,
+scanlines, glitch, present, wait) with lap(). Work nested inside a phase,
+such as Game2048.move, is timed with add() and excluded from the enclosing
+lap. Every call returns immediately while the profiler is disabled.
+
+While enabled, the profiler keeps a rolling window of frame times and
+per-phase timings, and counts moves, merges and spawned tiles from the game
+core. The HUD shows p50/p95/p99 frame times, dropped frames, the slowest
+phases and the engine counters. The recorded trace can be exported in the
+Chrome trace event format, which chrome://tracing and Perfetto can open.
+"""
+import collections
+import json
+import logging
+import time
+
+import pygame
+
+HISTORY_FRAMES = 600 # Rolling window for percentiles and rates (10 s at 60 FPS)
+TRACE_LIMIT = 200000 # Most recent trace events kept for export
+DROPPED_FRAME_FACTOR = 1.5 # A frame this many times longer than the budget missed a refresh
+HUD_REFRESH_MS = 250 # Re-render the HUD text at most this often
+HUD_PADDING = 4
+HUD_BACKGROUND = (0, 0, 0)
+HUD_TEXT_COLOR = (0, 255, 128)
+IDLE_PHASES = ('wait',) # Not shown among the slowest phases in the HUD
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class FrameProfiler:
+    """
+    Low-overhead per-phase frame timer with engine counters, HUD and trace export.
+    """
+    def __init__(self, frame_budget_ms, history=HISTORY_FRAMES, trace_limit=TRACE_LIMIT):
+        self.enabled = False
+        self.frame_budget_ms = frame_budget_ms
+        self.clock = time.perf_counter
+
+        # Rolling window, one entry per frame
+        self.frame_times = collections.deque(maxlen=history) # ms between frame starts
+        self.phase_history = collections.deque(maxlen=history) # {phase: seconds}
+        self.move_counts = collections.deque(maxlen=history)
+
+        self.frames = 0
+        self.dropped_frames = 0
+        self.totals = {'moves': 0, 'merges': 0, 'spawns': 0}
+        self.trace = collections.deque(maxlen=trace_limit) # (name, start, duration) in seconds
+
+        self.origin = self.clock()
+        self.frame_start = None
+        self.mark = None
+        self.nested = 0.0 # Time of add() sections since the last mark
+        self.phases = {}
+        self.frame_moves = 0
+        self.counted_game = None
+        self.counted = (0, 0, 0)
+
+        self.hud_surface = None
+        self.hud_rendered_at = None
+
+    def toggle(self):
+        """
+        Turns profiling on or off. Turning it on starts a fresh window.
+        """
+        self.enabled = not self.enabled
+        if self.enabled:
+            self.frame_times.clear()
+            self.phase_history.clear()
+            self.move_counts.clear()
+            self.frame_start = None
+            self.hud_rendered_at = None
+        logging.info(f"Profiler {'enabled' if self.enabled else 'disabled'}.")
+
+    def begin_frame(self):
+        """
+        Marks the start of a frame; the previous frame ends here.
+        """
+        if not self.enabled:
+            return
+        now = self.clock()
+        if self.frame_start is not None:
+            self._finish_frame(now)
+        self.frame_start = self.mark = now
+        self.nested = 0.0
+        self.phases = {}
+        self.frame_moves = 0
+
+    def lap(self, phase):
+        """
+        Charges the time since the previous mark, minus nested sections, to phase.
+        """
+        if not self.enabled or self.mark is None:
+            return
+        now = self.clock()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.mark - self.nested)
+        self.trace.append((phase, self.mark, now - self.mark))
+        self.mark = now
+        self.nested = 0.0
+
+    def add(self, phase, start):
+        """
+        Charges the time since start (taken from self.clock()) to a nested phase.
+        """
+        if not self.enabled or self.mark is None:
+            return
+        duration = self.clock() - start
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+        self.trace.append((phase, start, duration))
+        self.nested += duration
+
+    def count(self, game):
+        """
+        Samples the move-engine counters of the game core, once per frame.
+        """
+        if not self.enabled:
+            return
+        counters = (game.moves_made, game.merges_made, game.tiles_spawned)
+        if game is not self.counted_game: # New game, its counters started from zero
+            self.counted_game = game
+            self.counted = (0, 0, 0)
+        if any(now < before for now, before in zip(counters, self.counted)):
+            self.counted = counters # An undo rewound the counters; count from here, nothing this frame
+            return
+        moves, merges, spawns = (now - before for now, before in zip(counters, self.counted))
+        self.counted = counters
+        self.totals['moves'] += moves
+        self.totals['merges'] += merges
+        self.totals['spawns'] += spawns
+        self.frame_moves += moves
+
+    def _finish_frame(self, now):
+        frame_ms = (now - self.frame_start) * 1000
+        self.frames += 1
+        if frame_ms > self.frame_budget_ms * DROPPED_FRAME_FACTOR:
+            self.dropped_frames += 1
+        self.frame_times.append(frame_ms)
+        self.move_counts.append(self.frame_moves)
+        self.phase_history.append(self.phases)
+        self.trace.append(('frame', self.frame_start, now - self.frame_start))
+
+    def summary(self):
+        """
+        Returns frame time percentiles, dropped frames, average phase times and engine rates.
+        """
+        times = sorted(self.frame_times)
+        window_seconds = sum(times) / 1000
+        phase_ms = collections.Counter()
+        for phases in self.phase_history:
+            phase_ms.update(phases)
+        frames = len(self.phase_history) or 1
+        return {
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+            'frame_ms_p50': round(percentile(times, 0.50), 2),
+            'frame_ms_p95': round(percentile(times, 0.95), 2),
+            'frame_ms_p99': round(percentile(times, 0.99), 2),
+            'phase_ms': {phase: round(total * 1000 / frames, 3) for phase, total in phase_ms.most_common()},
+            'moves_per_sec': round(sum(self.move_counts) / window_seconds, 1) if window_seconds else 0.0,
+            **self.totals,
+        }
+
+    def draw_hud(self, screen, font, ticks):
+        """
+        Draws the HUD as a full-width bar at the bottom of the screen and returns its rectangle.
+        The text is re-rendered at most every HUD_REFRESH_MS.
+        """
+        if self.hud_surface is None or self.hud_rendered_at is None or ticks - self.hud_rendered_at >= HUD_REFRESH_MS:
+            self.hud_surface = self._render_hud(font, screen.get_width())
+            self.hud_rendered_at = ticks
+        rect = self.hud_surface.get_rect(bottomleft=(0, screen.get_height()))
+        screen.blit(self.hud_surface, rect)
+        return rect
+
+    def _render_hud(self, font, width):
+        stats = self.summary()
+        slowest = [(phase, ms) for phase, ms in stats['phase_ms'].items() if phase not in IDLE_PHASES][:4]
+        lines = [
+            f"frame p50 {stats['frame_ms_p50']:.1f}  p95 {stats['frame_ms_p95']:.1f}  p99 {stats['frame_ms_p99']:.1f} ms",
+            f"dropped {stats['dropped_frames']}/{stats['frames']}",
+            "  ".join(f"{phase} {ms:.2f}" for phase, ms in slowest),
+            f"moves/s {stats['moves_per_sec']:.0f}  merges {stats['merges']}  spawns {stats['spawns']}",
+        ]
+        rendered = [font.render(line, True, HUD_TEXT_COLOR, HUD_BACKGROUND) for line in lines]
+        height = sum(surface.get_height() for surface in rendered) + 2 * HUD_PADDING
+        hud = pygame.Surface((width, height)).convert()
+        hud.fill(HUD_BACKGROUND)
+        y = HUD_PADDING
+        for surface in rendered:
+            hud.blit(surface, (HUD_PADDING, y))
+            y += surface.get_height()
+        return hud
+
+    def export_trace(self, path):
+        """
+        Writes the recorded phases and frames as Chrome trace events (JSON) to path.
+        """
+        events = [
+            {'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+             'ts': round((start - self.origin) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+            for name, start, duration in self.trace
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.summary()}, f)
+        logging.info(f"Exported {len(events)} trace events to {path}")
@@ -0,0 +1,96 @@
+"""
+Render cache for the pygame front end.
+
+Text rendering and SRCALPHA surface creation are the most expensive parts of
+a frame, yet almost everything on screen (tile numbers, the score bar, the
+overlay messages) only changes when the game state changes. RenderCache keeps
+those surfaces in small LRU caches so a steady frame allocates next to nothing.
+"""
+from collections import OrderedDict
+
+import pygame
+
+
+class LRUCache:
+    """
+    Size-bounded mapping that evicts the least recently used entry.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """
+        Returns the cached value for key, calling build() to create it on a miss.
+        """
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = build()
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False) # Evict the least recently used entry
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+
+class RenderCache:
+    """
+    Caches rendered text, precomposed sprites and reusable alpha surfaces.
+    One instance is shared by every game, so restarts keep their sprites.
+    """
+    def __init__(self, max_texts=256, max_sprites=64, max_panels=8):
+        self.texts = LRUCache(max_texts) # (font, text, color) -> text surface
+        self.sprites = LRUCache(max_sprites) # caller-defined key -> precomposed sprite
+        self.panels = LRUCache(max_panels) # caller-defined key -> opaque panel (e.g. score bar)
+        self.alpha_fills = {} # (size, rgb) -> [SRCALPHA surface, current alpha]
+
+    def text(self, font, text, color):
+        """
+        Returns the antialiased rendering of text, rendered once per (font, text, color).
+        """
+        return self.texts.get((font, text, color), lambda: font.render(text, True, color))
+
+    def sprite(self, key, build):
+        """
+        Returns the precomposed sprite for key, calling build() on a miss.
+        """
+        return self.sprites.get(key, build)
+
+    def panel(self, key, build):
+        """
+        Returns the panel surface for key, calling build() on a miss.
+        """
+        return self.panels.get(key, build)
+
+    def alpha_fill(self, size, color, alpha):
+        """
+        Returns a reusable SRCALPHA surface of the given size filled with color at alpha.
+        The surface is only refilled when the requested alpha changes.
+        """
+        key = (size, color[:3])
+        entry = self.alpha_fills.get(key)
+        if entry is None:
+            entry = [pygame.Surface(size, pygame.SRCALPHA), None]
+            self.alpha_fills[key] = entry
+        if entry[1] != alpha:
+            entry[0].fill((*color[:3], alpha))
+            entry[1] = alpha
+        return entry[0]
+
+    def stats(self):
+        """
+        Returns hit/miss counts and sizes of the caches.
+        """
+        return {
+            name: {'entries': len(cache.entries), 'hits': cache.hits, 'misses': cache.misses}
+            for name, cache in (('texts', self.texts), ('sprites', self.sprites), ('panels', self.panels))
+        }
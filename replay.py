@@ -0,0 +1,312 @@
+"""
+Compact binary replays: recording, seeking and verification.
+
+A replay file is a fixed header followed by one byte per move:
+
+    header:   magic b'CP2048RP', version (u8), flags (u8), keyframe interval (u16),
+              seed (u64), initial board (u64, bitboard.pack layout), little endian
+    move:     bits 0-1  direction (index in bitboard.DIRECTIONS)
+              bits 2-5  cell of the spawned tile (row-major index)
+              bit  6    spawned value (0: 2, 1: 4)
+              bit  7    keyframe: the board (u64) and score (u32) after this move follow
+
+Only moves that changed the board are recorded, and every such move spawns
+exactly one tile, so the byte fully determines the next position. Every
+keyframe-interval moves the position is stored in full, so Replay.position(n)
+replays at most one interval of moves through the bitboard engine, however
+long the game is.
+
+ReplayRecorder appends moves from a background thread, so the game loop only
+pays for a queue put. Replay.verify() replays a seeded game through GameCore
+and checks that every spawn matches what the seed produces, which is how
+high scores are audited. Version 2 replays spawn from spawnrng.SpawnRNG;
+version 1 replays were recorded with random.Random and are verified with
+spawnrng.MersenneSpawnRNG. Version 1 list-engine games also listed the empty
+cells in a different order: that engine rotated the board so every move
+became a left move and spawned before rotating back, so it picked from the
+empty cells in row-major order of the rotated board. Those replays are
+verified on the bitboard engine with that order rebuilt.
+
+Example:
+    python replay.py game.2048r            # summary and verification
+    python replay.py game.2048r --at 500   # print the board after move 500
+"""
+import argparse
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+
+import bitboard
+from core import GameCore
+from spawnrng import MersenneSpawnRNG
+
+MAGIC = b'CP2048RP'
+VERSION = 2
+LEGACY_VERSION = 1 # Spawns drawn from random.Random
+HEADER = struct.Struct('<8sBBHQQ')
+KEYFRAME = struct.Struct('<QI') # Board and score after the keyframe move
+FLAG_SEEDED = 0x01 # The seed field is valid
+FLAG_BITBOARD = 0x02 # Recorded with GameCore(use_bitboard=True); in version 2 both engines spawn identically
+KEYFRAME_BIT = 0x80
+DEFAULT_KEYFRAME_INTERVAL = 256
+FILE_EXTENSION = '.2048r'
+LEGACY_TURNS = {'left': 0, 'right': 2, 'up': 3, 'down': 1} # Clockwise turns of the version 1 list engine per move
+
+
+def rotate_index(index, turns):
+    """
+    Returns where a row-major 4x4 cell index ends up after turning the board 90 degrees clockwise turns times.
+    """
+    row, col = divmod(index, bitboard.BOARD_SIZE)
+    for _ in range(turns):
+        row, col = col, bitboard.BOARD_SIZE - 1 - row
+    return row * bitboard.BOARD_SIZE + col
+
+
+# direction -> the cells in the order the version 1 list engine listed them when spawning after that move
+LEGACY_SPAWN_ORDERS = {
+    direction: tuple(rotate_index(index, -turns % 4) for index in range(bitboard.BOARD_SIZE ** 2))
+    for direction, turns in LEGACY_TURNS.items()
+}
+
+
+class ReplayError(ValueError):
+    """
+    Raised for malformed replay files and replays that do not verify.
+    """
+
+
+def encode_move(direction, spawn):
+    """
+    Packs a direction and a (cell index, exponent) spawn into one move byte.
+    """
+    index, exponent = spawn
+    return bitboard.DIRECTIONS.index(direction) | (index << 2) | ((exponent - 1) << 6)
+
+
+def decode_move(byte):
+    """
+    Returns (direction, cell index, exponent) for a move byte.
+    """
+    return bitboard.DIRECTIONS[byte & 0x03], (byte >> 2) & 0x0F, ((byte >> 6) & 0x01) + 1
+
+
+class ReplayRecorder:
+    """
+    Streams one game into an append-only replay file from a background thread.
+    """
+    def __init__(self, path, seed, initial_board, use_bitboard=False,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.moves = 0
+        flags = (FLAG_SEEDED if seed is not None else 0) | (FLAG_BITBOARD if use_bitboard else 0)
+        header = HEADER.pack(MAGIC, VERSION, flags, keyframe_interval, seed or 0, bitboard.pack(initial_board))
+
+        self.file = open(path, 'wb')
+        self.queue = queue.SimpleQueue()
+        self.queue.put(header)
+        self.thread = threading.Thread(target=self._write_loop, name='replay-writer', daemon=True)
+        self.thread.start()
+
+    def record(self, direction, spawn, board, score):
+        """
+        Records a move that changed the board. board and score are the position after it.
+        Raises ReplayError, recording nothing, if the move made a tile above 32768:
+        replays move on the bitboard engine, which cannot hold it.
+        """
+        if max(map(max, board)) > 1 << bitboard.MAX_EXPONENT:
+            raise ReplayError(f"Replays cannot hold tiles above {1 << bitboard.MAX_EXPONENT}")
+        self.moves += 1
+        byte = encode_move(direction, spawn)
+        if self.moves % self.keyframe_interval == 0:
+            self.queue.put(bytes((byte | KEYFRAME_BIT,)) + KEYFRAME.pack(bitboard.pack(board), score))
+        else:
+            self.queue.put(bytes((byte,)))
+
+    def _write_loop(self):
+        while True:
+            chunks = [self.queue.get()]
+            try: # Write everything queued so far in one go
+                while True:
+                    chunks.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            closing = chunks[-1] is None
+            if closing:
+                chunks.pop()
+            self.file.write(b''.join(chunks))
+            self.file.flush()
+            if closing:
+                self.file.close()
+                return
+
+    def close(self):
+        """
+        Writes out everything still queued and closes the file.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class Replay:
+    """
+    A loaded replay with a keyframe index for fast seeking.
+    """
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise ReplayError("File is too short for a replay header")
+        magic, version, flags, self.keyframe_interval, seed, self.initial_board = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("Not a replay file")
+        if version not in (VERSION, LEGACY_VERSION):
+            raise ReplayError(f"Unsupported replay version {version}")
+        self.version = version
+        self.seed = seed if flags & FLAG_SEEDED else None
+        self.use_bitboard = bool(flags & FLAG_BITBOARD)
+
+        # Split the stream into move bytes and keyframes (move number -> (board, score))
+        moves = bytearray()
+        self.keyframes = {0: (self.initial_board, 0)}
+        offset = HEADER.size
+        while offset < len(data):
+            byte = data[offset]
+            moves.append(byte & ~KEYFRAME_BIT)
+            offset += 1
+            if byte & KEYFRAME_BIT:
+                if offset + KEYFRAME.size > len(data):
+                    break # Truncated keyframe at the end of a file still being written
+                self.keyframes[len(moves)] = KEYFRAME.unpack_from(data, offset)
+                offset += KEYFRAME.size
+        self.moves = bytes(moves)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.moves)
+
+    def directions(self):
+        """
+        Returns the list of recorded directions.
+        """
+        return [bitboard.DIRECTIONS[byte & 0x03] for byte in self.moves]
+
+    def _advance(self, packed, score, byte):
+        direction, index, exponent = decode_move(byte)
+        new_packed, score_delta, _, _ = bitboard.move(packed, direction)
+        if new_packed == packed:
+            raise ReplayError(f"Recorded move {direction} does not change the board")
+        if (new_packed >> (4 * index)) & 0xF:
+            raise ReplayError(f"Recorded spawn on occupied cell {index}")
+        return bitboard.set_cell(new_packed, index, exponent), score + score_delta
+
+    def position(self, move_number):
+        """
+        Returns (packed board, score) after move_number moves, replaying from the
+        nearest keyframe at or before it.
+        """
+        if not 0 <= move_number <= len(self.moves):
+            raise IndexError(f"Move {move_number} is outside the replay (0..{len(self.moves)})")
+        start = move_number - move_number % self.keyframe_interval
+        while start not in self.keyframes: # Keyframe missing from a truncated file
+            start -= self.keyframe_interval
+        packed, score = self.keyframes[start]
+        for byte in self.moves[start:move_number]:
+            packed, score = self._advance(packed, score, byte)
+        return packed, score
+
+    def positions(self):
+        """
+        Yields (move number, packed board, score) for every position from the start, in order.
+        """
+        packed, score = self.initial_board, 0
+        yield 0, packed, score
+        for number, byte in enumerate(self.moves, 1):
+            packed, score = self._advance(packed, score, byte)
+            yield number, packed, score
+
+    def verify(self):
+        """
+        Replays the game through GameCore with the recorded seed and checks every
+        spawn and every keyframe. Returns the final score; raises ReplayError on a mismatch.
+        """
+        if self.seed is None:
+            raise ReplayError("Replay has no seed, spawns cannot be verified")
+        if self.version == LEGACY_VERSION and not self.use_bitboard:
+            return self._verify_legacy_list()
+        rng = MersenneSpawnRNG(self.seed) if self.version == LEGACY_VERSION else None
+        game = GameCore(use_bitboard=self.use_bitboard, seed=self.seed, rng=rng)
+        if bitboard.pack(game.board) != self.initial_board:
+            raise ReplayError("Initial board does not match the seed")
+        for number, byte in enumerate(self.moves, 1):
+            direction, index, exponent = decode_move(byte)
+            if not game.move(direction):
+                raise ReplayError(f"Move {number} ({direction}) does not change the board")
+            if game.last_spawn != (index, exponent):
+                raise ReplayError(f"Move {number}: recorded spawn {(index, exponent)} but the seed spawns {game.last_spawn}")
+            keyframe = self.keyframes.get(number)
+            if keyframe and keyframe != (bitboard.pack(game.board), game.score):
+                raise ReplayError(f"Keyframe after move {number} does not match the replayed position")
+        return game.score
+
+    def _verify_legacy_list(self):
+        """
+        verify() for version 1 list-engine replays: moves run on the bitboard engine and
+        every spawn picks from the empty cells in LEGACY_SPAWN_ORDERS order.
+        """
+        rng = MersenneSpawnRNG(self.seed)
+        game = GameCore(use_bitboard=True, seed=self.seed, rng=rng) # The first two tiles spawned in row-major order
+        packed, score = bitboard.pack(game.board), 0
+        if packed != self.initial_board:
+            raise ReplayError("Initial board does not match the seed")
+        for number, byte in enumerate(self.moves, 1):
+            direction, index, exponent = decode_move(byte)
+            new_packed, score_delta, _, _ = bitboard.move(packed, direction)
+            if new_packed == packed:
+                raise ReplayError(f"Move {number} ({direction}) does not change the board")
+            empty = [cell for cell in LEGACY_SPAWN_ORDERS[direction] if not (new_packed >> (4 * cell)) & 0xF]
+            k, spawned_exponent = rng.spawn(len(empty))
+            if (empty[k], spawned_exponent) != (index, exponent):
+                raise ReplayError(f"Move {number}: recorded spawn {(index, exponent)} but the seed spawns {(empty[k], spawned_exponent)}")
+            packed, score = bitboard.set_cell(new_packed, index, exponent), score + score_delta
+            keyframe = self.keyframes.get(number)
+            if keyframe and keyframe != (packed, score):
+                raise ReplayError(f"Keyframe after move {number} does not match the replayed position")
+        return score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and verify a 2048 replay file.")
+    parser.add_argument('path', help="replay file")
+    parser.add_argument('--at', type=int, help="print the board after this many moves")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    replay = Replay.load(args.path)
+    packed, score = replay.position(len(replay))
+    logging.info(f"{os.path.basename(args.path)}: seed {replay.seed}, {len(replay)} moves, "
+                 f"{len(replay.keyframes) - 1} keyframes, score {score}, "
+                 f"max tile {1 << bitboard.max_exponent(packed)}")
+    if replay.seed is not None:
+        try:
+            logging.info(f"Verified: score {replay.verify()} reproduces from the seed.")
+        except ReplayError as e:
+            logging.error(f"Verification failed: {e}")
+            return 1
+    if args.at is not None:
+        packed, score = replay.position(args.at)
+        logging.info(f"After move {args.at}: score {score}")
+        for row in bitboard.unpack(packed):
+            print(' '.join(f"{value:>5}" for value in row))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Monte Carlo rollout auto-player for 2048.
+
+Every legal direction is scored by the mean score of many random games
+(rollouts) played for a fixed number of moves from the position after it.
+Rollouts run on packed 64-bit boards (bitboard.py), so copying a position is
+copying an int, and never touch the pygame front end.
+
+Rollouts are handed out in small batches, round robin over the directions,
+to a process pool (or a thread pool, or run inline with workers=0) until
+the per-move time budget runs out. The move is always the best one found so
+far, so any budget gives an answer, and a bigger budget or more workers gives
+a better one. Batches still running at the deadline are dropped.
+
+Run `python rollout.py --workers 1,2,4,8` to measure rollouts/sec for each
+worker count on the positions of a seeded game.
+"""
+import argparse
+import concurrent.futures
+import logging
+import os
+import random
+import sys
+import time
+
+import bitboard
+
+DEFAULT_TIME_BUDGET = 0.050 # Seconds per move
+DEFAULT_DEPTH = 20 # Random moves per rollout
+DEFAULT_BATCH = 16 # Rollouts per task handed to a worker
+IN_FLIGHT_PER_WORKER = 2 # Batches queued per worker, so workers never wait for the next one
+
+
+def rollout(packed, depth, rng):
+    """
+    Plays up to depth random moves from a board after a move, before its tile
+    spawns. Returns the score gained; the rollout ends early if the game is lost.
+    """
+    score = 0
+    directions = list(bitboard.DIRECTIONS)
+    for _ in range(depth):
+        empty = bitboard.empty_cells(packed)
+        exponent = 1 if rng.random() < 0.9 else 2 # 90% chance of 2, 10% chance of 4
+        packed |= exponent << (4 * empty[int(rng.random() * len(empty))])
+        rng.shuffle(directions)
+        for direction in directions:
+            after, gained, _, _ = bitboard.move(packed, direction)
+            if after != packed:
+                break
+        else:
+            break # No move left
+        packed = after
+        score += gained
+    return score
+
+
+def run_rollouts(packed, depth, count, seed):
+    """
+    Plays count rollouts from the board with their own generator. Returns the total score.
+    This is the task workers run, so it only takes picklable arguments.
+    """
+    rng = random.Random(seed)
+    return sum(rollout(packed, depth, rng) for _ in range(count))
+
+
+class RolloutPlayer:
+    """
+    Picks moves by the mean score of random rollouts under a per-move time budget.
+    workers=0 runs the rollouts in the calling thread; executor is 'process' or 'thread'.
+    mp_context is the multiprocessing context of a process pool (the default one if None).
+    """
+    def __init__(self, time_budget=DEFAULT_TIME_BUDGET, depth=DEFAULT_DEPTH, batch=DEFAULT_BATCH,
+                 workers=None, executor='process', seed=None, mp_context=None):
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor '{executor}', expected 'process' or 'thread'")
+        self.time_budget = time_budget
+        self.depth = depth
+        self.batch = batch
+        self.workers = os.cpu_count() if workers is None else workers
+        self.executor = executor
+        self.rng = random.Random(seed)
+        self.mp_context = mp_context
+        self.pool = None # Created by start() or on the first move
+
+        # Statistics
+        self.rollouts = 0
+        self.search_time = 0.0
+        self.moves_chosen = 0
+        self.last_rollouts = 0
+
+    def start(self):
+        """
+        Starts the worker pool and its processes now instead of on the first move.
+        A 'fork' pool launches all its processes at the first task, so after start()
+        no process is forked from whatever state the caller reaches later.
+        """
+        if self.workers and self.pool is None:
+            self._start_pool()
+            self.pool.submit(int).result()
+
+    def _start_pool(self):
+        if self.executor == 'process':
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=self.mp_context)
+        else:
+            self.pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='rollout')
+
+    def choose_move(self, packed):
+        """
+        Returns the direction with the best mean rollout score found within the
+        time budget, or None if no move is possible.
+        """
+        moves = bitboard.afterstates(packed)
+        if not moves:
+            return None
+        if len(moves) == 1:
+            self.moves_chosen += 1
+            return moves[0][0] # Forced move, nothing to compare
+
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        totals = [0] * len(moves)
+        counts = [0] * len(moves)
+        if self.workers:
+            self._run_pool(moves, totals, counts, deadline)
+        else:
+            turn = 0
+            while time.perf_counter() < deadline:
+                _, after, _ = moves[turn]
+                totals[turn] += run_rollouts(after, self.depth, self.batch, self.rng.getrandbits(64))
+                counts[turn] += self.batch
+                turn = (turn + 1) % len(moves)
+
+        def mean_score(i):
+            # Directions without a finished rollout yet only count their immediate score
+            return moves[i][2] + (totals[i] / counts[i] if counts[i] else 0)
+
+        best = max(range(len(moves)), key=mean_score)
+        self.last_rollouts = sum(counts)
+        self.rollouts += self.last_rollouts
+        self.search_time += time.perf_counter() - start
+        self.moves_chosen += 1
+        return moves[best][0]
+
+    def _run_pool(self, moves, totals, counts, deadline):
+        """
+        Keeps the pool busy with batches, round robin over the moves, until the deadline.
+        """
+        if self.pool is None:
+            self._start_pool()
+        pending = {}
+        turn = 0
+        while True:
+            while len(pending) < self.workers * IN_FLIGHT_PER_WORKER:
+                _, after, _ = moves[turn]
+                future = self.pool.submit(run_rollouts, after, self.depth, self.batch, self.rng.getrandbits(64))
+                pending[future] = turn
+                turn = (turn + 1) % len(moves)
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, _ = concurrent.futures.wait(pending, timeout=remaining,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                move = pending.pop(future)
+                totals[move] += future.result()
+                counts[move] += self.batch
+        for future in pending:
+            future.cancel() # Batches already running finish in the background and are dropped
+
+    def stats(self):
+        """
+        Returns the rollout statistics as a dictionary.
+        """
+        return {
+            'moves': self.moves_chosen,
+            'rollouts': self.rollouts,
+            'rollouts_per_sec': self.rollouts / self.search_time if self.search_time else 0.0,
+            'last_rollouts': self.last_rollouts,
+            'avg_move_ms': 1000 * self.search_time / self.moves_chosen if self.moves_chosen else 0.0,
+            'workers': self.workers,
+        }
+
+    def close(self):
+        """
+        Shuts the worker pool down.
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Monte Carlo rollout throughput for 2048.")
+    parser.add_argument('--workers', default=str(os.cpu_count()),
+                        help="comma-separated worker counts to measure (0 runs inline)")
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help="seconds per move")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="random moves per rollout")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH, help="rollouts per task")
+    parser.add_argument('--moves', type=int, default=40, help="moves of a seeded game to search")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from core import GameCore
+
+    for workers in (int(count) for count in args.workers.split(',')):
+        with RolloutPlayer(args.time_budget, args.depth, args.batch, workers, args.executor, args.seed) as player:
+            game = GameCore(use_bitboard=True, seed=args.seed)
+            while not game.game_over and player.moves_chosen < args.moves:
+                direction = player.choose_move(bitboard.pack(game.board))
+                if direction is None:
+                    break
+                game.move(direction)
+            stats = player.stats()
+        logging.info(f"{workers} {args.executor} workers: {stats['rollouts_per_sec']:,.0f} rollouts/sec, "
+                     f"{stats['rollouts'] / max(1, stats['moves']):,.0f} rollouts/move, score {game.score}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
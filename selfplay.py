@@ -0,0 +1,320 @@
+"""
+Multi-process self-play runner for policy evaluation.
+
+Games are spread over a process pool. Workers only import the headless core
+(core.py, bitboard.py, ai.py), never pygame or the sound files. Game i is
+always played with seed `--seed + i`, so a run is reproducible no matter how
+many workers it uses or in which order games finish (policies with a time
+budget, like expectimax, can still pick differently under machine load).
+
+Results are streamed as one JSON object per game (to stdout or --output) and
+aggregated statistics are logged as games finish. With --export, every move
+is also appended as a (board, action, reward, next board) transition to a
+memory-mapped dataset (see dataset.py). With --shared-cache, expectimax
+workers share one transposition table in shared memory (see poscache.py).
+
+Example:
+    python selfplay.py --games 10000 --policy greedy --workers 8 --output results.jsonl
+    python selfplay.py --games 100000 --policy greedy --export data/greedy --append
+    python selfplay.py --games 100 --policy expectimax --shared-cache 1000000
+    python selfplay.py --games 10000 --policy ntuple --weights ntuple.npy
+
+A custom policy can be given as 'module:factory', where factory(rng) returns
+a callable that maps a packed board to a direction.
+"""
+import argparse
+import collections
+import importlib
+import inspect
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+import bitboard
+from ai import ExpectimaxAI, heuristic
+from core import GameCore
+from dataset import DatasetWriter
+from ntuple import DEFAULT_WEIGHTS_FILE, NTupleNetwork, NTuplePlayer
+from poscache import SharedPositionCache
+from rollout import RolloutPlayer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def random_policy(rng):
+    """
+    Plays a uniformly random legal direction.
+    """
+    def choose(packed):
+        legal = [d for d in bitboard.DIRECTIONS if bitboard.MOVE_FUNCTIONS[d](packed) != packed]
+        return rng.choice(legal) if legal else None
+    return choose
+
+
+def greedy_policy(rng):
+    """
+    Plays the direction with the best heuristic value after the move (one ply, no spawns).
+    """
+    def choose(packed):
+        best_direction = None
+        best_value = -math.inf
+        for direction in bitboard.DIRECTIONS:
+            after = bitboard.MOVE_FUNCTIONS[direction](packed)
+            if after != packed:
+                value = heuristic(after)
+                if value > best_value:
+                    best_value = value
+                    best_direction = direction
+        return best_direction
+    return choose
+
+
+def expectimax_policy(rng, time_budget=0.010, shared_cache=None):
+    """
+    Plays the move chosen by the expectimax search in ai.py. shared_cache names
+    a SharedPositionCache to use as the transposition table.
+    """
+    cache = _attach_shared_cache(shared_cache) if shared_cache else None
+    return ExpectimaxAI(time_budget=time_budget, cache=cache).choose_move
+
+
+def ntuple_policy(rng, weights=DEFAULT_WEIGHTS_FILE):
+    """
+    Plays the move with the best afterstate value of a trained n-tuple network (ntuple.py).
+    """
+    return NTuplePlayer(_load_network(weights)).choose_move
+
+
+def rollout_policy(rng, time_budget=0.050):
+    """
+    Plays the move with the best mean score of Monte Carlo rollouts (rollout.py).
+    The rollouts run inline, since games are already spread over the worker processes.
+    """
+    return RolloutPlayer(time_budget=time_budget, workers=0, seed=rng.getrandbits(64)).choose_move
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'expectimax': expectimax_policy,
+    'ntuple': ntuple_policy,
+    'rollout': rollout_policy,
+}
+
+
+def load_policy(name):
+    """
+    Returns the policy factory registered under name, or imported from 'module:factory'.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, attribute = name.partition(':')
+    if not attribute:
+        raise ValueError(f"Unknown policy '{name}'. Choose from {sorted(POLICIES)} or use 'module:factory'.")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def accepts_option(factory, option):
+    """
+    Returns True if the policy factory takes the keyword option.
+    """
+    parameters = inspect.signature(factory).parameters
+    return option in parameters or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+
+
+# Per-process worker state, set up once by _init_worker
+_worker_policy_factory = None
+_worker_policy_options = {}
+_worker_shared_caches = {} # name -> SharedPositionCache attached by this process
+_worker_networks = {} # weights file -> NTupleNetwork memory-mapped by this process
+
+
+def _attach_shared_cache(name):
+    if name not in _worker_shared_caches:
+        _worker_shared_caches[name] = SharedPositionCache.attach(name)
+    return _worker_shared_caches[name]
+
+
+def _load_network(path):
+    if path not in _worker_networks:
+        _worker_networks[path] = NTupleNetwork.load(path)
+    return _worker_networks[path]
+
+
+def _init_worker(policy_name, policy_options):
+    global _worker_policy_factory, _worker_policy_options
+    _worker_policy_factory = load_policy(policy_name)
+    _worker_policy_options = policy_options
+    logging.getLogger().setLevel(logging.WARNING) # Keep worker output quiet
+
+
+def play_game(game_index, seed, collect=False):
+    """
+    Plays one full game with the worker's policy and returns its result record.
+    With collect, the record also holds the game's transitions under 'transitions'
+    as (boards, actions, rewards, next_boards, terminals) lists.
+    """
+    game_seed = seed + game_index
+    choose = _worker_policy_factory(random.Random(game_seed), **_worker_policy_options)
+    game = GameCore(use_bitboard=True, seed=game_seed)
+    transitions = ([], [], [], [], [])
+    boards, actions, rewards, next_boards, terminals = transitions
+
+    start = time.perf_counter()
+    moves = 0
+    packed = bitboard.pack(game.board)
+    while not game.game_over:
+        direction = choose(packed)
+        score = game.score
+        if direction is None or not game.move(direction):
+            break # The policy has no move or picked an illegal one
+        moves += 1
+        next_packed = bitboard.pack(game.board)
+        if collect:
+            boards.append(packed)
+            actions.append(bitboard.DIRECTIONS.index(direction))
+            rewards.append(game.score - score)
+            next_boards.append(next_packed)
+            terminals.append(int(game.game_over))
+        packed = next_packed
+
+    result = {
+        'game': game_index,
+        'seed': game_seed,
+        'score': game.score,
+        'max_tile': 1 << bitboard.max_exponent(bitboard.pack(game.board)),
+        'moves': moves,
+        'seconds': round(time.perf_counter() - start, 6),
+        'won': game.won,
+    }
+    if collect:
+        result['transitions'] = transitions
+    return result
+
+
+def _play_game_task(task):
+    return play_game(*task)
+
+
+class RunningStats:
+    """
+    Aggregates per-game results as they stream in.
+    """
+    def __init__(self):
+        self.scores = []
+        self.moves = 0
+        self.max_tiles = collections.Counter()
+        self.wins = 0
+        self.start = time.perf_counter()
+
+    def add(self, result):
+        self.scores.append(result['score'])
+        self.moves += result['moves']
+        self.max_tiles[result['max_tile']] += 1
+        self.wins += result['won']
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        games = len(self.scores)
+        return {
+            'games': games,
+            'mean_score': round(statistics.fmean(self.scores), 1) if games else 0.0,
+            'stdev_score': round(statistics.stdev(self.scores), 1) if games > 1 else 0.0,
+            'median_score': statistics.median(self.scores) if games else 0,
+            'best_score': max(self.scores, default=0),
+            'win_rate': round(self.wins / games, 4) if games else 0.0,
+            'max_tiles': dict(sorted(self.max_tiles.items())),
+            'games_per_sec': round(games / elapsed, 2) if elapsed else 0.0,
+            'moves_per_sec': round(self.moves / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def run(games, workers, policy, seed, policy_options=None, output=None, progress_every=100, dataset=None):
+    """
+    Plays the games across a process pool, writing each result to output as it finishes
+    and, if dataset (a dataset.DatasetWriter) is given, appending its transitions to it.
+    Returns the aggregated summary.
+    """
+    policy_options = policy_options or {}
+    load_policy(policy) # Fail early on unknown policies
+    stats = RunningStats()
+    # Small chunks keep results streaming while amortizing inter-process overhead
+    chunksize = max(1, min(32, games // (workers * 8)))
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(policy, policy_options)) as pool:
+        tasks = ((index, seed, dataset is not None) for index in range(games))
+        for result in pool.imap_unordered(_play_game_task, tasks, chunksize=chunksize):
+            if dataset is not None:
+                dataset.append_game(*result.pop('transitions'))
+            stats.add(result)
+            if output:
+                output.write(json.dumps(result) + '\n')
+            if progress_every and len(stats.scores) % progress_every == 0:
+                logging.info(f"Progress: {stats.summary()}")
+
+    return stats.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run 2048 self-play games across a process pool.")
+    parser.add_argument('--games', type=int, default=1000, help="number of games to play")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument('--policy', default='greedy', help=f"one of {sorted(POLICIES)} or 'module:factory'")
+    parser.add_argument('--seed', type=int, default=0, help="base seed; game i uses seed + i")
+    parser.add_argument('--time-budget', type=float, default=None, help="per-move budget in seconds for expectimax and rollout")
+    parser.add_argument('--shared-cache', type=int, metavar='ENTRIES',
+                        help="share one expectimax transposition table of this many entries between all workers")
+    parser.add_argument('--weights', help=f"n-tuple weights file for the ntuple policy (default: {DEFAULT_WEIGHTS_FILE})")
+    parser.add_argument('--output', help="write per-game JSON lines to this file (default: stdout)")
+    parser.add_argument('--progress-every', type=int, default=100, help="log aggregated stats every N games")
+    parser.add_argument('--export', metavar='DIR', help="write every transition to a memory-mapped dataset in DIR")
+    parser.add_argument('--append', action='store_true', help="append to an existing --export dataset instead of replacing it")
+    args = parser.parse_args(argv)
+
+    if args.shared_cache is not None and args.shared_cache <= 0:
+        parser.error(f"--shared-cache must be a positive number of entries, got {args.shared_cache}")
+    try:
+        factory = load_policy(args.policy)
+    except (ValueError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+    # Every worker passes the options to the factory, so fail here rather than in all of them
+    for option, flag, given in (('time_budget', '--time-budget', args.time_budget is not None),
+                                ('weights', '--weights', args.weights is not None),
+                                ('shared_cache', '--shared-cache', args.shared_cache is not None)):
+        if given and not accepts_option(factory, option):
+            parser.error(f"{flag} does not apply to the '{args.policy}' policy")
+
+    policy_options = {}
+    if args.time_budget is not None:
+        policy_options['time_budget'] = args.time_budget
+    if args.weights is not None:
+        policy_options['weights'] = args.weights
+    shared_cache = SharedPositionCache(args.shared_cache) if args.shared_cache is not None else None
+    if shared_cache is not None:
+        policy_options['shared_cache'] = shared_cache.name
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    dataset = DatasetWriter(args.export, append=args.append) if args.export else None
+    try:
+        summary = run(args.games, args.workers, args.policy, args.seed, policy_options, output,
+                      args.progress_every, dataset)
+    finally:
+        if args.output:
+            output.close()
+        if dataset:
+            dataset.close()
+        if shared_cache is not None:
+            shared_cache.close()
+    logging.info(f"Final: {summary}")
+    if dataset:
+        logging.info(f"Dataset '{args.export}' holds {dataset.transitions} transitions from {dataset.games} games.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,474 @@
+"""
+Asyncio game server hosting many headless 2048 sessions in one process.
+
+Bots and remote clients play over a local TCP or Unix socket with a line
+protocol. Every request is one line, and every reply is one line, in order:
+
+    NEW [seed] [player]     start a session      -> OK <id> <board> <score> <moves> <won> <over>
+    MOVE <id> <moves>       play moves in order  -> OK <id> <board> <score> <moves> <won> <over> <applied>
+    STATE <id>              session state        -> OK <id> <board> <score> <moves> <won> <over>
+    END <id>                end the session      -> OK <id> <board> <score> <moves> <won> <over>
+    STATS [id]              server statistics, or one session's latency -> OK <json>
+    QUIT                    close the connection
+    errors                                       -> ERR <message>
+
+A seed is an integer in [0, 2**63), random if omitted. <board> is the packed
+64-bit board (bitboard.py) in 16 hex digits and <moves> is a string of L, R,
+U and D, so one MOVE command can carry a whole batch of moves. A MOVE stops
+at the end of the game; <applied> counts the moves that changed the board.
+Clients may also send many lines before reading: every line that arrives in
+one read is answered in a single write.
+
+A session is a packed board, score, counters and its own generator. It
+spawns tiles like GameCore(use_bitboard=True, seed=seed), so a seed replays
+the same game locally. Sessions belong to the connection that created them
+and are dropped when it closes. Finished games are recorded in the
+leaderboard on a dedicated thread, so SQLite never blocks the event loop.
+
+The server counts commands, moves and the time spent on each session's
+commands (per-session latency). STATS reports them with the throughput since
+the start.
+
+Example:
+    python server.py serve --tcp 127.0.0.1:2048
+    python server.py serve --unix /tmp/2048.sock
+    python server.py bench --clients 8 --sessions 250 --batch 16
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import signal
+import statistics
+import sys
+import time
+
+import bitboard
+import core
+from leaderboard import DEFAULT_DATABASE, DEFAULT_PLAYER, LeaderboardStore
+from spawnrng import SpawnRNG
+
+DEFAULT_MAX_SESSIONS = 100000
+READ_CHUNK = 65536 # Bytes read per round trip; every complete line in it is answered at once
+MAX_LINE = 4096 # A longer line closes the connection
+MOVE_LETTERS = {'L': 'left', 'R': 'right', 'U': 'up', 'D': 'down'}
+MAX_SEED = (1 << 63) - 1 # Seeds are stored in the leaderboard's signed 64-bit column
+SESSION_BUFFER_WORDS = 8 # Spawn words pre-drawn per session; small, as there are thousands of sessions
+
+
+class ProtocolError(Exception):
+    """
+    A request the server cannot execute; answered with ERR and the message.
+    """
+
+
+class Session:
+    """
+    Compact state of one game on a packed board.
+    """
+    __slots__ = ('id', 'player', 'seed', 'rng', 'board', 'score', 'moves', 'won', 'game_over',
+                 'commands', 'latency', 'max_latency')
+
+    def __init__(self, session_id, seed, player=DEFAULT_PLAYER):
+        self.id = session_id
+        self.player = player
+        self.seed = seed
+        self.rng = SpawnRNG(seed, SESSION_BUFFER_WORDS)
+        self.board = 0
+        self.score = 0
+        self.moves = 0
+        self.won = False
+        self.game_over = False
+        for _ in range(2):
+            self.board, _, _ = core.spawn_packed(self.board, self.rng)
+
+        # Statistics
+        self.commands = 0
+        self.latency = 0.0 # Seconds spent executing this session's commands
+        self.max_latency = 0.0
+
+    def move(self, direction):
+        """
+        Plays one move and spawns a tile. Returns True if the board changed.
+        """
+        after, gained, _, made_2048 = bitboard.move(self.board, direction)
+        if after == self.board:
+            return False
+        self.score += gained
+        if made_2048:
+            self.won = True
+        self.board, _, _ = core.spawn_packed(after, self.rng)
+        self.moves += 1
+        if not bitboard.can_move(self.board):
+            self.game_over = True
+        return True
+
+    def state(self):
+        return f"{self.id} {self.board:016x} {self.score} {self.moves} {int(self.won)} {int(self.game_over)}"
+
+    def max_tile(self):
+        return 1 << bitboard.max_exponent(self.board)
+
+
+class GameServer:
+    """
+    Holds the sessions and serves the line protocol on any number of sockets.
+    With leaderboard=None finished games are not recorded.
+    """
+    def __init__(self, leaderboard=None, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.leaderboard = leaderboard
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.next_id = 1
+        self.servers = []
+        self.unix_paths = [] # Socket files removed on close()
+        # SQLite connections stay on the thread that opened them, so one thread does every write
+        self.writer = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='leaderboard')
+        self.pending_writes = set()
+
+        # Statistics
+        self.started = time.perf_counter()
+        self.connections = 0
+        self.commands = 0
+        self.moves = 0
+        self.games_finished = 0
+        self.busy_time = 0.0 # Seconds spent executing commands
+
+    async def start_tcp(self, host, port):
+        """
+        Starts serving on a TCP address. Returns the asyncio server.
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        self.servers.append(server)
+        logging.info(f"Serving 2048 on {', '.join(str(s.getsockname()) for s in server.sockets)}.")
+        return server
+
+    async def start_unix(self, path):
+        """
+        Starts serving on a Unix socket, replacing a stale socket file. Returns the asyncio server.
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle_client, path)
+        self.servers.append(server)
+        self.unix_paths.append(path)
+        logging.info(f"Serving 2048 on '{path}'.")
+        return server
+
+    async def handle_client(self, reader, writer):
+        """
+        Answers the requests of one connection until it closes or sends QUIT.
+        """
+        self.connections += 1
+        owned = set() # Session ids created on this connection
+        buffer = b''
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                if len(buffer) > MAX_LINE:
+                    writer.write(b"ERR line too long\n")
+                    break
+                replies = []
+                quit = False
+                for line in lines:
+                    reply = self.execute(line.decode('utf-8', 'replace').strip(), owned)
+                    if reply is None:
+                        quit = True
+                        break
+                    replies.append(reply)
+                if replies:
+                    writer.write(('\n'.join(replies) + '\n').encode())
+                    await writer.drain()
+                if quit:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    def execute(self, line, owned):
+        """
+        Executes one request line for a connection owning the given sessions.
+        Returns the reply line, or None for QUIT.
+        """
+        start = time.perf_counter()
+        self.commands += 1
+        fields = line.split()
+        command = fields[0].upper() if fields else ''
+        session = None
+        try:
+            if command == 'MOVE':
+                session = self._session(fields, owned)
+                if len(fields) != 3:
+                    raise ProtocolError("usage: MOVE <id> <moves>")
+                directions = [MOVE_LETTERS.get(letter) for letter in fields[2].upper()]
+                if None in directions: # Checked first, so a bad batch plays no move at all
+                    raise ProtocolError(f"unknown move in '{fields[2]}', expected L, R, U or D")
+                applied = 0
+                for direction in directions:
+                    if session.game_over:
+                        break
+                    applied += session.move(direction)
+                self.moves += applied
+                if session.game_over and applied:
+                    self.record(session)
+                reply = f"OK {session.state()} {applied}"
+            elif command == 'STATE':
+                session = self._session(fields, owned)
+                reply = f"OK {session.state()}"
+            elif command == 'NEW':
+                if len(self.sessions) >= self.max_sessions:
+                    raise ProtocolError(f"session limit of {self.max_sessions} reached")
+                try:
+                    seed = int(fields[1]) if len(fields) > 1 else random.getrandbits(63)
+                except ValueError:
+                    raise ProtocolError(f"seed must be an integer, got '{fields[1]}'")
+                if not 0 <= seed <= MAX_SEED:
+                    raise ProtocolError(f"seed must be between 0 and {MAX_SEED}, got {seed}")
+                session = Session(self.next_id, seed, fields[2] if len(fields) > 2 else DEFAULT_PLAYER)
+                self.next_id += 1
+                self.sessions[session.id] = session
+                owned.add(session.id)
+                reply = f"OK {session.state()}"
+            elif command == 'END':
+                session = self._session(fields, owned)
+                del self.sessions[session.id]
+                owned.discard(session.id)
+                reply = f"OK {session.state()}"
+            elif command == 'STATS' and len(fields) > 1:
+                session = self._session(fields, owned)
+                reply = f"OK {json.dumps(self.session_latency(session))}"
+            elif command == 'STATS':
+                reply = f"OK {json.dumps(self.stats())}"
+            elif command == 'QUIT':
+                return None
+            else:
+                raise ProtocolError(f"unknown command '{command}'")
+        except ProtocolError as e:
+            reply = f"ERR {e}"
+
+        elapsed = time.perf_counter() - start
+        self.busy_time += elapsed
+        if session is not None:
+            session.commands += 1
+            session.latency += elapsed
+            if elapsed > session.max_latency:
+                session.max_latency = elapsed
+        return reply
+
+    def _session(self, fields, owned):
+        """
+        Returns the session named by the request's second field, if this connection owns it.
+        """
+        try:
+            session_id = int(fields[1])
+        except (IndexError, ValueError):
+            raise ProtocolError(f"usage: {fields[0].upper()} <id> ...")
+        if session_id not in owned:
+            raise ProtocolError(f"no session {session_id} on this connection")
+        return self.sessions[session_id]
+
+    def record(self, session):
+        """
+        Records a finished game in the leaderboard on the writer thread, without waiting for it.
+        """
+        self.games_finished += 1
+        if self.leaderboard is None or session.score <= 0:
+            return
+        future = self.writer.submit(self.leaderboard.record, session.score, session.player, bitboard.BOARD_SIZE,
+                                    max_tile=session.max_tile(), moves=session.moves, seed=session.seed)
+        self.pending_writes.add(future)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future):
+        self.pending_writes.discard(future)
+        if future.exception() is not None:
+            logging.error(f"Error saving leaderboard: {future.exception()}")
+
+    def session_latency(self, session):
+        """
+        Returns a session's command count, mean and maximum command latency in milliseconds.
+        """
+        return {
+            'commands': session.commands,
+            'avg_ms': 1000 * session.latency / session.commands if session.commands else 0.0,
+            'max_ms': 1000 * session.max_latency,
+        }
+
+    def stats(self):
+        """
+        Returns the server statistics as a dictionary.
+        """
+        elapsed = time.perf_counter() - self.started
+        latencies = [s.latency / s.commands for s in self.sessions.values() if s.commands]
+        return {
+            'sessions': len(self.sessions),
+            'connections': self.connections,
+            'commands': self.commands,
+            'moves': self.moves,
+            'games_finished': self.games_finished,
+            'pending_writes': len(self.pending_writes),
+            'commands_per_sec': self.commands / elapsed if elapsed else 0.0,
+            'moves_per_sec': self.moves / elapsed if elapsed else 0.0,
+            'busy_fraction': self.busy_time / elapsed if elapsed else 0.0,
+            'session_avg_ms': 1000 * statistics.fmean(latencies) if latencies else 0.0,
+            'session_max_ms': 1000 * max((s.max_latency for s in self.sessions.values()), default=0.0),
+        }
+
+    async def close(self):
+        """
+        Stops accepting connections, finishes the pending leaderboard writes and closes the store.
+        """
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        for path in self.unix_paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        loop = asyncio.get_running_loop()
+        if self.leaderboard is not None:
+            await loop.run_in_executor(self.writer, self.leaderboard.close) # Runs after the queued writes
+        self.writer.shutdown(wait=True)
+
+
+async def bench_client(connect, sessions, batch, rounds, seed):
+    """
+    Plays random moves on its own sessions: every round sends one MOVE of batch
+    moves per session in a single write and reads all replies. Ended games are
+    replaced by new sessions. Returns (round trip times, moves applied).
+    """
+    rng = random.Random(seed)
+    reader, writer = await connect()
+
+    async def request(lines):
+        writer.write(('\n'.join(lines) + '\n').encode('ascii'))
+        await writer.drain()
+        return [(await reader.readline()).decode('ascii').split() for _ in lines]
+
+    replies = await request([f"NEW {rng.getrandbits(63)}" for _ in range(sessions)])
+    ids = [reply[1] for reply in replies]
+    round_trips = []
+    applied = 0
+    for _ in range(rounds):
+        lines = [f"MOVE {session_id} {''.join(rng.choices('LRUD', k=batch))}" for session_id in ids]
+        start = time.perf_counter()
+        replies = await request(lines)
+        round_trips.append(time.perf_counter() - start)
+        over = [i for i, reply in enumerate(replies) if reply[6] == '1']
+        applied += sum(int(reply[7]) for reply in replies)
+        if over:
+            await request([f"END {ids[i]}" for i in over])
+            fresh = await request([f"NEW {rng.getrandbits(63)}" for _ in over])
+            for i, reply in zip(over, fresh):
+                ids[i] = reply[1]
+    writer.write(b"QUIT\n")
+    await writer.drain()
+    writer.close()
+    return round_trips, applied
+
+
+async def bench(args):
+    """
+    Serves on a Unix socket (or TCP port) and measures throughput with concurrent clients in the same process.
+    """
+    store = LeaderboardStore(args.leaderboard) if args.leaderboard else None
+    server = GameServer(store)
+    if args.tcp:
+        host, port = parse_address(args.tcp)
+        tcp = await server.start_tcp(host, port)
+        port = tcp.sockets[0].getsockname()[1] # The real port if 0 was asked for
+        connect = lambda: asyncio.open_connection(host, port)
+    else:
+        await server.start_unix(args.unix)
+        connect = lambda: asyncio.open_unix_connection(args.unix)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(bench_client(connect, args.sessions, args.batch, args.rounds, args.seed + i)
+                                     for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    round_trips = sorted(t for trips, _ in results for t in trips)
+    moves = sum(applied for _, applied in results)
+    stats = server.stats()
+    await server.close()
+
+    logging.info(f"{args.clients} clients x {args.sessions} sessions, {args.batch} moves per command: "
+                 f"{moves / elapsed:,.0f} moves/sec, {stats['commands_per_sec']:,.0f} commands/sec, "
+                 f"round trip p50 {1000 * round_trips[len(round_trips) // 2]:.1f} ms "
+                 f"p99 {1000 * round_trips[int(len(round_trips) * 0.99)]:.1f} ms, "
+                 f"{stats['games_finished']} games finished")
+
+
+async def serve(args):
+    """
+    Serves until SIGINT or SIGTERM, logging the statistics every args.stats_every seconds.
+    """
+    store = None if args.no_leaderboard else LeaderboardStore(args.leaderboard)
+    server = GameServer(store, args.max_sessions)
+    if args.tcp:
+        await server.start_tcp(*parse_address(args.tcp))
+    if args.unix:
+        await server.start_unix(args.unix)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        while True:
+            await asyncio.sleep(args.stats_every)
+            logging.info(f"Server stats: {server.stats()}")
+    except asyncio.CancelledError:
+        logging.info(f"Server stopped. Stats: {server.stats()}")
+    finally:
+        await server.close()
+
+
+def parse_address(address):
+    """
+    Splits 'host:port' into (host, port).
+    """
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many headless 2048 sessions over a local socket.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the server")
+    serve_parser.add_argument('--tcp', metavar='HOST:PORT', help="listen on a TCP address")
+    serve_parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket")
+    serve_parser.add_argument('--max-sessions', type=int, default=DEFAULT_MAX_SESSIONS)
+    serve_parser.add_argument('--leaderboard', default=DEFAULT_DATABASE, help="SQLite leaderboard to record games in")
+    serve_parser.add_argument('--no-leaderboard', action='store_true', help="do not record finished games")
+    serve_parser.add_argument('--stats-every', type=float, default=60.0, help="seconds between statistics logs")
+    bench_parser = commands.add_parser('bench', help="measure throughput with in-process clients")
+    bench_parser.add_argument('--clients', type=int, default=8, help="concurrent connections")
+    bench_parser.add_argument('--sessions', type=int, default=250, help="sessions per connection")
+    bench_parser.add_argument('--batch', type=int, default=16, help="moves per MOVE command")
+    bench_parser.add_argument('--rounds', type=int, default=20, help="MOVE round trips per connection")
+    bench_parser.add_argument('--tcp', metavar='HOST:PORT', help="use TCP instead of a Unix socket (port 0 picks one)")
+    bench_parser.add_argument('--unix', default='2048-bench.sock', help="Unix socket path")
+    bench_parser.add_argument('--leaderboard', help="record finished games in this SQLite leaderboard")
+    bench_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'serve':
+        if not args.tcp and not args.unix:
+            parser.error("serve needs --tcp or --unix")
+        asyncio.run(serve(args))
+    else:
+        asyncio.run(bench(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
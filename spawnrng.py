@@ -0,0 +1,200 @@
+"""
+Seedable spawn generator for the game core.
+
+SpawnRNG is a SplitMix64 counter generator: word i of a stream is a fixed
+mix of seed + (i + 1) * golden gamma. The whole state is (seed, position),
+two integers, so a game's generator is snapshotted and restored for free
+(history.py keeps one per keyframe, server.py one per session), and word i
+never depends on how the earlier words were drawn.
+
+Words are drawn in bulk into a buffer: large refills are one vectorized
+NumPy expression, small ones a Python loop. A spawn uses one word: the high
+32 bits pick the empty cell and the low 32 bits the value, each by Lemire's
+multiply-shift with rejection, so cells are exactly uniform and the value is
+a 4 with probability exactly 1/10. A rejected word (at most about one in
+ten million) is replaced by the next one.
+
+spawn_batch() makes one spawn draw for each of many streams at once, so
+batch.BatchEnv spawns exactly like a GameCore with the same seed.
+
+MersenneSpawnRNG reproduces the random.Random draws games used before, so
+replays recorded with them can still be verified.
+
+Example:
+    rng = SpawnRNG(42)
+    k, exponent = rng.spawn(empty_count)   # k-th empty cell, 1 (a 2) or 2 (a 4)
+    state = rng.snapshot()
+    rng.restore(state)                     # the same spawns again
+"""
+import hashlib
+import os
+import random
+
+import numpy as np
+
+MASK32 = (1 << 32) - 1
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+DEFAULT_BUFFER_WORDS = 256
+NUMPY_MIN_WORDS = 64 # Smaller refills are faster in a Python loop than through NumPy
+FOUR_ODDS = 10 # One spawn in ten is a 4
+FOUR_REJECT = (1 << 32) % FOUR_ODDS # Low 32 bits below this would bias the value draw
+
+
+def seed_key(seed):
+    """
+    Returns the 64-bit stream key for a seed: ints in [0, 2**64) as they are,
+    None from the OS, anything else (floats, strings, large ints) hashed.
+    """
+    if seed is None:
+        return int.from_bytes(os.urandom(8), 'little')
+    if isinstance(seed, int) and 0 <= seed <= MASK64:
+        return seed
+    return int.from_bytes(hashlib.blake2b(repr(seed).encode(), digest_size=8).digest(), 'little')
+
+
+def splitmix64_words(key, start, count):
+    """
+    Returns words start .. start + count - 1 of the stream for key, as a list of ints.
+    """
+    if count >= NUMPY_MIN_WORDS:
+        with np.errstate(over='ignore'): # uint64 arithmetic wraps, as SplitMix64 expects
+            z = np.uint64(key) + np.arange(start + 1, start + count + 1, dtype=np.uint64) * np.uint64(GOLDEN_GAMMA)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+            return (z ^ (z >> np.uint64(31))).tolist()
+    words = []
+    z = (key + start * GOLDEN_GAMMA) & MASK64
+    for _ in range(count):
+        z = (z + GOLDEN_GAMMA) & MASK64
+        x = ((z ^ (z >> 30)) * MIX1) & MASK64
+        x = ((x ^ (x >> 27)) * MIX2) & MASK64
+        words.append(x ^ (x >> 31))
+    return words
+
+
+def spawn_batch(keys, positions, empty_count):
+    """
+    Draws one spawn from each stream in NumPy arrays: keys (uint64) at
+    positions (uint64, words drawn so far), with empty_count > 0 empty cells
+    each. Gives the same results as SpawnRNG.spawn() on every stream.
+    Returns (k, exponent, new_positions) arrays.
+    """
+    empty_count = np.asarray(empty_count, dtype=np.uint64)
+    positions = np.array(positions, dtype=np.uint64)
+    k = np.zeros(len(positions), dtype=np.uint64)
+    exponent = np.zeros(len(positions), dtype=np.uint64)
+    todo = np.arange(len(positions))
+    with np.errstate(over='ignore'):
+        while len(todo): # Rejected words are redrawn, about one in ten million
+            positions[todo] += np.uint64(1)
+            z = keys[todo] + positions[todo] * np.uint64(GOLDEN_GAMMA)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+            word = z ^ (z >> np.uint64(31))
+            n = empty_count[todo]
+            product = (word >> np.uint64(32)) * n # At most 36 bits, no overflow
+            low = product & np.uint64(MASK32)
+            value = (word & np.uint64(MASK32)) * np.uint64(FOUR_ODDS)
+            rejected = (((low < n) & (low < (np.uint64(1 << 32) - n) % n))
+                        | ((value & np.uint64(MASK32)) < np.uint64(FOUR_REJECT)))
+            done = todo[~rejected]
+            k[done] = (product >> np.uint64(32))[~rejected]
+            exponent[done] = np.where((value >> np.uint64(32))[~rejected] == 0, 2, 1)
+            todo = todo[rejected]
+    return k, exponent, positions
+
+
+class SpawnRNG:
+    """
+    Counter-based spawn generator with a buffer of pre-drawn words.
+    """
+    __slots__ = ('seed', 'buffer_words', 'buffer', 'buffer_start', 'index')
+
+    def __init__(self, seed=None, buffer_words=DEFAULT_BUFFER_WORDS):
+        self.seed = seed_key(seed)
+        self.buffer_words = buffer_words
+        self.buffer = []
+        self.buffer_start = 0 # Stream position of buffer[0]
+        self.index = 0 # Next word in the buffer
+
+    @property
+    def position(self):
+        """
+        Number of words drawn so far.
+        """
+        return self.buffer_start + self.index
+
+    def next_word(self):
+        """
+        Returns the next 64-bit word of the stream.
+        """
+        if self.index >= len(self.buffer):
+            self.buffer_start += len(self.buffer)
+            self.buffer = splitmix64_words(self.seed, self.buffer_start, self.buffer_words)
+            self.index = 0
+        word = self.buffer[self.index]
+        self.index += 1
+        return word
+
+    def below(self, n):
+        """
+        Returns an integer uniform in [0, n), for 0 < n <= 2**32.
+        """
+        while True:
+            product = (self.next_word() >> 32) * n
+            low = product & MASK32
+            if low >= n or low >= ((1 << 32) - n) % n: # The modulo is only needed in the rare low case
+                return product >> 32
+
+    def spawn(self, empty_count):
+        """
+        Draws a spawn on a board with empty_count > 0 empty cells.
+        Returns (k, exponent): the k-th empty cell in row-major order gets 1 << exponent.
+        """
+        while True:
+            word = self.next_word()
+            product = (word >> 32) * empty_count
+            low = product & MASK32
+            if low < empty_count and low < ((1 << 32) - empty_count) % empty_count:
+                continue
+            value = (word & MASK32) * FOUR_ODDS
+            if value & MASK32 < FOUR_REJECT:
+                continue
+            return product >> 32, 2 if value >> 32 == 0 else 1
+
+    def snapshot(self):
+        """
+        Returns the generator state as (seed, position).
+        """
+        return self.seed, self.position
+
+    def restore(self, state):
+        """
+        Returns the generator to a state from snapshot(). The buffer refills on the next draw.
+        """
+        self.seed, position = state
+        self.buffer = []
+        self.buffer_start = position
+        self.index = 0
+
+
+class MersenneSpawnRNG:
+    """
+    Spawns exactly like games did with random.Random, for verifying old replays.
+    """
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def spawn(self, empty_count):
+        k = self.random.randrange(empty_count)
+        value = self.random.choice([2] * 9 + [4] * 1)
+        return k, value.bit_length() - 1
+
+    def snapshot(self):
+        return self.random.getstate()
+
+    def restore(self, state):
+        self.random.setstate(state)
@@ -0,0 +1,28 @@
+import random
+
+import numpy as np
+import pytest
+
+import bitboard
+from batch import BatchEnv
+from core import GameCore
+
+
+def test_batch_plays_the_same_games_as_game_core():
+    env = BatchEnv(20, seed=7)
+    games = [GameCore(use_bitboard=True, seed=7 + i) for i in range(20)]
+    rng = random.Random(0)
+    for _ in range(200):
+        directions = np.array([rng.randrange(4) for _ in games])
+        env.step(directions)
+        for game, direction in zip(games, directions):
+            if not game.game_over:
+                game.move(bitboard.DIRECTIONS[direction])
+        assert [bitboard.pack(game.board) for game in games] == env.boards.tolist()
+        assert [game.score for game in games] == env.scores.tolist()
+
+
+def test_step_rejects_unknown_directions():
+    env = BatchEnv(2, seed=0)
+    with pytest.raises(ValueError):
+        env.step([0, 4])
@@ -0,0 +1,26 @@
+import pytest
+
+import bitboard
+from core import GameCore
+
+
+def test_32768_pair_merges_only_on_the_list_engine():
+    board = [[32768, 32768, 0, 0], [2, 4, 8, 16], [4, 8, 16, 32], [8, 16, 32, 64]]
+    game = GameCore(seed=0)
+    game.board = [row[:] for row in board]
+    assert game.move('left')
+    assert (game.board[0][0], game.score) == (65536, 65536)
+
+    packed, score, merges, _ = bitboard.move(bitboard.pack(board), 'left')
+    assert bitboard.unpack(packed)[0][:2] == [32768, 32768]
+    assert (score, merges) == (0, 0)
+
+
+def test_pack_rejects_tiles_above_32768():
+    with pytest.raises(ValueError):
+        bitboard.pack([[65536, 0, 0, 0], [0] * 4, [0] * 4, [0] * 4])
+
+
+def test_move_rejects_unknown_directions():
+    with pytest.raises(ValueError):
+        bitboard.move(bitboard.pack([[2, 0, 0, 0], [0] * 4, [0] * 4, [0] * 4]), 'foo')
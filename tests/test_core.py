@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import bitboard
+from core import GameCore, count_pairs
+
+
+@pytest.mark.parametrize('use_bitboard', [False, True])
+def test_move_rejects_unknown_directions_on_both_engines(use_bitboard):
+    game = GameCore(use_bitboard=use_bitboard, seed=1)
+    board = [row[:] for row in game.board]
+    with pytest.raises(ValueError, match="left"):
+        game.move('foo')
+    assert game.board == board and game.moves_made == 0
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_both_engines_play_the_same_game_for_a_seed(seed):
+    games = [GameCore(use_bitboard=False, seed=seed), GameCore(use_bitboard=True, seed=seed)]
+    rng = random.Random(seed)
+    while not games[0].game_over:
+        direction = rng.choice(bitboard.DIRECTIONS)
+        assert games[0].move(direction) == games[1].move(direction)
+        assert games[0].board == games[1].board
+        list_state, bitboard_state = [(g.score, g.won, g.game_over, g.last_spawn, g.last_merges) for g in games]
+        assert list_state == bitboard_state
+    assert games[1].game_over
+
+
+def slide_line_left(line):
+    """
+    The rules for one line, written out plainly: returns (new line, score gained).
+    """
+    tiles = [tile for tile in line if tile]
+    merged, score, i = [], 0, 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            merged.append(tiles[i] * 2)
+            score += tiles[i] * 2
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    return merged + [0] * (len(line) - len(merged)), score
+
+
+@pytest.mark.parametrize('size', [2, 3, 5, 8])
+def test_nxn_slides_and_empty_counts_follow_the_rules(size):
+    game = GameCore(seed=size, size=size)
+    rng = random.Random(size)
+    for _ in range(300):
+        if game.game_over:
+            break
+        direction = rng.choice(bitboard.DIRECTIONS)
+        before, score = [row[:] for row in game.board], game.score
+        moved = game.move(direction)
+
+        # Slide the board as rows (turning it for up and down), then compare all but the spawned cell
+        turned = before if direction in ('left', 'right') else [list(col) for col in zip(*before)]
+        expected, gained = [], 0
+        for line in turned:
+            new_line, line_score = slide_line_left(line[::-1] if direction in ('right', 'down') else line)
+            expected.append(new_line[::-1] if direction in ('right', 'down') else new_line)
+            gained += line_score
+        if direction in ('up', 'down'):
+            expected = [list(row) for row in zip(*expected)]
+        assert moved == (expected != before)
+        if moved:
+            index, exponent = game.last_spawn
+            r, c = divmod(index, size)
+            assert expected[r][c] == 0 and game.board[r][c] == 1 << exponent
+            expected[r][c] = game.board[r][c]
+            assert game.score == score + gained
+        assert game.board == expected
+        assert game.row_empty == [row.count(0) for row in game.board]
+        assert game.empty_count == sum(game.row_empty)
+
+
+def test_count_pairs_counts_rows_and_columns():
+    assert count_pairs([[0, 0], [0, 0]]) == 0
+    assert count_pairs([[2, 2], [2, 2]]) == 4
+    assert count_pairs([[2, 2, 2], [4, 0, 4], [4, 8, 16]]) == 3
+
+
+@pytest.mark.parametrize('size', [2, 4, 6])
+def test_pair_count_follows_cell_writes_and_moves(size):
+    game = GameCore(seed=size, size=size)
+    rng = random.Random(size)
+    assert game.pair_count == count_pairs(game.board) # Starts tracking from here
+    for _ in range(500):
+        if rng.random() < 0.5:
+            game.set_cell(rng.randrange(size), rng.randrange(size), rng.choice((0, 2, 2, 4, 8)))
+        elif not game.move(rng.choice(bitboard.DIRECTIONS)) and not game.can_move():
+            game.set_cell(0, 0, 0)
+        assert game._pair_count == count_pairs(game.board)
+        assert game.row_empty == [row.count(0) for row in game.board]
+        assert game.empty_count == sum(game.row_empty)
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+import bitboard
+from core import GameCore
+from history import History
+
+
+def state(game):
+    return ([row[:] for row in game.board], game.score, game.moves_made, game.merges_made,
+            game.tiles_spawned, game.rng.snapshot())
+
+
+def play(game, history, moves, seed=0):
+    """
+    Plays random moves, recording each. Returns the state before the first move and after every move.
+    """
+    rng = random.Random(seed)
+    states = [state(game)]
+    while len(states) <= moves and not game.game_over:
+        direction = rng.choice(bitboard.DIRECTIONS)
+        if game.move(direction):
+            history.record(direction)
+            states.append(state(game))
+    return states
+
+
+@pytest.mark.parametrize('use_bitboard', [False, True])
+def test_undo_and_redo_round_trip(use_bitboard):
+    game = GameCore(use_bitboard=use_bitboard, seed=4)
+    history = History(game, keyframe_interval=8)
+    states = play(game, history, 60)
+    for expected in reversed(states[:-1]):
+        assert history.undo()
+        assert state(game) == expected
+    assert not history.undo()
+    for expected in states[1:]:
+        assert history.redo()
+        assert state(game) == expected
+    assert not history.redo()
+
+
+def test_a_new_move_after_undo_starts_a_branch():
+    game = GameCore(seed=5)
+    history = History(game, keyframe_interval=4)
+    states = play(game, history, 12)
+    for _ in range(3):
+        history.undo()
+    original = history.branches()[0]
+    other = next(direction for direction in bitboard.DIRECTIONS
+                 if direction != original and game.move(direction))
+    history.record(other)
+    branch = state(game)
+
+    history.undo()
+    assert history.branches() == [other, original]
+    assert history.redo(original)
+    assert state(game) == states[-3]
+    history.undo()
+    assert history.redo(other)
+    assert state(game) == branch
+    history.undo()
+    assert not history.redo(next(d for d in bitboard.DIRECTIONS if d not in (original, other)))
+
+
+def test_eviction_keeps_the_history_within_its_budget():
+    game = GameCore(seed=6)
+    budget = 4000
+    history = History(game, memory_budget=budget, keyframe_interval=8)
+    states = play(game, history, 400)
+    assert len(states) > 100
+    assert history.memory_bytes() <= budget
+    assert history.stats()['evicted_positions'] > 0
+
+    undone = 0
+    while history.undo():
+        undone += 1
+    assert 0 < undone < len(states) - 1
+    assert state(game) == states[-1 - undone] # The oldest position kept is still rebuilt exactly
@@ -0,0 +1,23 @@
+from leaderboard import LeaderboardStore
+
+
+def test_only_the_best_scores_of_each_board_are_kept(tmp_path):
+    store = LeaderboardStore(str(tmp_path / 'scores.db'), None, keep=3)
+    for score in range(10):
+        store.record(score, 'alice')
+    store.record(1, 'bob')
+    assert store.top(10) == [9, 8, 7, 1]
+    assert store.top(10, player='bob') == [1]
+    (rows,) = store.connect().execute("SELECT COUNT(*) FROM scores").fetchone()
+    assert rows == 4
+    store.close()
+
+
+def test_legacy_scores_are_imported_once(tmp_path):
+    legacy = tmp_path / 'leaderboard.txt'
+    legacy.write_text("100\n200\n")
+    path = str(tmp_path / 'scores.db')
+    for _ in range(2):
+        store = LeaderboardStore(path, str(legacy))
+        assert store.top() == [200, 100]
+        store.close()
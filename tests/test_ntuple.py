@@ -0,0 +1,55 @@
+import random
+
+import numpy as np
+import pytest
+
+import bitboard
+from ntuple import NTupleNetwork
+
+PATTERNS = ((0, 1, 2, 3), (0, 1, 4, 5), (1, 2, 5, 6)) # Small tables keep the tests fast
+
+
+def random_boards(count, seed=0):
+    rng = random.Random(seed)
+    return [bitboard.pack([[rng.choice((0, 0, 2, 4, 8, 16, 32, 64)) for _ in range(4)] for _ in range(4)])
+            for _ in range(count)]
+
+
+@pytest.fixture
+def network():
+    weights = np.random.default_rng(0).standard_normal(3 * 16 ** 4).astype(np.float32)
+    return NTupleNetwork(PATTERNS, weights)
+
+
+def test_value_is_the_same_for_every_symmetric_form(network):
+    for packed in random_boards(20):
+        values = [network.value(form) for form in bitboard.symmetries(packed)]
+        assert values == pytest.approx([values[0]] * 8, abs=1e-4)
+
+
+def test_batched_evaluation_matches_single_values(network):
+    boards = random_boards(50, seed=1)
+    assert network.evaluate_batch(boards) == pytest.approx([network.value(packed) for packed in boards], abs=1e-4)
+
+
+def test_update_moves_the_value_towards_the_target(network):
+    packed = random_boards(1, seed=2)[0]
+    before = network.value(packed)
+    assert network.update(packed, before + 10.0, 0.5 / network.lookups) == pytest.approx(before)
+    assert before < network.value(packed) < before + 10.0 # Symmetric forms can share weights, so not exactly halfway
+
+
+def test_save_and_load_round_trip(network, tmp_path):
+    path = str(tmp_path / 'weights.npy')
+    network.save(path, episodes=3)
+    boards = random_boards(10, seed=3)
+    for mmap in (True, False):
+        loaded = NTupleNetwork.load(path, mmap=mmap)
+        assert loaded.patterns == PATTERNS
+        assert np.array_equal(loaded.weights, network.weights)
+        assert list(loaded.evaluate_batch(boards)) == list(network.evaluate_batch(boards))
+
+
+def test_weights_must_fit_the_patterns():
+    with pytest.raises(ValueError):
+        NTupleNetwork(PATTERNS, np.zeros(10, dtype=np.float32))
@@ -0,0 +1,58 @@
+import random
+
+import bitboard
+from poscache import PositionCache, SharedPositionCache
+
+
+def random_board(rng):
+    return bitboard.pack([[rng.choice((0, 0, 2, 4, 8, 16, 32)) for _ in range(4)] for _ in range(4)])
+
+
+def test_every_symmetric_form_has_the_same_key():
+    rng = random.Random(1)
+    cache = PositionCache()
+    for _ in range(50):
+        packed = random_board(rng)
+        forms = bitboard.symmetries(packed)
+        assert len(forms) == 8 and forms[0] == packed
+        assert {cache.key(form) for form in forms} == {min(forms)}
+
+
+def test_a_value_answers_lookups_for_all_forms():
+    packed = bitboard.pack([[2, 4, 8, 16], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 2]])
+    cache = PositionCache()
+    cache.put(packed, 1.5)
+    assert all(cache.get(form) == 1.5 for form in bitboard.symmetries(packed))
+    assert len(cache) == 1
+
+    plain = PositionCache(canonicalize=False)
+    plain.put(packed, 1.5)
+    assert plain.get(bitboard.mirror(packed)) is None
+    assert plain.get(packed) == 1.5
+
+
+def test_least_recently_used_entries_are_evicted_at_capacity():
+    cache = PositionCache(capacity=3, canonicalize=False)
+    for packed in (1, 2, 3):
+        cache.put(packed, float(packed))
+    assert cache.get(1) == 1.0 # 2 is now the oldest
+    cache.put(4, 4.0)
+    assert len(cache) == 3
+    assert cache.get(2) is None
+    assert [cache.get(packed) for packed in (1, 3, 4)] == [1.0, 3.0, 4.0]
+    cache.put(5, 5.0)
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert stats['evictions'] == 2 and stats['entries'] == 3
+
+
+def test_shared_cache_is_visible_to_attached_tables():
+    cache = SharedPositionCache(capacity=64)
+    try:
+        attached = SharedPositionCache.attach(cache.name)
+        packed = bitboard.pack([[2, 0, 0, 0], [0, 4, 0, 0], [0, 0, 0, 0], [0, 0, 0, 8]])
+        cache.put(packed, (3, 0.25))
+        assert attached.get(bitboard.transpose(packed)) == (3, 0.25)
+        attached.close()
+    finally:
+        cache.close()
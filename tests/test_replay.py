@@ -0,0 +1,93 @@
+import os
+import random
+
+import pytest
+
+import bitboard
+from core import GameCore
+from replay import LEGACY_VERSION, Replay, ReplayError, ReplayRecorder, decode_move, encode_move
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def record_game(path, seed, keyframe_interval=16):
+    """
+    Plays a random game with seed into a replay at path. Returns [(board, score)] for every position.
+    """
+    game = GameCore(seed=seed)
+    recorder = ReplayRecorder(path, seed, game.board, keyframe_interval=keyframe_interval)
+    positions = [(bitboard.pack(game.board), game.score)]
+    rng = random.Random(seed)
+    while not game.game_over:
+        direction = rng.choice(bitboard.DIRECTIONS)
+        if game.move(direction):
+            recorder.record(direction, game.last_spawn, game.board, game.score)
+            positions.append((bitboard.pack(game.board), game.score))
+    recorder.close()
+    return positions
+
+
+@pytest.mark.parametrize('direction', bitboard.DIRECTIONS)
+def test_move_bytes_round_trip(direction):
+    for index in range(16):
+        for exponent in (1, 2):
+            assert decode_move(encode_move(direction, (index, exponent))) == (direction, index, exponent)
+
+
+def test_recorded_game_seeks_and_verifies(tmp_path):
+    path = str(tmp_path / 'game.2048r')
+    positions = record_game(path, seed=11)
+    replay = Replay.load(path)
+    assert len(replay) == len(positions) - 1
+    assert [(board, score) for _, board, score in replay.positions()] == positions
+    for number in (0, 1, 15, 16, 17, len(replay) // 2, len(replay)):
+        assert replay.position(number) == positions[number]
+    assert replay.verify() == positions[-1][1]
+
+
+def test_replay_with_a_changed_keyframe_fails(tmp_path):
+    path = str(tmp_path / 'game.2048r')
+    record_game(path, seed=12)
+    replay = Replay.load(path)
+    board, score = replay.keyframes[16]
+    replay.keyframes[16] = (board, score + 4)
+    with pytest.raises(ReplayError):
+        replay.verify()
+
+
+def test_truncated_replay_still_loads(tmp_path):
+    path = str(tmp_path / 'game.2048r')
+    positions = record_game(path, seed=13)
+    with open(path, 'rb') as f:
+        data = f.read()
+    replay = Replay(data[:-3])
+    assert replay.position(len(replay)) == positions[len(replay)]
+
+
+@pytest.mark.parametrize('name, use_bitboard, moves, score', [
+    ('legacy_list_v1.2048r', False, 80, 576),
+    ('legacy_bitboard_v1.2048r', True, 77, 564),
+])
+def test_version_1_replays_verify(name, use_bitboard, moves, score):
+    # Recorded before the spawn generator and the in-place list engine replaced random.Random and rotations
+    replay = Replay.load(os.path.join(DATA, name))
+    assert (replay.version, replay.use_bitboard, len(replay)) == (LEGACY_VERSION, use_bitboard, moves)
+    assert replay.position(len(replay))[1] == score
+    assert replay.verify() == score
+
+
+def test_version_1_list_replay_with_a_changed_spawn_fails():
+    with open(os.path.join(DATA, 'legacy_list_v1.2048r'), 'rb') as f:
+        data = bytearray(f.read())
+    data[-1] ^= 0x40 # The last spawn becomes a 4 instead of a 2 or the other way round
+    with pytest.raises(ReplayError):
+        Replay(bytes(data)).verify()
+
+
+def test_recorder_refuses_tiles_above_32768(tmp_path):
+    board = [[2, 0, 0, 0], [0] * 4, [0] * 4, [0] * 4]
+    recorder = ReplayRecorder(str(tmp_path / 'game.2048r'), 1, board)
+    with pytest.raises(ReplayError):
+        recorder.record('left', (1, 1), [[65536, 2, 0, 0], [0] * 4, [0] * 4, [0] * 4], 65536)
+    recorder.close()
+    assert len(Replay.load(str(tmp_path / 'game.2048r'))) == 0
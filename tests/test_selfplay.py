@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+import selfplay
+
+
+def test_time_budget_reaches_a_policy_that_takes_it(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    selfplay.main(['--games', '1', '--workers', '1', '--policy', 'expectimax', '--time-budget', '0.001',
+                   '--output', str(output), '--progress-every', '0'])
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(results) == 1 and results[0]['moves'] > 0
+
+
+@pytest.mark.parametrize('policy, option', [
+    ('greedy', ['--time-budget', '0.01']),
+    ('ntuple', ['--time-budget', '0.01']),
+    ('random', ['--shared-cache', '1000']),
+    ('greedy', ['--weights', 'ntuple.npy']),
+    ('expectimax', ['--shared-cache', '0']),
+])
+def test_options_a_policy_does_not_take_are_rejected(policy, option):
+    with pytest.raises(SystemExit):
+        selfplay.main(['--games', '1', '--workers', '1', '--policy', policy] + option)
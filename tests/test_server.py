@@ -0,0 +1,15 @@
+import pytest
+
+from server import GameServer
+
+
+@pytest.mark.parametrize('seed', ['-1', str(2 ** 63), str(2 ** 64)])
+def test_new_rejects_seeds_outside_the_leaderboard_range(seed):
+    server = GameServer()
+    assert server.execute(f"NEW {seed}", set()).startswith("ERR ")
+    assert not server.sessions
+
+
+def test_new_accepts_the_largest_seed():
+    server = GameServer()
+    assert server.execute(f"NEW {2 ** 63 - 1}", set()).startswith("OK ")
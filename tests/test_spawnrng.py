@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+import pytest
+
+from spawnrng import SpawnRNG, seed_key, spawn_batch, splitmix64_words
+
+
+def spawns(rng, empty_counts):
+    return [rng.spawn(n) for n in empty_counts]
+
+
+def test_known_splitmix64_words():
+    # The first outputs of SplitMix64 seeded with 0, as in the reference implementation
+    assert splitmix64_words(0, 0, 2) == [0xE220A8397B1DCDAF, 0x6E789E6AA1B965F4]
+
+
+def test_python_and_numpy_refills_draw_the_same_words():
+    assert splitmix64_words(12345, 7, 100) == [w for start in range(7, 107, 10)
+                                               for w in splitmix64_words(12345, start, 10)]
+
+
+@pytest.mark.parametrize('buffer_words', [1, 7, 256])
+def test_buffer_size_does_not_change_the_stream(buffer_words):
+    empty_counts = [random.Random(1).randint(1, 16) for _ in range(500)]
+    assert spawns(SpawnRNG(9, buffer_words), empty_counts) == spawns(SpawnRNG(9), empty_counts)
+
+
+def test_snapshot_and_restore_replay_the_same_spawns():
+    rng = SpawnRNG(42, buffer_words=16)
+    empty_counts = list(range(1, 17)) * 5
+    spawns(rng, empty_counts[:37])
+    state = rng.snapshot()
+    assert state == (42, rng.position)
+    first = spawns(rng, empty_counts)
+    rng.restore(state)
+    assert rng.position == state[1]
+    assert spawns(rng, empty_counts) == first
+
+    other = SpawnRNG(0)
+    other.restore(state) # A fresh generator continues the same stream from a snapshot
+    assert spawns(other, empty_counts) == first
+
+
+def test_spawns_are_in_range_and_one_in_ten_is_a_four():
+    rng = SpawnRNG(3)
+    results = spawns(rng, [5] * 20000)
+    assert {k for k, _ in results} == set(range(5))
+    fours = sum(exponent == 2 for _, exponent in results)
+    assert {exponent for _, exponent in results} == {1, 2}
+    assert 1700 < fours < 2300
+
+
+def test_seed_keys():
+    assert seed_key(5) == 5
+    assert seed_key(-1) == seed_key(-1) != seed_key(1 << 64)
+    assert seed_key('a') == seed_key('a') != seed_key('b')
+
+
+def test_spawn_batch_matches_scalar_spawns():
+    rng = random.Random(0)
+    seeds = [rng.getrandbits(64) for _ in range(200)]
+    scalars = [SpawnRNG(seed) for seed in seeds]
+    keys = np.array([seed_key(seed) for seed in seeds], dtype=np.uint64)
+    positions = np.zeros(len(seeds), dtype=np.uint64)
+    for _ in range(30):
+        empty_counts = [rng.randint(1, 16) for _ in seeds]
+        k, exponent, positions = spawn_batch(keys, positions, empty_counts)
+        expected = [scalar.spawn(n) for scalar, n in zip(scalars, empty_counts)]
+        assert list(zip(k.tolist(), exponent.tolist())) == expected
+        assert positions.tolist() == [scalar.position for scalar in scalars]